@@ -2,6 +2,10 @@ import asyncio
 
 from aiogram import Bot, Dispatcher
 from aiogram.client.default import DefaultBotProperties
+from airtable.kek_storage import kek_storage
+from airtable.webhook import AirtableWebhook
+from common.metrics import metrics
+from common.tasks import background_tasks
 from handlers import basic, kek
 from middlewares.event_context import EventContextMiddleware
 from middlewares.log_updates import LogUpdatesMiddleware
@@ -29,6 +33,27 @@ async def main():
 
     dp.include_routers(basic.router, kek.router)
 
+    dp.startup.register(kek_storage.warm_up)
+    dp.startup.register(metrics.start)
+    # Handlers' background work is finished before the storage closes
+    dp.shutdown.register(background_tasks.drain)
+
+    if config.airtable_webhook_id:
+        webhook = AirtableWebhook(
+            kek_storage.client,
+            config.airtable_base_id,
+            config.airtable_webhook_id,
+            config.airtable_webhook_secret,
+            kek_storage.backend,
+            on_change=kek_storage.apply_changes,
+            port=config.airtable_webhook_port,
+        )
+        dp.startup.register(webhook.start)
+        dp.shutdown.register(webhook.stop)
+
+    dp.shutdown.register(metrics.stop)
+    dp.shutdown.register(kek_storage.close)
+
     if config.environment != "prod":
         await bot.delete_webhook(drop_pending_updates=True)
 
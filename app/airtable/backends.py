@@ -0,0 +1,316 @@
+import contextlib
+import copy
+import json
+import sqlite3
+
+from abc import ABC, abstractmethod
+from dataclasses import dataclass, fields
+from datetime import datetime
+from pathlib import Path
+from typing import TYPE_CHECKING
+
+from redis.asyncio import Redis
+from settings import config
+
+if TYPE_CHECKING:
+    from collections.abc import Collection
+    from contextlib import AbstractAsyncContextManager
+
+
+@dataclass(frozen=True)
+class SyncState:
+    # Start of the last sync with Airtable, deltas continue from it
+    synced_at: datetime
+    # Start of the last full sync, the one dropping deleted records
+    full_synced_at: datetime
+    # Last write of records by any process, including webhook updates
+    updated_at: datetime
+
+    def dump(self) -> dict[str, str]:
+        return {f.name: getattr(self, f.name).isoformat() for f in fields(self)}
+
+    @classmethod
+    def parse(cls, data: dict[str, str]) -> SyncState:
+        return cls(
+            **{f.name: datetime.fromisoformat(data[f.name]) for f in fields(cls)}
+        )
+
+
+def table_of(name: str) -> str:
+    # Mirrors are named `Table` or `Table[Field,...]` after their set of fields
+    return name.split("[", 1)[0]
+
+
+class MirrorBackend(ABC):
+    """
+    Storage of mirrored Airtable tables, Airtable itself stays the source of truth
+
+    Records of a mirror are kept in their Airtable order, and every `save` is
+    applied at once, so readers never see a half written refresh
+    """
+
+    @abstractmethod
+    async def load(self, name: str) -> list[dict]: ...
+
+    @abstractmethod
+    async def state(self, name: str) -> SyncState | None: ...
+
+    @abstractmethod
+    async def save(
+        self,
+        name: str,
+        records: list[dict],
+        state: SyncState,
+        replace: bool = False,
+        deleted_ids: Collection[str] = (),
+    ):
+        """
+        Upserts records and drops deleted ones. Replacing also drops records of
+        mirrors of the same table with other sets of fields
+        """
+
+    def lock(self, name: str) -> AbstractAsyncContextManager:
+        """
+        Held while a mirror syncs with Airtable, so processes sharing the backend
+        don't sync it at the same time. A single process needs none
+        """
+        return contextlib.nullcontext()
+
+    @abstractmethod
+    async def cursor(self, key: str) -> int | None: ...
+
+    @abstractmethod
+    async def set_cursor(self, key: str, cursor: int): ...
+
+    @abstractmethod
+    async def close(self): ...
+
+
+class MemoryBackend(MirrorBackend):
+    """
+    Keeps mirrors in process memory, for tests and benchmarks
+    """
+
+    def __init__(self):
+        self.records: dict[str, dict[str, dict]] = {}
+        self.states: dict[str, SyncState] = {}
+        self.cursors: dict[str, int] = {}
+
+    async def load(self, name: str) -> list[dict]:
+        # Copies, so in-memory patches of a mirror don't leak like with real storage
+        return copy.deepcopy(list(self.records.get(name, {}).values()))
+
+    async def state(self, name: str) -> SyncState | None:
+        return self.states.get(name)
+
+    async def save(
+        self,
+        name: str,
+        records: list[dict],
+        state: SyncState,
+        replace: bool = False,
+        deleted_ids: Collection[str] = (),
+    ):
+        if replace:
+            for other in [n for n in self.records if table_of(n) == table_of(name)]:
+                del self.records[other]
+
+        stored = self.records.setdefault(name, {})
+        for record_id in deleted_ids:
+            stored.pop(record_id, None)
+        stored.update((r["id"], copy.deepcopy(r)) for r in records)
+        self.states[name] = state
+
+    async def cursor(self, key: str) -> int | None:
+        return self.cursors.get(key)
+
+    async def set_cursor(self, key: str, cursor: int):
+        self.cursors[key] = cursor
+
+    async def close(self):
+        pass  # Nothing to release, and records may be loaded again
+
+
+class SQLiteBackend(MirrorBackend):
+    """
+    Keeps mirrors in a local SQLite file, surviving restarts of a single instance
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._db = None  # Lazy initialization, so nothing touches disk on import
+
+    @property
+    def db(self) -> sqlite3.Connection:
+        if self._db is None:
+            self._db = self.connect(self.path)
+        return self._db
+
+    @staticmethod
+    def connect(path: str) -> sqlite3.Connection:
+        if path != ":memory:":
+            Path(path).parent.mkdir(parents=True, exist_ok=True)
+
+        db = sqlite3.connect(path)
+        db.executescript(
+            """
+            PRAGMA journal_mode = WAL;
+
+            CREATE TABLE IF NOT EXISTS records (
+                table_name TEXT NOT NULL,
+                id TEXT NOT NULL,
+                data TEXT NOT NULL,
+                PRIMARY KEY (table_name, id)
+            );
+
+            CREATE TABLE IF NOT EXISTS mirror_state (
+                table_name TEXT PRIMARY KEY,
+                data TEXT NOT NULL
+            );
+
+            CREATE TABLE IF NOT EXISTS webhook_cursors (
+                webhook_id TEXT PRIMARY KEY,
+                cursor INTEGER NOT NULL
+            );
+            """
+        )
+        return db
+
+    async def load(self, name: str) -> list[dict]:
+        rows = self.db.execute(
+            "SELECT data FROM records WHERE table_name = ? ORDER BY rowid", (name,)
+        )
+        return [json.loads(data) for (data,) in rows]
+
+    async def state(self, name: str) -> SyncState | None:
+        row = self.db.execute(
+            "SELECT data FROM mirror_state WHERE table_name = ?", (name,)
+        ).fetchone()
+        return row and SyncState.parse(json.loads(row[0]))
+
+    async def save(
+        self,
+        name: str,
+        records: list[dict],
+        state: SyncState,
+        replace: bool = False,
+        deleted_ids: Collection[str] = (),
+    ):
+        with self.db:
+            if replace:
+                self.db.execute(
+                    "DELETE FROM records WHERE table_name = ? OR table_name GLOB ?",
+                    (table_of(name), f"{table_of(name)}[[]*"),
+                )
+            self.db.executemany(
+                "DELETE FROM records WHERE table_name = ? AND id = ?",
+                [(name, record_id) for record_id in deleted_ids],
+            )
+            self.db.executemany(
+                "INSERT INTO records (table_name, id, data) VALUES (?, ?, ?)"
+                " ON CONFLICT DO UPDATE SET data = excluded.data",
+                [(name, r["id"], json.dumps(r)) for r in records],
+            )
+            self.db.execute(
+                "INSERT OR REPLACE INTO mirror_state VALUES (?, ?)",
+                (name, json.dumps(state.dump())),
+            )
+
+    async def cursor(self, key: str) -> int | None:
+        row = self.db.execute(
+            "SELECT cursor FROM webhook_cursors WHERE webhook_id = ?", (key,)
+        ).fetchone()
+        return row and row[0]
+
+    async def set_cursor(self, key: str, cursor: int):
+        with self.db:
+            self.db.execute(
+                "INSERT OR REPLACE INTO webhook_cursors VALUES (?, ?)", (key, cursor)
+            )
+
+    async def close(self):
+        if self._db:
+            self._db.close()
+            self._db = None
+
+
+class RedisBackend(MirrorBackend):
+    """
+    Keeps mirrors in Redis shared by several bot replicas
+
+    A mirror is a hash of records by id with a hash of its sync state next to it
+    """
+
+    # A full sync of a large table pages it for minutes, a crashed replica's lock
+    # expires after that
+    lock_timeout = 10 * 60
+
+    def __init__(self, url: str, prefix: str = "algebrach:mirror"):
+        self.redis = Redis.from_url(url, decode_responses=True)
+        self.prefix = prefix
+
+    def key(self, kind: str, name: str) -> str:
+        return f"{self.prefix}:{kind}:{name}"
+
+    async def load(self, name: str) -> list[dict]:
+        data = await self.redis.hgetall(self.key("records", name))
+        records = [json.loads(record) for record in data.values()]
+        # Hashes are unordered, Airtable lists records in order of creation
+        records.sort(key=lambda r: r.get("createdTime", ""))
+        return records
+
+    async def state(self, name: str) -> SyncState | None:
+        data = await self.redis.hgetall(self.key("state", name))
+        return SyncState.parse(data) if data else None
+
+    async def save(
+        self,
+        name: str,
+        records: list[dict],
+        state: SyncState,
+        replace: bool = False,
+        deleted_ids: Collection[str] = (),
+    ):
+        records_key = self.key("records", name)
+
+        async with self.redis.pipeline(transaction=True) as pipe:
+            if replace:
+                table = self.key("records", table_of(name))
+                others = [k async for k in self.redis.scan_iter(match=rf"{table}\[*")]
+                pipe.delete(table, records_key, *others)
+            if deleted_ids:
+                pipe.hdel(records_key, *deleted_ids)
+            if records:
+                pipe.hset(
+                    records_key, mapping={r["id"]: json.dumps(r) for r in records}
+                )
+            pipe.hset(self.key("state", name), mapping=state.dump())
+            await pipe.execute()
+
+    def lock(self, name: str) -> AbstractAsyncContextManager:
+        # `SET NX` with expiry, others wait for the sync and then reuse it
+        return self.redis.lock(
+            self.key("lock", name),
+            timeout=self.lock_timeout,
+            blocking_timeout=self.lock_timeout,
+        )
+
+    async def cursor(self, key: str) -> int | None:
+        cursor = await self.redis.get(self.key("cursor", key))
+        return cursor and int(cursor)
+
+    async def set_cursor(self, key: str, cursor: int):
+        await self.redis.set(self.key("cursor", key), cursor)
+
+    async def close(self):
+        await self.redis.aclose()
+
+
+def create_backend() -> MirrorBackend:
+    match config.airtable_mirror_backend:
+        case "memory":
+            return MemoryBackend()
+        case "sqlite":
+            return SQLiteBackend(config.airtable_mirror_path)
+        case "redis":
+            return RedisBackend(config.airtable_mirror_redis_url)
@@ -0,0 +1,223 @@
+import asyncio
+
+from itertools import batched, count
+from time import monotonic
+from typing import TYPE_CHECKING, Any
+from urllib.parse import quote
+
+import aiohttp
+
+from common.rate_limiter import Priority, RateLimiter
+from common.utils import get_logger
+
+if TYPE_CHECKING:
+    from collections.abc import AsyncIterator
+
+
+class AirtableError(Exception):
+    def __init__(self, status: int, details: Any):
+        super().__init__(f"Airtable responded with {status}: {details}")
+        self.status = status
+        self.details = details
+
+
+class AirtableClient:
+    """
+    Asyncio Airtable client sharing one pooled aiohttp session
+
+    Docs: https://airtable.com/developers/web/api/introduction
+    """
+
+    api_url = "https://api.airtable.com/v0"
+
+    # Same as pyairtable's default retry strategy
+    retry_statuses = frozenset({429, 500, 502, 503, 504})
+    retry_backoff = 0.1
+
+    def __init__(
+        self,
+        access_token: str,
+        timeout: aiohttp.ClientTimeout | None = None,
+        retries: int = 2,
+        connections: int = 10,
+        requests_per_second: float = 5,
+    ):
+        self.access_token = access_token
+        self.timeout = timeout or aiohttp.ClientTimeout(connect=3, sock_read=5)
+        self.retries = retries
+        self.connections = connections
+        self.requests_per_second = requests_per_second
+
+        # Airtable limits requests per base: https://airtable.com/developers/web/api/rate-limits
+        self.limiters: dict[str, RateLimiter] = {}
+
+        self._session = None  # Lazy initialization inside of a running loop
+
+        self.logger = get_logger("Airtable")
+
+    @property
+    def session(self) -> aiohttp.ClientSession:
+        if self._session and not self._session.closed:
+            return self._session
+        self._session = aiohttp.ClientSession(
+            headers={"Authorization": f"Bearer {self.access_token}"},
+            timeout=self.timeout,
+            connector=aiohttp.TCPConnector(
+                limit=self.connections, keepalive_timeout=60, ttl_dns_cache=300
+            ),
+            raise_for_status=False,
+        )
+        return self._session
+
+    def table(self, base_id: str, name: str) -> AsyncTable:
+        return AsyncTable(self, base_id, name)
+
+    def limiter(self, base_id: str) -> RateLimiter:
+        if base_id not in self.limiters:
+            self.limiters[base_id] = RateLimiter(self.requests_per_second)
+        return self.limiters[base_id]
+
+    async def request(
+        self,
+        method: str,
+        path: str,
+        priority: Priority = Priority.NORMAL,
+        **kwargs,
+    ) -> dict:
+        url = f"{self.api_url}/{path}"
+        # Records live at `{base}/...`, webhooks at `bases/{base}/...`
+        limiter = self.limiter(base_id=path.removeprefix("bases/").split("/", 1)[0])
+
+        for attempt in count():
+            retry = attempt < self.retries
+
+            waited_at = monotonic()
+            await limiter.acquire(priority)
+            if (waited := monotonic() - waited_at) > 1:
+                self.logger.warning(
+                    f"{method} {path} waited {waited:.1f}s for the rate limiter"
+                )
+
+            try:
+                async with self.session.request(method, url, **kwargs) as response:
+                    if response.ok:
+                        return await response.json()
+                    if not retry or response.status not in self.retry_statuses:
+                        raise AirtableError(response.status, await response.text())
+            except (aiohttp.ClientConnectionError, TimeoutError):
+                if not retry:
+                    raise
+            await asyncio.sleep(self.retry_backoff * 2**attempt)
+
+    async def close(self):
+        if self._session:
+            await self._session.close()
+
+
+class AsyncTable:
+    """
+    Asyncio counterpart of `pyairtable.Table` with the subset of methods we use
+    """
+
+    # Airtable's limit of records per write request
+    batch_size = 10
+
+    def __init__(self, client: AirtableClient, base_id: str, name: str):
+        self.client = client
+        self.base_id = base_id
+        self.name = name
+
+    @property
+    def path(self) -> str:
+        return f"{self.base_id}/{quote(self.name)}"
+
+    async def iterate(
+        self,
+        fields: list[str] | None = None,
+        formula: Any = None,
+        page_size: int = 100,
+        priority: Priority = Priority.HIGH,
+    ) -> AsyncIterator[list[dict]]:
+        # POST variant isn't limited by URL length, long formulas are fine
+        body: dict[str, Any] = {"pageSize": page_size}
+        if fields is not None:
+            body["fields"] = fields
+        if formula is not None:
+            body["filterByFormula"] = str(formula)
+
+        while True:
+            page = await self.client.request(
+                "POST", f"{self.path}/listRecords", priority=priority, json=body
+            )
+            yield page["records"]
+            # Pages are linked by offsets, so they can't be fetched concurrently
+            if not (offset := page.get("offset")):
+                return
+            body["offset"] = offset
+
+    async def all(self, **options) -> list[dict]:
+        return [record async for page in self.iterate(**options) for record in page]
+
+    async def get(self, record_id: str, priority: Priority = Priority.HIGH) -> dict:
+        return await self.client.request(
+            "GET", f"{self.path}/{record_id}", priority=priority
+        )
+
+    async def create(self, fields: dict, priority: Priority = Priority.NORMAL) -> dict:
+        return await self.client.request(
+            "POST", self.path, priority=priority, json={"fields": fields}
+        )
+
+    async def update(
+        self, record_id: str, fields: dict, priority: Priority = Priority.NORMAL
+    ) -> dict:
+        return await self.client.request(
+            "PATCH",
+            f"{self.path}/{record_id}",
+            priority=priority,
+            json={"fields": fields},
+        )
+
+    async def _batches(
+        self, method: str, records: list[dict], priority: Priority, **extra
+    ) -> list[dict]:
+        # Batches don't depend on each other, so they are sent concurrently
+        return await asyncio.gather(
+            *(
+                self.client.request(
+                    method,
+                    self.path,
+                    priority=priority,
+                    json={"records": list(batch), **extra},
+                )
+                for batch in batched(records, self.batch_size, strict=False)
+            )
+        )
+
+    async def batch_create(
+        self, records: list[dict], priority: Priority = Priority.NORMAL
+    ) -> list[dict]:
+        responses = await self._batches(
+            "POST", [{"fields": r} for r in records], priority
+        )
+        return [record for response in responses for record in response["records"]]
+
+    async def batch_update(
+        self, records: list[dict], priority: Priority = Priority.NORMAL
+    ) -> list[dict]:
+        responses = await self._batches("PATCH", records, priority)
+        return [record for response in responses for record in response["records"]]
+
+    async def batch_upsert(
+        self,
+        records: list[dict],
+        key_fields: list[str],
+        priority: Priority = Priority.NORMAL,
+    ) -> dict:
+        responses = await self._batches(
+            "PATCH", records, priority, performUpsert={"fieldsToMergeOn": key_fields}
+        )
+        return {
+            key: [item for response in responses for item in response[key]]
+            for key in ("createdRecords", "updatedRecords", "records")
+        }
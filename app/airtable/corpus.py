@@ -0,0 +1,154 @@
+import functools
+import itertools
+import sys
+
+from array import array
+from dataclasses import dataclass
+from typing import TYPE_CHECKING
+
+from common.text import normalize
+from common.utils import get_logger
+from settings import config
+
+from airtable.search import TrigramIndex
+
+if TYPE_CHECKING:
+    from collections.abc import Sequence
+
+# Partition of keks with text and without attachments
+TEXT = "text"
+
+
+def normalize_text(html_text: str) -> str:
+    return normalize(html_text, stem=config.kek_search_stemming, markup=True)
+
+
+# Users type and page the same queries, so their forms are cached
+@functools.lru_cache(maxsize=4096)
+def normalize_query(query: str) -> str:
+    return normalize(query, stem=config.kek_search_stemming)
+
+
+_versions = itertools.count(1)
+
+logger = get_logger("KekCorpus")
+
+
+def parse_weight(record: dict) -> float:
+    weight = record["fields"].get("Weight")
+    if weight is None:
+        return 1.0
+    # Broken formulas give `{"error": "#ERROR!"}` or `{"specialValue": "NaN"}`
+    if isinstance(weight, bool) or not isinstance(weight, int | float):
+        logger.warning(f"Kek {record['id']} has non-numeric weight {weight!r}")
+        return 1.0
+    return float(weight)
+
+
+@dataclass(slots=True, frozen=True)
+class Kek:
+    index: int
+    id: str
+    text: str | None
+    attachment_type: str | None
+    attachment_file_id: str | None
+
+
+class KekCorpus:
+    """
+    Compact snapshot of the kek List, built once per refresh
+
+    Fields are stored as parallel columns addressed by dense kek indices,
+    instead of a nested Airtable dict per kek. Indices are also partitioned
+    by attachment type, text-only keks being the `TEXT` partition
+    """
+
+    __slots__ = (
+        "attachment_file_ids",
+        "attachment_types",
+        "ids",
+        "index",
+        "partitions",
+        "search_index",
+        "texts",
+        "texts_normalized",
+        "version",
+        "weights",
+    )
+
+    def __init__(self, records: list[dict]):
+        # Unique per snapshot, to key anything derived from it
+        self.version = next(_versions)
+
+        self.ids: list[str] = []
+        self.texts: list[str | None] = []
+        self.attachment_types: list[str | None] = []
+        self.attachment_file_ids: list[str | None] = []
+        # Numeric `Weight` field for weighted random keks, 1 if missing or broken
+        self.weights = array("d")
+
+        for record in records:
+            fields = record["fields"]
+            text = fields.get("Text")
+            attachment_type = fields.get("AttachmentType")
+
+            self.ids.append(record["id"])
+            self.texts.append(text)
+            # A handful of distinct types, so share one string object per type
+            self.attachment_types.append(
+                sys.intern(attachment_type) if attachment_type else None
+            )
+            self.attachment_file_ids.append(fields.get("AttachmentFileID"))
+            self.weights.append(parse_weight(record))
+
+        # Airtable record id -> dense kek index
+        self.index: dict[str, int] = {rid: i for i, rid in enumerate(self.ids)}
+
+        # Attachment type -> indices of keks with it, in order of the corpus
+        self.partitions: dict[str, array] = {}
+        for i, (text, attachment_type) in enumerate(
+            zip(self.texts, self.attachment_types, strict=True)
+        ):
+            if kind := attachment_type or (text and TEXT):
+                self.partitions.setdefault(kind, array("I")).append(i)
+
+        # Built on the first search, not every refresh needs them
+        self.texts_normalized: list[str] | None = None
+        self.search_index: TrigramIndex | None = None
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def __getitem__(self, index: int) -> Kek:
+        return Kek(
+            index=index,
+            id=self.ids[index],
+            text=self.texts[index],
+            attachment_type=self.attachment_types[index],
+            attachment_file_id=self.attachment_file_ids[index],
+        )
+
+    def partition(self, kind: str) -> Sequence[int]:
+        """
+        Indices of keks with an attachment type, or text-only ones for `TEXT`
+        """
+        return self.partitions.get(kind, ())
+
+    def text_index(self) -> TrigramIndex:
+        """
+        Search index of text-only keks by their normalized texts
+        """
+        if self.search_index is None:
+            self.texts_normalized = [normalize_text(t) if t else "" for t in self.texts]
+            self.search_index = TrigramIndex(
+                self.texts_normalized, self.partition(TEXT)
+            )
+        return self.search_index
+
+    def get(self, record_id: str) -> Kek | None:
+        index = self.index.get(record_id)
+        return None if index is None else self[index]
+
+    def set_file_id(self, record_id: str, attachment_file_id: str):
+        if (index := self.index.get(record_id)) is not None:
+            self.attachment_file_ids[index] = attachment_file_id
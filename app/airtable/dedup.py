@@ -0,0 +1,124 @@
+import hashlib
+
+from typing import TYPE_CHECKING, NamedTuple
+
+if TYPE_CHECKING:
+    from collections.abc import Collection
+
+
+class Duplicate(NamedTuple):
+    # Table with the kek, `List` or `Suggestions`
+    table: str
+    # None while the kek waits in the outbox
+    record_id: str | None
+
+
+def text_key(text: str) -> bytes:
+    # Case and spacing don't make another kek
+    normalized = " ".join(text.casefold().split())
+    return hashlib.blake2b(normalized.encode(), digest_size=16).digest()
+
+
+class DedupIndex:
+    """
+    Keks already in the List or the Suggestions, to catch suggested duplicates
+
+    Keks with attachments are keyed by Telegram `file_unique_id`, the same for
+    a file sent again by anyone, and text keks by a hash of their normalized text
+    """
+
+    def __init__(self):
+        # Key -> keks with it, several if the List already has duplicates
+        self.keys: dict[bytes | str, set[Duplicate]] = {}
+        # Synced kek -> its key, to drop keys of changed or deleted keks.
+        # Pending keks stay until their table is synced from scratch
+        self.kek_keys: dict[Duplicate, bytes | str] = {}
+
+    def __len__(self) -> int:
+        return len(self.kek_keys)
+
+    @staticmethod
+    def key(text: str | None, attachment_unique_id: str | None) -> bytes | str | None:
+        if attachment_unique_id:
+            return attachment_unique_id
+        if text and text.strip():
+            return text_key(text)
+        return None
+
+    def add(
+        self,
+        table: str,
+        record_id: str | None,
+        text: str | None,
+        attachment_type: str | None,
+        attachment_unique_id: str | None,
+    ):
+        kek = Duplicate(table, record_id)
+        if record_id is not None:
+            self.discard(kek)
+
+        # Captions repeat, so an attachment without a unique id is no key
+        if attachment_type and not attachment_unique_id:
+            return
+        if (key := self.key(text, attachment_unique_id)) is None:
+            return
+
+        self.keys.setdefault(key, set()).add(kek)
+        if record_id is not None:
+            self.kek_keys[kek] = key
+
+    def discard(self, kek: Duplicate):
+        if (key := self.kek_keys.pop(kek, None)) is None:
+            return
+        keks = self.keys[key]
+        keks.discard(kek)
+        if not keks:
+            del self.keys[key]
+
+    def find(
+        self, text: str | None, attachment_unique_id: str | None
+    ) -> Duplicate | None:
+        keks = self.keys.get(self.key(text, attachment_unique_id))
+        if not keks:
+            return None
+        # A kek in the List is a better answer than a pending suggestion
+        return min(keks, key=lambda kek: (kek.table != "List", kek.record_id is None))
+
+    def apply(
+        self,
+        table: str,
+        records: list[dict],
+        deleted_ids: Collection[str] = (),
+        replace: bool = False,
+    ):
+        if replace:
+            for kek in [kek for kek in self.kek_keys if kek.table == table]:
+                self.discard(kek)
+            pending = Duplicate(table, None)
+            for key in [key for key, keks in self.keys.items() if pending in keks]:
+                self.keys[key].discard(pending)
+                if not self.keys[key]:
+                    del self.keys[key]
+
+        for record_id in deleted_ids:
+            self.discard(Duplicate(table, record_id))
+
+        for record in records:
+            fields = record["fields"]
+            self.add(
+                table,
+                record["id"],
+                fields.get("Text"),
+                fields.get("AttachmentType"),
+                fields.get("AttachmentUniqueID"),
+            )
+
+    def apply_keks(
+        self, records: list[dict], deleted_ids: Collection[str] = (), replace=False
+    ):
+        self.apply("List", records, deleted_ids, replace)
+
+    def apply_suggestions(
+        self, records: list[dict], deleted_ids: Collection[str] = (), replace=False
+    ):
+        self.apply("Suggestions", records, deleted_ids, replace)
@@ -1,201 +1,407 @@
-from typing import TYPE_CHECKING
+import asyncio
 
-from aiocache import cached
-from common.executor import ThreadPoolExecutor
-from pyairtable import Api, retry_strategy
+from typing import TYPE_CHECKING, ClassVar
+
+from common.cache import stale_while_revalidate
+from common.metrics import metrics
+from common.rate_limiter import Priority
+from common.tg import create_sensitive_url_from_file_id
 from settings import config
 
+from airtable.backends import create_backend
+from airtable.client import AirtableClient
+from airtable.corpus import KekCorpus
+from airtable.dedup import DedupIndex, Duplicate
+from airtable.mirror import TableMirror
+from airtable.outbox import Outbox
+from airtable.stats import KekStats
+from airtable.write_behind import WriteBehind
+
 if TYPE_CHECKING:
+    from aiogram import Bot
     from aiogram.types import User
 
+    from airtable.backends import MirrorBackend
+
+# Webhook pushes changes right away, so polling is only a safety net then
+cache_ttl = (
+    config.kek_webhook_cache_ttl if config.airtable_webhook_id else config.kek_cache_ttl
+)
+
 
 class KekStorage:
     """
     Kek Storage connected to Airtable base
 
     https://airtable.com/appG5koP3D8kWbLdl/
+
+    Airtable is the source of truth, tables are mirrored to a backend
+    chosen by `airtable_mirror_backend` setting
     """
 
-    def __init__(self):
-        self.api = Api(
+    # Fields read by each use case. Tables are cached with the union of them,
+    # while the heavy `Attachment` field is only fetched per kek when needed
+    list_projections: ClassVar[dict[str, list[str]]] = {
+        "search": ["Text", "AttachmentType"],
+        "send": ["Text", "AttachmentType", "AttachmentFileID"],
+        "stats": ["AttachmentType"],
+        "dedup": ["Text", "AttachmentType"],
+    }
+    suggestions_projections: ClassVar[dict[str, list[str]]] = {
+        "dedup": ["Text", "AttachmentType"],
+    }
+    users_projections: ClassVar[dict[str, list[str]]] = {
+        "stats": ["Name", "TelegramID", "Author", "Suggestor"],
+        "upsert": ["TelegramID", "Name", "Username", "LanguageCode"],
+    }
+
+    @staticmethod
+    def _fields(projections: dict[str, list[str]]) -> list[str]:
+        return sorted({f for fields in projections.values() for f in fields})
+
+    def __init__(self, backend: MirrorBackend):
+        if config.kek_sampler == "weighted":
+            # Only then the List is expected to have the field
+            self.list_projections = self.list_projections | {"sample": ["Weight"]}
+        if config.kek_attachment_unique_ids:
+            # Airtable rejects the whole request with a field missing in the base
+            unique_ids = {"dedup_attachments": ["AttachmentUniqueID"]}
+            self.list_projections = self.list_projections | unique_ids
+            self.suggestions_projections = self.suggestions_projections | unique_ids
+
+        self.client = AirtableClient(
             config.airtable_access_token,
-            timeout=(3, 5),
-            retry_strategy=retry_strategy(total=2),
+            requests_per_second=config.airtable_requests_per_second,
+        )
+
+        self.list = self.client.table(config.airtable_base_id, "List")
+        self.users = self.client.table(config.airtable_base_id, "Users")
+        self.suggestions = self.client.table(config.airtable_base_id, "Suggestions")
+
+        self.backend = backend
+        self.list_mirror = TableMirror(
+            self.list, backend, fields=self._fields(self.list_projections)
+        )
+        self.users_mirror = TableMirror(
+            self.users, backend, fields=self._fields(self.users_projections)
         )
+        self.suggestions_mirror = TableMirror(
+            self.suggestions,
+            backend,
+            fields=self._fields(self.suggestions_projections),
+        )
+        # Aggregates for /kek_info, following both mirrors
+        self.stats = KekStats()
+        self.list_mirror.listeners.append(self.stats.apply_keks)
+        self.users_mirror.listeners.append(self.stats.apply_users)
+        # Keks of the List and the Suggestions, to catch suggested duplicates
+        self.dedup = DedupIndex()
+        self.list_mirror.listeners.append(self.dedup.apply_keks)
+        self.suggestions_mirror.listeners.append(self.dedup.apply_suggestions)
 
-        self.base = self.api.base(config.airtable_base_id)
+        # The latest corpus built from the mirror, and the mirror revision of it
+        self.corpus: KekCorpus | None = None
+        self.corpus_revision: int | None = None
 
-        self.list = self.base.table("List")
-        self.users = self.base.table("Users")
-        self.suggestions = self.base.table("Suggestions")
+        # Resolves attachment URLs of outbox entries, set on startup
+        self.bot: Bot | None = None
 
-        self.executor = ThreadPoolExecutor(max_workers=1)
+        # Telegram user with profile fingerprint -> Airtable record id
+        self.user_record_ids: dict[tuple, str] = {}
 
-    def all(self):
-        return self.list.all()
+        self.file_id_updates = WriteBehind(
+            self.update_file_ids, interval=config.kek_file_id_flush_interval
+        )
+        self.outbox = Outbox(config.airtable_outbox_path, self.create_rows)
 
-    @cached(ttl=5 * 60, noself=True)
-    async def async_all(self):
-        result, timeouted = await self.executor.run(self.all)
-        if timeouted:
-            raise TimeoutError()
-        return result
+        metrics.register("outbox", self.outbox.stats)
+        metrics.register(
+            "airtable_limiter",
+            lambda: self.client.limiter(config.airtable_base_id).stats(),
+        )
+
+    @stale_while_revalidate(ttl=cache_ttl, max_staleness=config.kek_cache_max_staleness)
+    async def async_corpus(self) -> KekCorpus:
+        await self.list_mirror.sync()
+        return await self._refresh_corpus()
 
-    def all_users(self):
-        return self.users.all()
+    async def _refresh_corpus(self) -> KekCorpus:
+        """
+        Builds a corpus of the mirrored List once it has changed. Another corpus
+        has another version, dropping search caches and remapping shuffle bags
+        """
+        revision = self.list_mirror.revision
+        if self.corpus is not None and revision == self.corpus_revision:
+            return self.corpus
 
-    @cached(ttl=5 * 60, noself=True)
+        corpus = KekCorpus(self.list_mirror.all())
+        # Seconds for a large List, so the loop keeps serving the previous corpus
+        await asyncio.to_thread(corpus.text_index)
+        self.corpus, self.corpus_revision = corpus, revision
+        return corpus
+
+    @stale_while_revalidate(ttl=cache_ttl, max_staleness=config.kek_cache_max_staleness)
     async def async_all_users(self):
-        result, timeouted = await self.executor.run(self.all_users)
-        if timeouted:
-            raise TimeoutError()
-        return result
-
-    def upsert_user(self, user: User):
-        user_row = {
-            "fields": {
-                "TelegramID": user.id,
-                "Name": user.full_name,
-                "Username": user.username,
-                "LanguageCode": user.language_code,
-            }
+        records = await self.users_mirror.sync()
+        self._remember_users(records)
+        return records
+
+    @stale_while_revalidate(ttl=cache_ttl, max_staleness=config.kek_cache_max_staleness)
+    async def async_suggestions(self) -> list[dict]:
+        return await self.suggestions_mirror.sync()
+
+    def find_duplicate(
+        self, text: str | None, attachment_unique_id: str | None
+    ) -> Duplicate | None:
+        """
+        Kek in the List or the Suggestions same as the given one, if any.
+        Only tables loaded so far are checked, never waiting for Airtable,
+        and expired ones are refreshed in background for the next checks
+        """
+        KekStorage.async_corpus.prefetch(self)
+        KekStorage.async_suggestions.prefetch(self)
+        return self.dedup.find(text, attachment_unique_id)
+
+    async def async_stats(self) -> KekStats:
+        """
+        Stats of fresh enough tables, refreshed with them in background
+        """
+        await self.async_corpus()
+        await self.async_all_users()
+        return self.stats
+
+    async def warm_up(self, bot: Bot | None = None):
+        """
+        Serves tables persisted by the previous run right away,
+        and revalidates them in background. Writes journaled but not sent
+        by the previous run are replayed
+        """
+        self.bot = bot
+        self.outbox.start()
+
+        if await self.list_mirror.load():
+            age = self.list_mirror.age()
+            KekStorage.async_corpus.seed(self, await self._refresh_corpus(), age=age)
+
+        if await self.users_mirror.load():
+            age = self.users_mirror.age()
+            records = self.users_mirror.all()
+            self._remember_users(records)
+            KekStorage.async_all_users.seed(self, records, age=age)
+
+        if await self.suggestions_mirror.load():
+            age = self.suggestions_mirror.age()
+            records = self.suggestions_mirror.all()
+            KekStorage.async_suggestions.seed(self, records, age=age)
+
+        KekStorage.async_corpus.revalidate(self)
+        KekStorage.async_all_users.revalidate(self)
+        KekStorage.async_suggestions.revalidate(self)
+
+    async def apply_changes(self, record_ids: set[str], deleted_ids: set[str]):
+        """
+        Applies records changed in Airtable to the mirrors and cached tables
+        """
+        if await self.list_mirror.update(record_ids, deleted_ids):
+            KekStorage.async_corpus.seed(self, await self._refresh_corpus())
+
+        if await self.users_mirror.update(record_ids, deleted_ids):
+            records = self.users_mirror.all()
+            self._remember_users(records)
+            KekStorage.async_all_users.seed(self, records)
+
+        if await self.suggestions_mirror.update(record_ids, deleted_ids):
+            records = self.suggestions_mirror.all()
+            KekStorage.async_suggestions.seed(self, records)
+
+    async def async_attachment_url(self, kek_id: str) -> str | None:
+        record = await self.list.get(kek_id)
+        attachment = record["fields"].get("Attachment")
+        return attachment and attachment[0]["url"]
+
+    @staticmethod
+    def _user_fields(user: User) -> dict:
+        return {
+            "TelegramID": user.id,
+            "Name": user.full_name,
+            "Username": user.username,
+            "LanguageCode": user.language_code,
         }
 
-        records = self.users.batch_upsert([user_row], key_fields=["TelegramID"])
+    @staticmethod
+    def _user_key(fields: dict) -> tuple:
+        # Telegram ID with a profile fingerprint, so renamed users are upserted again
+        return (
+            fields.get("TelegramID"),
+            fields.get("Name"),
+            fields.get("Username"),
+            fields.get("LanguageCode"),
+        )
+
+    def _remember_users(self, records: list[dict]):
+        for record in records:
+            self.user_record_ids[self._user_key(record["fields"])] = record["id"]
+
+    async def upsert_users(self, *users: User) -> list[str]:
+        """
+        Returns Airtable record ids of users, upserting unknown ones in one request
+        """
+        return await self.upsert_user_rows(*map(self._user_fields, users))
+
+    async def upsert_user_rows(self, *rows: dict) -> list[str]:
+        missing = [
+            row for row in rows if self._user_key(row) not in self.user_record_ids
+        ]
+        if missing:
+            # One row per user, the latest profile wins
+            latest = {row["TelegramID"]: row for row in missing}
+            result = await self.users.batch_upsert(
+                [{"fields": row} for row in latest.values()],
+                key_fields=["TelegramID"],
+            )
+            record_ids = {
+                record["fields"]["TelegramID"]: record["id"]
+                for record in result["records"]
+            }
+            # Every profile of a user in the batch maps to the same record
+            for row in missing:
+                record_id = record_ids[row["TelegramID"]]
+                self.user_record_ids[self._user_key(row)] = record_id
 
-        return records[0]["id"]
+        return [self.user_record_ids[self._user_key(row)] for row in rows]
 
     def _create_row(
         self,
         text,
         attachment_type,
-        attachment_url,
-        attachment_filename,
         attachment_file_id,
-        author_record_id,
-        suggestor_record_id=None,
+        attachment_unique_id,
     ):
         row = {
             "Text": text,
             "AttachmentType": attachment_type,
             "AttachmentFileID": attachment_file_id,
-            "Author": [author_record_id],
         }
-        if attachment_url:
-            row["Attachment"] = [
-                {"url": attachment_url, "filename": attachment_filename}
-            ]
-        if suggestor_record_id:
-            row["Suggestor"] = [suggestor_record_id]
+        if config.kek_attachment_unique_ids:
+            row["AttachmentUniqueID"] = attachment_unique_id
         return row
 
-    def add(
-        self,
-        author: User,
-        suggestor: User,
-        text: str | None,
-        attachment_url: str | None,
-        attachment_type: str | None,
-        attachment_filename: str | None,
+    @staticmethod
+    def _attachment(
         attachment_file_id: str | None,
-    ):
-        author_record_id = self.upsert_user(author)
-        suggestor_record_id = self.upsert_user(suggestor)
-        row = self._create_row(
-            text,
-            attachment_type,
-            attachment_url,
-            attachment_filename,
-            attachment_file_id,
-            author_record_id,
-            suggestor_record_id,
-        )
-        return self.suggestions.create(row)
+        attachment_filename: str | None,
+        attachment_unique_id: str | None,
+    ) -> dict | None:
+        # Telegram file URLs expire in an hour and hold the bot token,
+        # so the outbox journals the file id and gets the URL right before sending
+        if not attachment_file_id:
+            return None
+        return {
+            "file_id": attachment_file_id,
+            "filename": attachment_filename,
+            "unique_id": attachment_unique_id,
+        }
 
     async def async_add(
         self,
         author: User,
         suggestor: User,
         text: str | None,
-        attachment_url: str | None,
         attachment_type: str | None,
         attachment_filename: str | None,
         attachment_file_id: str | None,
-    ):
-        result, timeouted = await self.executor.run(
-            self.add,
-            author,
-            suggestor,
-            text,
-            attachment_url,
-            attachment_type,
-            attachment_filename,
-            attachment_file_id,
+        attachment_unique_id: str | None = None,
+    ) -> asyncio.Future[bool]:
+        """
+        Journals a suggestion, it's sent to Airtable in background.
+        The returned future tells whether Airtable accepted it
+        """
+        row = self._create_row(
+            text, attachment_type, attachment_file_id, attachment_unique_id
+        )
+        attachment = self._attachment(
+            attachment_file_id, attachment_filename, attachment_unique_id
+        )
+        users = {
+            "Author": self._user_fields(author),
+            "Suggestor": self._user_fields(suggestor),
+        }
+        self.dedup.add("Suggestions", None, text, attachment_type, attachment_unique_id)
+        return self.outbox.put(
+            "Suggestions", {"row": row, "attachment": attachment, "users": users}
         )
-        if timeouted:
-            raise TimeoutError()
-        return result
 
-    def push(
+    async def async_push(
         self,
         author: User,
         text: str | None,
-        attachment_url: str | None,
         attachment_type: str | None,
         attachment_filename: str | None,
         attachment_file_id: str | None,
-    ):
-        author_record_id = self.upsert_user(author)
+        attachment_unique_id: str | None = None,
+    ) -> asyncio.Future[bool]:
+        """
+        Journals a kek for the List, it's sent to Airtable in background
+        """
         row = self._create_row(
-            text,
-            attachment_type,
-            attachment_url,
-            attachment_filename,
-            attachment_file_id,
-            author_record_id,
+            text, attachment_type, attachment_file_id, attachment_unique_id
+        )
+        attachment = self._attachment(
+            attachment_file_id, attachment_filename, attachment_unique_id
+        )
+        users = {"Author": self._user_fields(author)}
+        self.dedup.add("List", None, text, attachment_type, attachment_unique_id)
+        return self.outbox.put(
+            "List", {"row": row, "attachment": attachment, "users": users}
         )
-        return self.list.create(row)
 
-    async def async_push(
-        self,
-        author: User,
-        text: str | None,
-        attachment_url: str | None,
-        attachment_type: str | None,
-        attachment_filename: str | None,
-        attachment_file_id: str | None,
-    ):
-        result, timeouted = await self.executor.run(
-            self.push,
-            author,
-            text,
-            attachment_url,
-            attachment_type,
-            attachment_filename,
-            attachment_file_id,
+    async def _attachment_field(self, attachment: dict | None) -> dict:
+        """
+        `Attachment` field with a fresh Telegram URL, Airtable downloads the file
+        """
+        if not attachment:
+            return {}
+        url = await create_sensitive_url_from_file_id(
+            self.bot, attachment["file_id"], attachment["unique_id"]
         )
-        if timeouted:
-            raise TimeoutError()
-        return result
+        return {"Attachment": [{"url": url, "filename": attachment["filename"]}]}
 
-    def update_file_id(
-        self,
-        kek_id: str,
-        attachment_file_id: str,
-    ):
-        return self.list.update(kek_id, {"AttachmentFileID": attachment_file_id})
+    async def create_rows(self, entries: list[dict]):
+        """
+        Creates rows journaled in the outbox, all of them of the same table
+        """
+        table = {"List": self.list, "Suggestions": self.suggestions}[entries[0]["kind"]]
 
-    async def async_update_file_id(
-        self,
-        kek_id: str,
-        attachment_file_id: str,
-    ):
-        result, timeouted = await self.executor.run(
-            self.update_file_id, kek_id, attachment_file_id
+        users = [user for entry in entries for user in entry["users"].values()]
+        record_ids = iter(await self.upsert_user_rows(*users))
+        attachments = await asyncio.gather(
+            *(self._attachment_field(entry.get("attachment")) for entry in entries)
         )
-        if timeouted:
-            raise TimeoutError()
-        return result
+
+        rows = [
+            entry["row"]
+            | attachment
+            | {field: [next(record_ids)] for field in entry["users"]}
+            for entry, attachment in zip(entries, attachments, strict=True)
+        ]
+        return await table.batch_create(rows)
+
+    async def update_file_ids(self, records: list[dict]):
+        return await self.list.batch_update(records, priority=Priority.LOW)
+
+    def queue_file_id_update(self, kek_id: str, attachment_file_id: str):
+        fields = {"AttachmentFileID": attachment_file_id}
+        # Cached keks see the new file id right away, Airtable gets it with a batch
+        self.list_mirror.patch(kek_id, fields)
+        if self.corpus:
+            self.corpus.set_file_id(kek_id, attachment_file_id)
+        self.file_id_updates.put(kek_id, fields)
+
+    async def close(self):
+        await self.outbox.close()
+        await self.file_id_updates.close()
+        await self.client.close()
+        await self.backend.close()
 
 
-kek_storage = KekStorage()
+kek_storage = KekStorage(create_backend())
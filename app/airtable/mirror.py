@@ -0,0 +1,193 @@
+import dataclasses
+
+from datetime import UTC, datetime, timedelta
+from itertools import batched
+from typing import TYPE_CHECKING, Any
+
+from pyairtable.formulas import EQ, IS_AFTER, LAST_MODIFIED_TIME, OR, RECORD_ID
+
+from airtable.backends import SyncState
+
+if TYPE_CHECKING:
+    from collections.abc import Callable, Collection
+
+    from airtable.backends import MirrorBackend
+    from airtable.client import AsyncTable
+
+
+class TableMirror:
+    """
+    Copy of an Airtable table in a mirror backend kept fresh by delta syncs
+
+    Only records modified since the previous sync are requested, so a restart
+    continues from the persisted state instead of paging the whole table again.
+    Processes sharing a backend reuse syncs made by each other
+    """
+
+    # Overlap between delta syncs to tolerate clock skew with Airtable
+    sync_overlap = timedelta(minutes=1)
+    # Record ids per `RECORD_ID()` formula of an update
+    update_batch_size = 50
+
+    def __init__(
+        self,
+        table: AsyncTable,
+        backend: MirrorBackend,
+        fields: list[str] | None = None,
+        full_sync_interval: timedelta = timedelta(days=1),
+    ):
+        self.table = table
+        self.backend = backend
+        self.fields = fields
+        # Deleted records never show up in a delta, so drop them with a rare full sync
+        self.full_sync_interval = full_sync_interval
+
+        self.records: dict[str, dict] = {}
+        # State of the records above, None until they are loaded or synced
+        self.state: SyncState | None = None
+        # Start of the previous `sync` call in this process
+        self.checked_at: datetime | None = None
+        # Bumped whenever the records change, unlike syncs bringing them again
+        # within the overlap, so data built from them is only rebuilt then
+        self.revision = 0
+
+        # Called with saved or loaded records, ids of deleted ones, and whether
+        # the records replace everything known before
+        self.listeners: list[Callable[[list[dict], Collection[str], bool], Any]] = []
+
+    @property
+    def name(self) -> str:
+        # Another set of fields is another mirror, it starts with a full sync
+        if self.fields is None:
+            return self.table.name
+        return f"{self.table.name}[{','.join(self.fields)}]"
+
+    async def load(self) -> bool:
+        """
+        Loads records saved by a previous run or another process, if any
+        """
+        state = await self.backend.state(self.name)
+        if state is None:
+            return False
+
+        self.records = {r["id"]: r for r in await self.backend.load(self.name)}
+        self.state = state
+        self.revision += 1
+        self._notify(self.all(), replace=True)
+        return True
+
+    def _notify(
+        self,
+        records: list[dict],
+        deleted_ids: Collection[str] = (),
+        replace: bool = False,
+    ):
+        for listener in self.listeners:
+            listener(records, deleted_ids, replace)
+
+    async def _save(
+        self,
+        records: list[dict],
+        state: SyncState,
+        replace: bool = False,
+        deleted_ids: Collection[str] = (),
+    ):
+        await self.backend.save(
+            self.name, records, state, replace=replace, deleted_ids=deleted_ids
+        )
+        self.state = state
+        self._notify(records, deleted_ids, replace)
+
+    def needs_full_sync(self, now: datetime) -> bool:
+        return (
+            self.state is None
+            or now - self.state.full_synced_at > self.full_sync_interval
+        )
+
+    async def sync(self) -> list[dict]:
+        # Another process syncing the same mirror is waited for, then reused
+        async with self.backend.lock(self.name):
+            return await self._sync()
+
+    async def _sync(self) -> list[dict]:
+        started_at = datetime.now(UTC)
+        checked_at, self.checked_at = self.checked_at, started_at
+
+        shared = await self.backend.state(self.name)
+        if shared is None:
+            self.state = None  # Never saved or lost by the backend, sync it fully
+        elif shared != self.state:
+            await self.load()
+            if checked_at and shared.synced_at > checked_at:
+                # Another process has synced since the previous call, reuse it
+                return self.all()
+
+        if self.needs_full_sync(started_at):
+            records = await self.table.all(fields=self.fields)
+            fresh = {r["id"]: r for r in records}
+            changed = fresh != self.records
+            self.records = fresh
+            full_synced_at, replace = started_at, True
+        else:
+            since = self.state.synced_at - self.sync_overlap
+            formula = IS_AFTER(LAST_MODIFIED_TIME(), since)
+            records = await self.table.all(fields=self.fields, formula=formula)
+            changed = any(self.records.get(r["id"]) != r for r in records)
+            for record in records:
+                self.records[record["id"]] = record
+            full_synced_at, replace = self.state.full_synced_at, False
+
+        if changed:
+            self.revision += 1
+
+        state = SyncState(
+            synced_at=started_at,
+            full_synced_at=full_synced_at,
+            updated_at=datetime.now(UTC),
+        )
+        await self._save(records, state, replace=replace)
+
+        return self.all()
+
+    async def update(
+        self, record_ids: Collection[str], deleted_ids: Collection[str] = ()
+    ) -> bool:
+        """
+        Refetches changed records and drops deleted ones, ids of other tables are
+        ignored. Returns whether anything changed in the mirror
+        """
+        if self.state is None:
+            return False  # The first sync brings everything anyway
+
+        records = []
+        for ids in batched(sorted(record_ids), self.update_batch_size, strict=False):
+            formula = OR(*(EQ(RECORD_ID(), record_id) for record_id in ids))
+            records += await self.table.all(fields=self.fields, formula=formula)
+
+        deleted = [rid for rid in deleted_ids if self.records.pop(rid, None)]
+        for record in records:
+            self.records[record["id"]] = record
+
+        if not (records or deleted):
+            return False
+
+        self.revision += 1
+        state = dataclasses.replace(self.state, updated_at=datetime.now(UTC))
+        await self._save(records, state, deleted_ids=deleted)
+        return True
+
+    def age(self) -> float | None:
+        """
+        Seconds since the last sync, persisted ones included
+        """
+        if self.state is None:
+            return None
+        return (datetime.now(UTC) - self.state.synced_at).total_seconds()
+
+    def patch(self, record_id: str, fields: dict):
+        # In memory only: Airtable is the source of truth and the next delta brings it
+        if record := self.records.get(record_id):
+            record["fields"].update(fields)
+
+    def all(self) -> list[dict]:
+        return list(self.records.values())
@@ -0,0 +1,231 @@
+import asyncio
+import contextlib
+import json
+import os
+
+from pathlib import Path
+from time import time
+from typing import TYPE_CHECKING, Any
+from uuid import uuid4
+
+import aiohttp
+
+from aiogram.exceptions import (
+    TelegramNetworkError,
+    TelegramRetryAfter,
+    TelegramServerError,
+)
+from common.utils import get_logger
+
+from airtable.client import AirtableClient, AirtableError
+
+if TYPE_CHECKING:
+    from collections.abc import Awaitable, Callable
+    from typing import TextIO
+
+
+def is_transient(e: Exception) -> bool:
+    # Airtable, Telegram resolving attachments or the network failed, sending
+    # it again later may help. Anything else is a rejection or a bug,
+    # it'd fail the same way forever
+    if isinstance(e, AirtableError):
+        return e.status >= 500 or e.status in AirtableClient.retry_statuses
+    return isinstance(
+        e,
+        (
+            aiohttp.ClientError,
+            TimeoutError,
+            TelegramNetworkError,
+            TelegramRetryAfter,
+            TelegramServerError,
+        ),
+    )
+
+
+class Outbox:
+    """
+    Append-only local journal of writes to Airtable, drained in background
+
+    An entry is journaled before anything is sent and marked done once Airtable
+    has it, so writes survive Airtable outages and restarts of the bot.
+    Entries of the same kind are sent in batches, in order of their arrival.
+    """
+
+    # Airtable's limit of records per write request
+    batch_size = 10
+
+    # Backoff between drains while Airtable is failing
+    retry_interval = 5.0
+    max_retry_interval = 5 * 60.0
+
+    def __init__(self, path: str, send: Callable[[list[dict]], Awaitable]):
+        self.path = Path(path)
+        # Sends a batch of entries of the same kind
+        self.send = send
+
+        # Entries not yet sent by id, in order of arrival
+        self.pending: dict[str, dict] = {}
+        # Resolved once Airtable has an entry or rejects it, for this run's entries
+        self.confirmations: dict[str, asyncio.Future[bool]] = {}
+        self.journal: TextIO | None = None  # Lazy initialization, no disk on import
+
+        self.lock = asyncio.Lock()
+        self.wakeup = asyncio.Event()
+        self.worker: asyncio.Task | None = None
+
+        self.sent = 0
+        self.failures = 0
+        self.dropped = 0
+
+        self.logger = get_logger("Outbox")
+
+    def replay(self):
+        """
+        Restores entries the previous run didn't manage to send
+        """
+        if not self.path.exists():
+            return
+
+        with self.path.open(encoding="utf-8") as journal:
+            for line in journal:
+                try:
+                    item = json.loads(line)
+                except json.JSONDecodeError:
+                    continue  # Torn write of a crash, the entry was never confirmed
+                if "done" in item:
+                    self.pending.pop(item["done"], None)
+                else:
+                    self.pending[item["id"]] = item
+
+        if self.pending:
+            self.logger.info(f"Replaying {len(self.pending)} entries")
+
+    def _open(self) -> TextIO:
+        if self.journal is None:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            self.journal = self.path.open("a", encoding="utf-8")
+        return self.journal
+
+    def _append(self, *items: dict):
+        journal = self._open()
+        journal.writelines(json.dumps(item) + "\n" for item in items)
+        journal.flush()
+        os.fsync(journal.fileno())
+
+    def put(self, kind: str, payload: dict[str, Any]) -> asyncio.Future[bool]:
+        """
+        Journals an entry. The returned future tells whether Airtable accepted it
+        """
+        entry = {"id": uuid4().hex, "kind": kind, "created_at": time(), **payload}
+        self._append(entry)
+        self.pending[entry["id"]] = entry
+        self.wakeup.set()
+
+        confirmation = asyncio.get_running_loop().create_future()
+        self.confirmations[entry["id"]] = confirmation
+        return confirmation
+
+    def _done(self, entries: list[dict], sent: bool = True):
+        for entry in entries:
+            self.pending.pop(entry["id"], None)
+            confirmation = self.confirmations.pop(entry["id"], None)
+            if confirmation and not confirmation.done():
+                confirmation.set_result(sent)
+
+        if self.pending:
+            self._append(*({"done": entry["id"]} for entry in entries))
+        else:
+            # Nothing left to replay, so the journal starts over
+            journal = self._open()
+            journal.truncate(0)
+            os.fsync(journal.fileno())
+
+    def _next_batch(self) -> list[dict]:
+        entries = iter(self.pending.values())
+        batch = [next(entries)]
+        for entry in entries:
+            if len(batch) == self.batch_size:
+                break
+            if entry["kind"] == batch[0]["kind"]:
+                batch.append(entry)
+        return batch
+
+    async def _send(self, batch: list[dict]) -> bool:
+        try:
+            await self.send(batch)
+        except Exception as e:
+            if is_transient(e):
+                self.failures += 1
+                self.logger.warning(f"Failed to send {len(batch)} entries: {e!r}")
+                return False
+
+            if len(batch) > 1:
+                # Find the failing entry, without holding back the others
+                for entry in batch:
+                    if not await self._send([entry]):
+                        return False
+                return True
+
+            self.dropped += 1
+            self.logger.error(f"Failed to send {batch[0]!r}, dropped: {e!r}")
+            self._done(batch, sent=False)
+            return True
+
+        self.sent += len(batch)
+        self._done(batch)
+        return True
+
+    async def drain(self) -> bool:
+        """
+        Sends pending entries, returns whether all of them are sent
+        """
+        async with self.lock:
+            while self.pending:
+                if not await self._send(self._next_batch()):
+                    return False
+            return True
+
+    async def _run(self):
+        delay = self.retry_interval
+        while True:
+            await self.wakeup.wait()
+            self.wakeup.clear()
+
+            if await self.drain():
+                delay = self.retry_interval
+                continue
+
+            stats = self.stats()
+            self.logger.warning(
+                f"{stats['depth']} entries wait for {stats['age']:.0f}s, "
+                f"retrying in {delay:.0f}s"
+            )
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, self.max_retry_interval)
+            self.wakeup.set()
+
+    def start(self):
+        self.replay()
+        if self.pending:
+            self.wakeup.set()
+        self.worker = asyncio.create_task(self._run())
+
+    async def close(self):
+        if self.worker:
+            self.worker.cancel()
+            with contextlib.suppress(asyncio.CancelledError):
+                await self.worker
+            self.worker = None
+        if self.journal:
+            self.journal.close()
+            self.journal = None
+
+    def stats(self) -> dict[str, float]:
+        oldest = next(iter(self.pending.values()), None)
+        return {
+            "depth": len(self.pending),
+            "age": time() - oldest["created_at"] if oldest else 0.0,
+            "sent": self.sent,
+            "failures": self.failures,
+            "dropped": self.dropped,
+        }
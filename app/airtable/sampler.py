@@ -0,0 +1,234 @@
+import random
+
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from typing import TYPE_CHECKING
+
+from settings import config
+
+if TYPE_CHECKING:
+    from collections.abc import Callable, Hashable, Sequence
+
+    from airtable.corpus import KekCorpus
+
+
+class ShuffleBag:
+    """
+    Random permutation of `0..size-1` shuffled lazily, one draw at a time
+
+    A Fisher-Yates shuffle keeping only the swapped positions,
+    so memory grows with draws instead of the size of the bag
+    """
+
+    __slots__ = ("drawn", "size", "swaps")
+
+    def __init__(self, size: int):
+        self.size = size
+        self.drawn = 0
+        # Position -> index moved there, positions missing hold themselves
+        self.swaps: dict[int, int] = {}
+
+    def __len__(self) -> int:
+        return self.size - self.drawn
+
+    def draw(self, rng: random.Random) -> int:
+        if not len(self):
+            raise IndexError("Bag is empty")
+
+        position = rng.randrange(self.drawn, self.size)
+        index = self.swaps.get(position, position)
+        self.swaps[position] = self.swaps.get(self.drawn, self.drawn)
+        self.swaps[self.drawn] = index
+        self.drawn += 1
+        return index
+
+    def drawn_indices(self) -> list[int]:
+        return [self.swaps.get(position, position) for position in range(self.drawn)]
+
+    @classmethod
+    def without(cls, size: int, drawn: list[int]) -> ShuffleBag:
+        """
+        Bag of another size with the given indices already drawn
+        """
+        bag = cls(size)
+        # Index -> position it was moved to, for ones not drawn yet
+        moved: dict[int, int] = {}
+        for index in drawn:
+            position = moved.get(index, index)
+            replaced = bag.swaps.get(bag.drawn, bag.drawn)
+            bag.swaps[bag.drawn] = index
+            bag.swaps[position] = replaced
+            moved[replaced] = position
+            bag.drawn += 1
+        return bag
+
+
+class AliasTable:
+    """
+    Walker's alias table: O(n) to build, O(1) to draw an index by its weight
+
+    Every slot keeps the probability of its own index and an alias to fall
+    back to otherwise, so a draw is one random slot and one coin flip
+    """
+
+    __slots__ = ("alias", "probability")
+
+    def __init__(self, weights: Sequence[float]):
+        size = len(weights)
+        weights = [max(weight, 0.0) for weight in weights]
+        total = sum(weights)
+        # Without positive weights every index is as likely as any other
+        scaled = [w * size / total for w in weights] if total else [1.0] * size
+
+        self.probability = [1.0] * size
+        self.alias = list(range(size))
+
+        small = [i for i, p in enumerate(scaled) if p < 1]
+        large = [i for i, p in enumerate(scaled) if p >= 1]
+        while small and large:
+            less, more = small.pop(), large.pop()
+            self.probability[less] = scaled[less]
+            self.alias[less] = more
+            scaled[more] += scaled[less] - 1
+            (small if scaled[more] < 1 else large).append(more)
+        # Leftovers are 1 up to rounding errors
+
+    def __len__(self) -> int:
+        return len(self.alias)
+
+    def draw(self, rng: random.Random) -> int:
+        slot = rng.randrange(len(self.alias))
+        return slot if rng.random() < self.probability[slot] else self.alias[slot]
+
+
+class KekSampler(ABC):
+    """
+    Picks random keks out of a corpus, or out of its part given by `population`
+
+    State is rebuilt only when a new corpus comes in, not per pick
+    """
+
+    def __init__(
+        self,
+        population: Callable[[KekCorpus], Sequence[int]] | None = None,
+        rng: random.Random | None = None,
+    ):
+        # Indices of keks to pick from, all of them by default
+        self.population_of = population
+        self.rng = rng or random.Random()
+
+        # Corpus and its population the state is built for
+        self.corpus: KekCorpus | None = None
+        self.population: Sequence[int] = ()
+
+    @abstractmethod
+    def rebuild(self, corpus: KekCorpus, population: Sequence[int]):
+        """
+        Builds the state for a new corpus, the previous one is still in `self`
+        """
+
+    @abstractmethod
+    def draw(self, chat: Hashable) -> int:
+        """
+        Position of the next kek in the population
+        """
+
+    def sample(self, chat: Hashable, corpus: KekCorpus) -> int:
+        """
+        Index of the next kek in the corpus for a chat
+        """
+        if corpus is not self.corpus:
+            if self.population_of is None:
+                population = range(len(corpus))
+            else:
+                population = self.population_of(corpus)
+            self.rebuild(corpus, population)
+            self.corpus, self.population = corpus, population
+
+        if not self.population:
+            raise IndexError("Cannot sample from an empty corpus")
+        return self.population[self.draw(chat)]
+
+
+class ShuffleSampler(KekSampler):
+    """
+    Random keks per chat, none of them repeated until all keks are sent
+
+    Each chat walks its own shuffle bag of kek indices. A refreshed corpus
+    carries over the keks already sent by record ids, instead of reshuffling.
+    Only `max_chats` recently active chats are remembered
+    """
+
+    def __init__(
+        self,
+        population: Callable[[KekCorpus], Sequence[int]] | None = None,
+        rng: random.Random | None = None,
+        max_chats: int = 1024,
+    ):
+        super().__init__(population, rng)
+        self.max_chats = max_chats
+
+        # Chat -> its bag of population positions, least recently used first
+        self.bags: OrderedDict[Hashable, ShuffleBag] = OrderedDict()
+
+    def rebuild(self, corpus: KekCorpus, population: Sequence[int]):
+        if self.corpus is None:
+            return
+
+        old_ids, old_population = self.corpus.ids, self.population
+        # Kek index -> its position in the new population
+        positions = {index: position for position, index in enumerate(population)}
+        for chat, bag in self.bags.items():
+            drawn = []
+            for old_position in bag.drawn_indices():
+                record_id = old_ids[old_population[old_position]]
+                position = positions.get(corpus.index.get(record_id))
+                if position is not None:
+                    drawn.append(position)
+            self.bags[chat] = ShuffleBag.without(len(population), drawn)
+
+    def draw(self, chat: Hashable) -> int:
+        bag = self.bags.get(chat)
+        if bag is None or not len(bag):
+            bag = self.bags[chat] = ShuffleBag(len(self.population))
+        self.bags.move_to_end(chat)
+        while len(self.bags) > self.max_chats:
+            self.bags.popitem(last=False)
+
+        return bag.draw(self.rng)
+
+
+class WeightedSampler(KekSampler):
+    """
+    Random keks favouring ones with a higher `Weight` field in the List
+
+    Keks without a weight count as 1, keks with a zero weight are never picked
+    unless all of them are zero. Repeats are possible, chats share the table
+    """
+
+    def __init__(
+        self,
+        population: Callable[[KekCorpus], Sequence[int]] | None = None,
+        rng: random.Random | None = None,
+    ):
+        super().__init__(population, rng)
+        self.table = AliasTable(())
+
+    def rebuild(self, corpus: KekCorpus, population: Sequence[int]):
+        self.table = AliasTable([corpus.weights[index] for index in population])
+
+    def draw(self, chat: Hashable) -> int:
+        return self.table.draw(self.rng)
+
+
+def create_sampler(
+    population: Callable[[KekCorpus], Sequence[int]] | None = None,
+) -> KekSampler:
+    match config.kek_sampler:
+        case "shuffle":
+            return ShuffleSampler(population)
+        case "weighted":
+            return WeightedSampler(population)
+
+
+kek_sampler = create_sampler()
@@ -0,0 +1,121 @@
+import heapq
+
+from array import array
+from bisect import bisect_left
+from collections import OrderedDict
+from typing import TYPE_CHECKING
+
+if TYPE_CHECKING:
+    from collections.abc import Sequence
+
+# Length of indexed substrings, shorter queries are answered by a scan
+N = 3
+
+
+def ngrams(text: str) -> set[str]:
+    return {text[i : i + N] for i in range(len(text) - N + 1)}
+
+
+def contains(postings: Sequence[int], index: int) -> bool:
+    position = bisect_left(postings, index)
+    return position < len(postings) and postings[position] == index
+
+
+class TrigramIndex:
+    """
+    Inverted index of normalized kek texts by their 3-character substrings
+
+    A text containing a query contains all of its trigrams, so only keks
+    found in every posting list of the query are checked for the substring.
+    Matches are the same as of `query in text` over the keks, then they are
+    ranked by relevance. Queries are expected in the normalized form of the texts
+    """
+
+    __slots__ = (
+        "average_length",
+        "indices",
+        "lengths",
+        "postings",
+        "ranked",
+        "texts",
+    )
+
+    # BM25 parameters: saturation of repeated matches and length normalization
+    k1 = 1.2
+    b = 0.75
+    # Ranked keks kept per query, enough to scroll through many pages
+    max_ranked = 500
+    # Ranked queries kept, least recently used are dropped
+    max_queries = 256
+
+    def __init__(self, texts: Sequence[str], indices: Sequence[int]):
+        # Normalized texts of the whole corpus, and ascending indices
+        # of keks searched among them
+        self.texts = texts
+        self.indices = indices
+
+        # Kek index -> number of words in its text, for ranking
+        self.lengths = array("I", [0]) * len(texts)
+        # Trigram -> ascending indices of keks with it
+        self.postings: dict[str, array] = {}
+        for i in indices:
+            self.lengths[i] = texts[i].count(" ") + 1
+            for ngram in ngrams(texts[i]):
+                if (postings := self.postings.get(ngram)) is None:
+                    postings = self.postings[ngram] = array("I")
+                postings.append(i)
+        self.average_length = sum(self.lengths) / len(indices) if indices else 1.0
+
+        # Normalized query -> its ranked keks
+        self.ranked: OrderedDict[str, array] = OrderedDict()
+
+    def candidates(self, query: str) -> Sequence[int]:
+        if len(query) < N:
+            return self.indices
+
+        postings = sorted(
+            (self.postings.get(ngram, ()) for ngram in ngrams(query)), key=len
+        )
+        shortest, others = postings[0], postings[1:]
+        return [i for i in shortest if all(contains(p, i) for p in others)]
+
+    def score(self, query: str, i: int) -> tuple[bool, float, int, int]:
+        """
+        Sort key of a kek matching a query, the best first
+        """
+        text = self.texts[i]
+        # Matches from the start of a word go first, e.g. "матан" in "матан"
+        # before the one in "полиматан"
+        position = text.find(query)
+        inside_word = position > 0 and text[position - 1] != " "
+
+        # The query is one phrase, so its IDF is the same for every kek
+        # and BM25 comes down to the saturated frequency of the phrase
+        frequency = text.count(query)
+        norm = 1 - self.b + self.b * self.lengths[i] / self.average_length
+        bm25 = frequency * (self.k1 + 1) / (frequency + self.k1 * norm)
+
+        # Then earlier matches and keks of the List order
+        return inside_word, -bm25, position, i
+
+    def rank(self, query: str) -> Sequence[int]:
+        """
+        Keks matching a normalized query, the most relevant first. Cached per query
+        """
+        if (ranked := self.ranked.get(query)) is not None:
+            self.ranked.move_to_end(query)
+            return ranked
+
+        texts = self.texts
+        matches = [i for i in self.candidates(query) if query in texts[i]]
+        ranked = array(
+            "I",
+            heapq.nsmallest(
+                self.max_ranked, matches, key=lambda i: self.score(query, i)
+            ),
+        )
+
+        self.ranked[query] = ranked
+        if len(self.ranked) > self.max_queries:
+            self.ranked.popitem(last=False)
+        return ranked
@@ -0,0 +1,116 @@
+import heapq
+
+from collections import Counter
+from typing import TYPE_CHECKING, NamedTuple
+
+if TYPE_CHECKING:
+    from collections.abc import Collection
+
+
+class UserScore(NamedTuple):
+    name: str
+    telegram_id: int | None
+    count: int
+
+
+class KekStats:
+    """
+    Aggregates for /kek_info kept up to date with mirrored records
+
+    Mirrors report every synced or deleted record, so a delta only touches
+    the counters of its records instead of recounting the tables.
+    `version` changes only when a counter does, to memoize anything built
+    from stats across syncs that bring back the same records
+    """
+
+    def __init__(self):
+        # Kek record id -> attachment type
+        self.kek_types: dict[str, str] = {}
+        self.attachment_types: Counter[str] = Counter()
+
+        # User record id -> name and Telegram id
+        self.users: dict[str, tuple[str, int | None]] = {}
+        # User record id -> number of authored or suggested keks
+        self.authored: Counter[str] = Counter()
+        self.suggested: Counter[str] = Counter()
+
+        self.version = 0
+
+    @property
+    def total(self) -> int:
+        return len(self.kek_types)
+
+    @staticmethod
+    def _move(counter: Counter[str], old: str | None, new: str | None):
+        if old is not None:
+            counter[old] -= 1
+            if not counter[old]:
+                del counter[old]
+        if new is not None:
+            counter[new] += 1
+
+    def apply_keks(
+        self, records: list[dict], deleted_ids: Collection[str] = (), replace=False
+    ):
+        before = self.kek_types.copy()
+        if replace:
+            self.kek_types.clear()
+            self.attachment_types.clear()
+
+        for record_id in deleted_ids:
+            self._move(self.attachment_types, self.kek_types.pop(record_id, None), None)
+
+        for record in records:
+            new = record["fields"].get("AttachmentType") or "text"
+            old = self.kek_types.get(record["id"])
+            self.kek_types[record["id"]] = new
+            self._move(self.attachment_types, old, new)
+
+        if before != self.kek_types:
+            self.version += 1
+
+    def apply_users(
+        self, records: list[dict], deleted_ids: Collection[str] = (), replace=False
+    ):
+        before = (self.users.copy(), self.authored.copy(), self.suggested.copy())
+        if replace:
+            self.users.clear()
+            self.authored.clear()
+            self.suggested.clear()
+
+        for record_id in deleted_ids:
+            self.users.pop(record_id, None)
+            self.authored.pop(record_id, None)
+            self.suggested.pop(record_id, None)
+
+        for record in records:
+            fields = record["fields"]
+            self.users[record["id"]] = (
+                fields.get("Name", "Unknown"),
+                fields.get("TelegramID"),
+            )
+            for counter, field in (
+                (self.authored, "Author"),
+                (self.suggested, "Suggestor"),
+            ):
+                if count := len(fields.get(field, ())):
+                    counter[record["id"]] = count
+                else:
+                    counter.pop(record["id"], None)
+
+        if before != (self.users, self.authored, self.suggested):
+            self.version += 1
+
+    def _top(self, counter: Counter[str], k: int) -> list[UserScore]:
+        return [
+            UserScore(*self.users.get(record_id, ("Unknown", None)), count)
+            for record_id, count in heapq.nlargest(
+                k, counter.items(), key=lambda item: item[1]
+            )
+        ]
+
+    def top_authors(self, k: int) -> list[UserScore]:
+        return self._top(self.authored, k)
+
+    def top_suggestors(self, k: int) -> list[UserScore]:
+        return self._top(self.suggested, k)
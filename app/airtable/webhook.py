@@ -0,0 +1,146 @@
+import asyncio
+import base64
+import hashlib
+import hmac
+
+from datetime import timedelta
+from typing import TYPE_CHECKING
+
+from aiohttp import web
+from common.rate_limiter import Priority
+from common.utils import get_logger
+
+if TYPE_CHECKING:
+    from collections.abc import Awaitable, Callable
+
+    from airtable.backends import MirrorBackend
+    from airtable.client import AirtableClient
+
+
+class AirtableWebhook:
+    """
+    Receives Airtable change notifications and passes changed record ids on
+
+    Airtable only pings the endpoint, changes themselves are read from payloads
+    of the webhook with a cursor persisted in the mirror backend
+
+    Docs: https://airtable.com/developers/web/api/webhooks-overview
+    """
+
+    path = "/airtable/webhook"
+
+    # Webhooks created with personal access tokens expire in 7 days if not refreshed
+    refresh_interval = timedelta(days=1)
+
+    def __init__(
+        self,
+        client: AirtableClient,
+        base_id: str,
+        webhook_id: str,
+        mac_secret: str,
+        backend: MirrorBackend,
+        on_change: Callable[[set[str], set[str]], Awaitable],
+        port: int = 8080,
+    ):
+        self.client = client
+        self.base_id = base_id
+        self.webhook_id = webhook_id
+        self.mac_secret = base64.b64decode(mac_secret)
+        self.backend = backend
+        # Called with ids of created or changed records, and of deleted ones
+        self.on_change = on_change
+        self.port = port
+
+        self.app = web.Application()
+        self.app.router.add_post(self.path, self.handle_ping)
+        self.runner: web.AppRunner | None = None
+
+        self.pinged = False
+        self.consumer: asyncio.Task | None = None
+        self.refresher: asyncio.Task | None = None
+
+        self.logger = get_logger("AirtableWebhook")
+
+    @property
+    def api_path(self) -> str:
+        return f"bases/{self.base_id}/webhooks/{self.webhook_id}"
+
+    def verify(self, body: bytes, mac: str) -> bool:
+        digest = hmac.new(self.mac_secret, body, hashlib.sha256).hexdigest()
+        return hmac.compare_digest(mac, f"hmac-sha256={digest}")
+
+    async def handle_ping(self, request: web.Request) -> web.Response:
+        body = await request.read()
+        if not self.verify(body, request.headers.get("X-Airtable-Content-MAC", "")):
+            return web.Response(status=401)
+
+        # Airtable expects a quick response, so payloads are read in background
+        self.notify()
+        return web.Response(status=204)
+
+    def notify(self):
+        self.pinged = True
+        if self.consumer is None or self.consumer.done():
+            self.consumer = asyncio.create_task(self.consume())
+
+    async def consume(self):
+        # Pings received while reading are coalesced into one more read
+        while self.pinged:
+            self.pinged = False
+            try:
+                await self.read_payloads()
+            except Exception as e:
+                self.logger.warning(f"Failed to read webhook payloads: {e!r}")
+
+    async def read_payloads(self):
+        cursor = await self.backend.cursor(self.webhook_id) or 1
+        while True:
+            response = await self.client.request(
+                "GET", f"{self.api_path}/payloads", params={"cursor": cursor}
+            )
+
+            changed, deleted = self.changes(response["payloads"])
+            if changed or deleted:
+                await self.on_change(changed, deleted)
+
+            # Saved after the changes are applied, so failed ones are read again
+            cursor = response["cursor"]
+            await self.backend.set_cursor(self.webhook_id, cursor)
+            if not response["mightHaveMore"]:
+                return
+
+    @staticmethod
+    def changes(payloads: list[dict]) -> tuple[set[str], set[str]]:
+        changed, deleted = set(), set()
+        for payload in payloads:
+            for table in payload.get("changedTablesById", {}).values():
+                changed.update(table.get("createdRecordsById", ()))
+                changed.update(table.get("changedRecordsById", ()))
+                deleted.update(table.get("destroyedRecordIds", ()))
+        return changed - deleted, deleted
+
+    async def keep_alive(self):
+        while True:
+            try:
+                await self.client.request(
+                    "POST", f"{self.api_path}/refresh", priority=Priority.LOW
+                )
+            except Exception as e:
+                self.logger.warning(f"Failed to refresh the webhook: {e!r}")
+            await asyncio.sleep(self.refresh_interval.total_seconds())
+
+    async def start(self):
+        self.runner = web.AppRunner(self.app)
+        await self.runner.setup()
+        await web.TCPSite(self.runner, port=self.port).start()
+
+        self.refresher = asyncio.create_task(self.keep_alive())
+        # Catch up with changes made while the bot was down
+        self.notify()
+
+    async def stop(self):
+        for task in (self.refresher, self.consumer):
+            if task:
+                task.cancel()
+        if self.runner:
+            await self.runner.cleanup()
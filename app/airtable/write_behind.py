@@ -0,0 +1,98 @@
+import asyncio
+
+from itertools import batched
+from typing import TYPE_CHECKING
+
+from common.utils import get_logger
+
+from airtable.outbox import is_transient
+
+if TYPE_CHECKING:
+    from collections.abc import Awaitable, Callable
+
+
+class WriteBehind:
+    """
+    Collects record updates and flushes them to Airtable in batches
+
+    Updates of the same record are merged, so only the latest fields are sent.
+    Flushes happen `interval` seconds after the first queued update, or right
+    away once a full batch is collected. Batches failing for a transient reason
+    are retried, a record Airtable rejects is dropped without its neighbours.
+    """
+
+    # Airtable's limit of records per request
+    batch_size = 10
+
+    def __init__(
+        self,
+        flush: Callable[[list[dict]], Awaitable],
+        interval: float,
+    ):
+        self.flush_batch = flush
+        self.interval = interval
+
+        self.pending: dict[str, dict] = {}
+        self.lock = asyncio.Lock()
+        self.timer: asyncio.Task | None = None
+        self.tasks: set[asyncio.Task] = set()
+
+        self.dropped = 0
+
+        self.logger = get_logger("WriteBehind")
+
+    def put(self, record_id: str, fields: dict):
+        self.pending.setdefault(record_id, {}).update(fields)
+
+        if len(self.pending) >= self.batch_size:
+            self._spawn(self.flush())
+        elif self.timer is None:
+            self.timer = self._spawn(self._flush_later())
+
+    def _spawn(self, coro) -> asyncio.Task:
+        task = asyncio.create_task(coro)
+        self.tasks.add(task)
+        task.add_done_callback(self.tasks.discard)
+        return task
+
+    async def _flush_later(self):
+        await asyncio.sleep(self.interval)
+        self.timer = None
+        await self.flush()
+
+    async def flush(self):
+        async with self.lock:
+            pending, self.pending = self.pending, {}
+
+            for batch in batched(pending.items(), self.batch_size, strict=False):
+                await self._flush(batch)
+
+        if self.pending and self.timer is None:
+            self.timer = self._spawn(self._flush_later())
+
+    async def _flush(self, batch: tuple[tuple[str, dict], ...]):
+        records = [{"id": rid, "fields": fields} for rid, fields in batch]
+        try:
+            await self.flush_batch(records)
+        except Exception as e:
+            if is_transient(e):
+                self.logger.warning(f"Failed to flush {len(records)} records: {e!r}")
+                # Newer updates queued in the meantime take priority
+                for rid, fields in batch:
+                    self.pending[rid] = fields | self.pending.get(rid, {})
+                return
+
+            if len(batch) > 1:
+                # Find the rejected record, without holding back the others
+                for item in batch:
+                    await self._flush((item,))
+                return
+
+            self.dropped += 1
+            self.logger.error(f"Failed to flush {records[0]!r}, dropped: {e!r}")
+
+    async def close(self):
+        if self.timer:
+            self.timer.cancel()
+            self.timer = None
+        await self.flush()
@@ -0,0 +1,192 @@
+import asyncio
+import functools
+import weakref
+
+from collections import OrderedDict
+from dataclasses import dataclass
+from time import monotonic
+from typing import TYPE_CHECKING, Any
+
+from common.utils import get_logger
+
+if TYPE_CHECKING:
+    from collections.abc import Awaitable, Callable, Hashable
+
+logger = get_logger("Cache")
+
+_MISSING = object()
+
+
+class SingleFlight:
+    """
+    Shares one in-flight call between concurrent callers with the same key
+    """
+
+    def __init__(self):
+        self.in_flight: dict[Hashable, asyncio.Task] = {}
+
+        # Number of calls served by joining an already running one
+        self.coalesced = 0
+
+    def task(self, key: Hashable, func: Callable[..., Awaitable[Any]], *args):
+        if task := self.in_flight.get(key):
+            self.coalesced += 1
+            return task
+
+        task = asyncio.create_task(func(*args))
+        task.add_done_callback(functools.partial(self._on_done, key))
+        self.in_flight[key] = task
+        return task
+
+    async def run(self, key: Hashable, func: Callable[..., Awaitable[Any]], *args):
+        # Shielded, so a cancelled caller doesn't cancel the call for the others
+        return await asyncio.shield(self.task(key, func, *args))
+
+    def _on_done(self, key: Hashable, task: asyncio.Task):
+        self.in_flight.pop(key, None)
+        if not task.cancelled() and (e := task.exception()):
+            logger.warning(f"{key!r} failed: {e!r}")
+
+
+class TTLCache:
+    """
+    Results of an async call by key, each valid for `ttl` seconds
+
+    Holds at most `max_size` keys, evicting the least recently used one.
+    Concurrent misses of a key share one call, see `stats()` for the hit rate
+    """
+
+    def __init__(self, ttl: float, max_size: int = 1024):
+        self.ttl = ttl
+        self.max_size = max_size
+
+        # Key -> expiration time and value, least recently used first
+        self.entries: OrderedDict[Hashable, tuple[float, Any]] = OrderedDict()
+        self.flight = SingleFlight()
+
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        expires_at, value = self.entries.get(key, (0.0, default))
+        if expires_at <= monotonic():
+            self.entries.pop(key, None)
+            return default
+
+        self.entries.move_to_end(key)
+        return value
+
+    def set(self, key: Hashable, value: Any):
+        self.entries[key] = (monotonic() + self.ttl, value)
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.max_size:
+            self.entries.popitem(last=False)
+
+    async def get_or_load(
+        self, key: Hashable, load: Callable[..., Awaitable[Any]], *args
+    ) -> Any:
+        if (value := self.get(key, _MISSING)) is not _MISSING:
+            self.hits += 1
+            return value
+
+        self.misses += 1
+        return await self.flight.run(key, self._load, key, load, *args)
+
+    async def _load(self, key: Hashable, load: Callable[..., Awaitable[Any]], *args):
+        value = await load(*args)
+        self.set(key, value)
+        return value
+
+    def stats(self) -> dict[str, float]:
+        requests = self.hits + self.misses
+        return {
+            "size": len(self.entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "coalesced": self.flight.coalesced,
+            "hit_rate": self.hits / requests if requests else 0.0,
+        }
+
+
+@dataclass
+class _Entry:
+    value: Any = _MISSING
+    updated_at: float = 0.0
+
+
+def stale_while_revalidate(ttl: float, max_staleness: float):
+    """
+    Caches results of an async method and serves them even after `ttl` expires
+
+    The first call after `ttl` starts a single background refresh and returns the
+    last good value right away. Failed refreshes are logged and the stale value
+    stays in use, but a value older than `max_staleness` is never returned:
+    such calls wait for a fresh one and get the refresh's error if it fails.
+
+    Concurrent refreshes are coalesced, see `wrapper.flight.coalesced`.
+
+    `wrapper.seed(self, value, age=...)` starts the cache from a value loaded
+    elsewhere, e.g. a snapshot on disk, and `wrapper.revalidate(self)` refreshes
+    it in background without waiting for a caller. `wrapper.prefetch(self)` does
+    the same only if the value is missing or older than `ttl`.
+    """
+
+    if max_staleness < ttl:
+        raise ValueError("`max_staleness` should not be less than `ttl`")
+
+    def decorator(func: Callable[..., Awaitable[Any]]):
+        entries: weakref.WeakKeyDictionary[Any, dict[tuple, _Entry]] = (
+            weakref.WeakKeyDictionary()
+        )
+        flight = SingleFlight()
+
+        async def refresh(self, entry: _Entry, args: tuple):
+            value = await func(self, *args)
+            entry.value = value
+            entry.updated_at = monotonic()
+            return value
+
+        def start_refresh(self, entry: _Entry, args: tuple) -> asyncio.Task:
+            key = (func.__qualname__, id(self), *args)
+            return flight.task(key, refresh, self, entry, args)
+
+        def get_entry(self, args: tuple) -> _Entry:
+            return entries.setdefault(self, {}).setdefault(args, _Entry())
+
+        def seed(self, value, *args, age: float = 0.0):
+            entry = get_entry(self, args)
+            entry.value = value
+            entry.updated_at = monotonic() - age
+
+        def revalidate(self, *args) -> asyncio.Task:
+            return start_refresh(self, get_entry(self, args), args)
+
+        def prefetch(self, *args) -> asyncio.Task | None:
+            entry = get_entry(self, args)
+            if entry.value is _MISSING or monotonic() - entry.updated_at > ttl:
+                return start_refresh(self, entry, args)
+            return None
+
+        @functools.wraps(func)
+        async def wrapper(self, *args):
+            entry = get_entry(self, args)
+            age = monotonic() - entry.updated_at
+
+            if entry.value is _MISSING or age > max_staleness:
+                return await asyncio.shield(start_refresh(self, entry, args))
+
+            if age > ttl:
+                start_refresh(self, entry, args)
+
+            return entry.value
+
+        wrapper.flight = flight
+        wrapper.seed = seed
+        wrapper.revalidate = revalidate
+        wrapper.prefetch = prefetch
+        return wrapper
+
+    return decorator
@@ -0,0 +1,74 @@
+import asyncio
+import functools
+
+from typing import TYPE_CHECKING, Any
+
+if TYPE_CHECKING:
+    from collections.abc import Awaitable, Callable, Hashable
+
+
+class LatestWins:
+    """
+    Runs only the latest call per key, e.g. per user typing an inline query
+
+    A call waits `delay` seconds first, and a newer call with the same key
+    cancels it, whether it's still waiting or already running: its result
+    would be discarded anyway. Cancelled calls return None
+    """
+
+    def __init__(self, delay: float = 0.0):
+        self.delay = delay
+        # Key -> the latest call with it, while it runs
+        self.running: dict[Hashable, asyncio.Task] = {}
+
+        self.answered = 0
+        self.skipped = 0
+
+    def __call__(self, key: Callable[..., Hashable]):
+        """
+        Decorates an async function, `key` is called with its arguments
+        """
+
+        def decorator(func: Callable[..., Awaitable[Any]]):
+            @functools.wraps(func)
+            async def wrapper(*args, **kwargs):
+                return await self.run(key(*args, **kwargs), func, *args, **kwargs)
+
+            return wrapper
+
+        return decorator
+
+    async def _delayed(self, func: Callable[..., Awaitable[Any]], *args, **kwargs):
+        if self.delay:
+            await asyncio.sleep(self.delay)
+        return await func(*args, **kwargs)
+
+    async def run(
+        self, key: Hashable, func: Callable[..., Awaitable[Any]], *args, **kwargs
+    ) -> Any:
+        # A separate task, so superseding cancels the call and not its caller
+        task = asyncio.ensure_future(self._delayed(func, *args, **kwargs))
+        if previous := self.running.get(key):
+            previous.cancel()
+        self.running[key] = task
+
+        try:
+            result = await task
+        except asyncio.CancelledError:
+            if not task.cancelled() or asyncio.current_task().cancelling():
+                raise
+            self.skipped += 1
+            return None
+        finally:
+            if self.running.get(key) is task:
+                del self.running[key]
+
+        self.answered += 1
+        return result
+
+    def stats(self) -> dict[str, int]:
+        return {
+            "running": len(self.running),
+            "answered": self.answered,
+            "skipped": self.skipped,
+        }
@@ -0,0 +1,64 @@
+import asyncio
+import contextlib
+
+from typing import TYPE_CHECKING
+
+from settings import config
+
+from common.utils import get_logger
+
+if TYPE_CHECKING:
+    from collections.abc import Callable
+
+logger = get_logger("Metrics")
+
+
+class Metrics:
+    """
+    Counters of caches, queues and limiters, logged together every `interval`
+
+    A component registers its `stats()` where it's created,
+    so nothing is collected unless the log asks for it
+    """
+
+    def __init__(self, interval: float):
+        self.interval = interval
+        # Name -> stats of a component
+        self.sources: dict[str, Callable[[], dict[str, float]]] = {}
+        self.worker: asyncio.Task | None = None
+
+    def register(self, name: str, stats: Callable[[], dict[str, float]]):
+        self.sources[name] = stats
+
+    def snapshot(self) -> dict[str, dict[str, float]]:
+        return {name: stats() for name, stats in self.sources.items()}
+
+    def format(self) -> str:
+        def value(v: float) -> str:
+            return f"{v:.3f}" if isinstance(v, float) else str(v)
+
+        return " | ".join(
+            f"{name}: " + ", ".join(f"{k}={value(v)}" for k, v in stats.items())
+            for name, stats in self.snapshot().items()
+        )
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.interval)
+            logger.info(self.format())
+
+    async def start(self):
+        if self.interval:
+            self.worker = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self.worker:
+            self.worker.cancel()
+            with contextlib.suppress(asyncio.CancelledError):
+                await self.worker
+            self.worker = None
+        # The last counters of the run
+        logger.info(self.format())
+
+
+metrics = Metrics(interval=config.metrics_log_interval)
@@ -0,0 +1,94 @@
+import asyncio
+import heapq
+
+from collections import Counter
+from enum import IntEnum
+from itertools import count
+from time import monotonic
+
+
+class Priority(IntEnum):
+    HIGH = 0  # User is waiting for the result
+    NORMAL = 1
+    LOW = 2  # Background work
+
+
+class RateLimiter:
+    """
+    Async token bucket shared by callers of a rate limited API
+
+    Tokens are handed out to waiting callers in order of their priority,
+    and then of arrival. Time spent waiting is accumulated per priority.
+    """
+
+    def __init__(self, rate: float, capacity: float | None = None):
+        self.rate = rate
+        self.capacity = capacity or rate
+
+        self.tokens = self.capacity
+        self.updated_at = monotonic()
+
+        self.waiters: list[tuple[int, int, asyncio.Future]] = []
+        self.order = count()
+        self.wakeup: asyncio.TimerHandle | None = None
+
+        self.acquired: Counter[Priority] = Counter()
+        self.waited: Counter[Priority] = Counter()
+        self.max_wait = 0.0
+
+    def _refill(self):
+        now = monotonic()
+        self.tokens = min(
+            self.capacity, self.tokens + (now - self.updated_at) * self.rate
+        )
+        self.updated_at = now
+
+    async def acquire(self, priority: Priority = Priority.NORMAL):
+        started_at = monotonic()
+
+        self._refill()
+        if not self.waiters and self.tokens >= 1:
+            self.tokens -= 1
+        else:
+            future = asyncio.get_running_loop().create_future()
+            heapq.heappush(self.waiters, (priority, next(self.order), future))
+            self._schedule()
+            await future
+
+        waited = monotonic() - started_at
+        self.acquired[priority] += 1
+        self.waited[priority] += waited
+        self.max_wait = max(self.max_wait, waited)
+
+    def _schedule(self):
+        if self.wakeup is None:
+            delay = max(0.0, (1 - self.tokens) / self.rate)
+            self.wakeup = asyncio.get_running_loop().call_later(delay, self._release)
+
+    def _release(self):
+        self.wakeup = None
+        self._refill()
+
+        while self.waiters and self.tokens >= 1:
+            _, _, future = heapq.heappop(self.waiters)
+            if future.done():  # Cancelled while waiting
+                continue
+            self.tokens -= 1
+            future.set_result(None)
+
+        if self.waiters:
+            self._schedule()
+
+    def stats(self) -> dict[str, float]:
+        acquired = sum(self.acquired.values())
+        return {
+            "acquired": acquired,
+            "waiting": len(self.waiters),
+            "avg_wait": sum(self.waited.values()) / acquired if acquired else 0.0,
+            "max_wait": self.max_wait,
+            **{
+                f"avg_wait_{p.name.lower()}": self.waited[p] / self.acquired[p]
+                for p in Priority
+                if self.acquired[p]
+            },
+        }
@@ -0,0 +1,57 @@
+import asyncio
+
+from typing import TYPE_CHECKING, Any
+
+from common.utils import get_logger
+
+if TYPE_CHECKING:
+    from collections.abc import Coroutine
+
+logger = get_logger("BackgroundTasks")
+
+
+class BackgroundTasks:
+    """
+    Runs work a handler doesn't wait for, at most `limit` at a time
+
+    Tasks are referenced until done, so they aren't garbage collected midway,
+    and failures are logged instead of being lost with the task
+    """
+
+    def __init__(self, limit: int):
+        self.limit = limit
+        self.semaphore = asyncio.Semaphore(limit)
+        self.tasks: set[asyncio.Task] = set()
+
+    def spawn(self, coro: Coroutine[Any, Any, Any]) -> asyncio.Task:
+        task = asyncio.create_task(self._run(coro))
+        self.tasks.add(task)
+        task.add_done_callback(self._on_done)
+        return task
+
+    async def _run(self, coro: Coroutine[Any, Any, Any]):
+        async with self.semaphore:
+            return await coro
+
+    def _on_done(self, task: asyncio.Task):
+        self.tasks.discard(task)
+        if not task.cancelled() and (e := task.exception()):
+            logger.error(f"Background task failed: {e!r}", exc_info=e)
+
+    async def drain(self, timeout: float = 30):
+        """
+        Waits for running tasks on shutdown, cancelling ones that don't finish
+        """
+        if not self.tasks:
+            return
+
+        logger.info(f"Waiting for {len(self.tasks)} tasks")
+        _, pending = await asyncio.wait(self.tasks, timeout=timeout)
+        for task in pending:
+            task.cancel()
+        if pending:
+            logger.warning(f"Cancelled {len(pending)} tasks after {timeout}s")
+            await asyncio.wait(pending)
+
+
+background_tasks = BackgroundTasks(limit=32)
@@ -0,0 +1,45 @@
+import html
+import re
+
+_TAG = re.compile(r"<[^>]*>")
+_PUNCTUATION = re.compile(r"[^\w\s]+")
+_CYRILLIC_WORD = re.compile(r"[а-я]+")
+
+# Inflectional endings of Russian nouns and adjectives, longest first
+_ENDINGS = tuple(
+    sorted(
+        (
+            "ами ями ого его ому ему ыми ими ых их "
+            "ая яя ое ее ые ие ой ей ий ый ом ем ам ям ах ях ов ев ую юю "
+            "а я о е ы и у ю ь й"
+        ).split(),
+        key=len,
+        reverse=True,
+    )
+)
+# Shorter stems are too ambiguous to cut endings off
+_MIN_STEM = 3
+
+
+def _stem(match: re.Match) -> str:
+    word = match.group()
+    for ending in _ENDINGS:
+        if word.endswith(ending) and len(word) - len(ending) >= _MIN_STEM:
+            return word[: -len(ending)]
+    return word
+
+
+def normalize(text: str, stem: bool = False, markup: bool = False) -> str:
+    """
+    Form of a text for search: no punctuation, case folded, `ё` without dots
+    and single spaces. HTML tags are only cut off a `markup` text, in plain ones
+    `<` and `>` are just signs. Light stemming cuts common Russian endings
+    """
+    if markup:
+        text = _TAG.sub("", text)
+    text = html.unescape(text)
+    text = text.casefold().replace("ё", "е")
+    text = " ".join(_PUNCTUATION.sub(" ", text).split())
+    if stem:
+        text = _CYRILLIC_WORD.sub(_stem, text)
+    return text
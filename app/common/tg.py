@@ -2,6 +2,8 @@ from typing import TYPE_CHECKING
 
 from aiogram.exceptions import TelegramBadRequest
 
+from common.cache import TTLCache
+from common.metrics import metrics
 from common.utils import one_liner
 
 if TYPE_CHECKING:
@@ -94,9 +96,24 @@ def decompose_update(
     return f, user, sender_chat, chat, info
 
 
-async def create_sensitive_url_from_file_id(bot: Bot, file_id: str) -> str:
+# Telegram guarantees a `file_path` of `getFile` for at least an hour. Half of it
+# is left for Airtable, which downloads a file by its URL some time after a write
+file_paths = TTLCache(ttl=30 * 60, max_size=1024)
+metrics.register("file_paths", file_paths.stats)
+
+
+async def create_sensitive_url_from_file_id(
+    bot: Bot, file_id: str, file_unique_id: str | None = None
+) -> str:
+    # Every file id of a file shares its unique id, and so the file path
+    key = (bot.id, file_unique_id or file_id)
+    file_path = await file_paths.get_or_load(key, get_file_path, bot, file_id)
+    return bot.session.api.file_url(bot.token, file_path)
+
+
+async def get_file_path(bot: Bot, file_id: str) -> str:
     file = await bot.get_file(file_id)
-    return bot.session.api.file_url(bot.token, file.file_path)
+    return file.file_path
 
 
 def extract_attachment_info(
@@ -138,28 +155,27 @@ def extract_attachment_info(
     return attachment_type, attachment_file_id, attachment_filename
 
 
-async def extract_attachment_info_with_url(
-    message: Message,
-) -> tuple[str | None, str | None, str | None, str | None]:
-    attachment_type, attachment_file_id, attachment_filename = extract_attachment_info(
-        message
-    )
-    attachment_url = None
-
-    if attachment_file_id:
-        attachment_url = await create_sensitive_url_from_file_id(
-            message.bot, attachment_file_id
-        )
-
-    return attachment_type, attachment_file_id, attachment_filename, attachment_url
-
-
 def extract_attachment_file_id(message: Message) -> str | None:
     _, attachment_file_id, _ = extract_attachment_info(message)
 
     return attachment_file_id
 
 
+def extract_attachment_unique_id(message: Message) -> str | None:
+    # Same for a file sent again by anyone, unlike file ids
+    attachment = (
+        (message.photo and message.photo[-1])
+        or message.audio
+        or message.voice
+        or message.sticker
+        or message.video
+        or message.video_note
+        or message.animation
+        or message.document
+    )
+    return attachment.file_unique_id if attachment else None
+
+
 async def reply_with_attachment(
     message: Message,
     text: str,
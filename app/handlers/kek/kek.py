@@ -1,8 +1,8 @@
-import random
-
 from typing import TYPE_CHECKING
 
+from aiogram.exceptions import TelegramBadRequest
 from airtable.kek_storage import kek_storage
+from airtable.sampler import kek_sampler
 from common.tg import extract_attachment_file_id, reply_with_attachment
 from settings import config
 
@@ -11,24 +11,36 @@ if TYPE_CHECKING:
 
 
 async def cmd_kek(message: Message):
-    keks = await kek_storage.async_all()
-
-    kek = random.choice(keks)
-    kek_fields = kek["fields"]
-
-    text = kek_fields.get("Text")
-    attachment = kek_fields.get("Attachment")
-    attachment_type = kek_fields.get("AttachmentType")
-    attachment_file_id = kek_fields.get("AttachmentFileID")
-    attachment_url_fallback = attachment and attachment[0]["url"]
-
-    reply = await reply_with_attachment(
-        message, text, attachment_type, attachment_file_id, attachment_url_fallback
-    )
+    corpus = await kek_storage.async_corpus()
+
+    kek = corpus[kek_sampler.sample(message.chat.id, corpus)]
+
+    text = kek.text
+    attachment_type = kek.attachment_type
+    attachment_file_id = kek.attachment_file_id
+
+    try:
+        reply = await reply_with_attachment(
+            message, text, attachment_type, attachment_file_id
+        )
+    except TelegramBadRequest as e:
+        # Broken file id, but the original file is still attached in Airtable
+        if attachment_type is None:
+            raise
+        try:
+            attachment_url = await kek_storage.async_attachment_url(kek.id)
+        except Exception as lookup_error:
+            # The reply is what failed, the lookup only didn't save it
+            raise e from lookup_error
+        if not attachment_url:
+            raise
+        reply = await reply_with_attachment(
+            message, text, attachment_type, attachment_url
+        )
 
     if config.environment == "prod":
         if file_id := extract_attachment_file_id(reply):
             if file_id != attachment_file_id:
-                await kek_storage.async_update_file_id(kek["id"], file_id)
+                kek_storage.queue_file_id_update(kek.id, file_id)
 
     return reply
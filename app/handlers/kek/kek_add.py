@@ -1,48 +1,95 @@
+import asyncio
+
 from typing import TYPE_CHECKING
 
 from aiogram.utils.formatting import TextLink
 from airtable.kek_storage import kek_storage
-from common.tg import extract_attachment_info_with_url, reply_with_attachment
+from common.tasks import background_tasks
+from common.tg import (
+    extract_attachment_info,
+    extract_attachment_unique_id,
+    reply_with_attachment,
+)
+from settings import config
 
 if TYPE_CHECKING:
-    from aiogram.types import Message
+    from aiogram.types import Message, User
+    from airtable.dedup import Duplicate
 
 
 async def cmd_kek_add(message: Message, reply_to_message: Message):
-    text = reply_to_message.html_text
+    kek = TextLink("Кек", url=reply_to_message.get_url()).as_html()
 
-    (
-        attachment_type,
-        attachment_file_id,
-        attachment_filename,
-        attachment_url,
-    ) = await extract_attachment_info_with_url(reply_to_message)
+    # Known keks are caught before any request to Telegram or Airtable
+    if duplicate := kek_storage.find_duplicate(
+        reply_to_message.html_text, extract_attachment_unique_id(reply_to_message)
+    ):
+        return await reply_duplicate(message, kek, duplicate)
 
-    await kek_storage.async_add(
-        author=reply_to_message.from_user,
-        suggestor=message.from_user,
-        text=text,
-        attachment_type=attachment_type,
-        attachment_file_id=attachment_file_id,
-        attachment_filename=attachment_filename,
-        attachment_url=attachment_url,
-    )
+    reply = await message.reply(f"⏳ {kek} отправляется в предложку")
 
-    return await message.reply(
-        f"✅ {TextLink('Кек', url=reply_to_message.get_url()).as_html()} отправлен в "
-        "предложку"
+    # Storage may take seconds, so the reply is edited once it's done
+    background_tasks.spawn(
+        add_kek(reply, kek, suggestor=message.from_user, message=reply_to_message)
     )
+    return reply
+
+
+async def reply_duplicate(message: Message, kek: str, duplicate: Duplicate):
+    if duplicate.table != "List":
+        return await message.reply(f"♻️ {kek} уже в предложке")
+
+    reply = await message.reply(f"♻️ {kek} уже есть в кеках")
+    # The kek is only shown if the loaded corpus has it already
+    corpus = kek_storage.corpus
+    if existing := corpus and duplicate.record_id and corpus.get(duplicate.record_id):
+        await reply_with_attachment(
+            reply,
+            existing.text,
+            existing.attachment_type,
+            existing.attachment_file_id,
+        )
+    return reply
+
+
+async def add_kek(reply: Message, kek: str, suggestor: User, message: Message):
+    try:
+        attachment_type, attachment_file_id, attachment_filename = (
+            extract_attachment_info(message)
+        )
+
+        sent = await kek_storage.async_add(
+            author=message.from_user,
+            suggestor=suggestor,
+            text=message.html_text,
+            attachment_type=attachment_type,
+            attachment_file_id=attachment_file_id,
+            attachment_filename=attachment_filename,
+            attachment_unique_id=extract_attachment_unique_id(message),
+        )
+    except Exception:
+        await reply.edit_text(f"❌ {kek} не получилось отправить в предложку")
+        raise
+
+    try:
+        accepted = await asyncio.wait_for(
+            asyncio.shield(sent), timeout=config.kek_add_confirm_timeout
+        )
+    except TimeoutError:
+        # Journaled anyway, the outbox keeps sending it to Airtable
+        return await reply.edit_text(f"📥 {kek} в очереди в предложку")
+
+    if accepted:
+        return await reply.edit_text(f"✅ {kek} отправлен в предложку")
+    return await reply.edit_text(f"❌ {kek} не принят предложкой")
 
 
 async def cmd_kek_push(message: Message, reply_to_message: Message):
     text = reply_to_message.html_text
 
-    (
-        attachment_type,
-        attachment_file_id,
-        attachment_filename,
-        attachment_url,
-    ) = await extract_attachment_info_with_url(reply_to_message)
+    attachment_type, attachment_file_id, attachment_filename = extract_attachment_info(
+        reply_to_message
+    )
 
     await kek_storage.async_push(
         author=reply_to_message.from_user,
@@ -50,7 +97,7 @@ async def cmd_kek_push(message: Message, reply_to_message: Message):
         attachment_type=attachment_type,
         attachment_file_id=attachment_file_id,
         attachment_filename=attachment_filename,
-        attachment_url=attachment_url,
+        attachment_unique_id=extract_attachment_unique_id(reply_to_message),
     )
 
     return await reply_with_attachment(
@@ -1,57 +1,54 @@
-from collections import Counter
-from typing import TYPE_CHECKING
+import functools
+
+from typing import TYPE_CHECKING, Any
 
 from aiogram.utils.formatting import Bold, Text, TextLink, as_line
 from airtable.kek_storage import kek_storage
 
 if TYPE_CHECKING:
     from aiogram.types import Message
+    from airtable.stats import KekStats, UserScore
+
+
+def format_user_list(scores: list[UserScore]):
+    return [
+        as_line(
+            "• ",
+            TextLink(name, url=f"tg://user?id={telegram_id or ''}"),
+            f": {count}",
+        )
+        for name, telegram_id, count in scores
+    ]
+
+
+@functools.lru_cache(maxsize=1)
+def render_stats(stats: KekStats, version: int) -> dict[str, Any]:
+    # Stats change only with synced records, so the reply is built once per version
+    return Text(
+        Bold("Всего кеков в базе:"),
+        f" {stats.total}",
+        "\n\n",
+        Bold("По типу:"),
+        "\n",
+        *[
+            as_line("• ", att_type, f": {count}")
+            for att_type, count in stats.attachment_types.most_common()
+        ],
+        "\n",
+        Bold("Топ 5 авторов:"),
+        "\n",
+        *format_user_list(stats.top_authors(6)),
+        "\n",
+        Bold("Топ 5 предложивших:"),
+        "\n",
+        *format_user_list(stats.top_suggestors(6)),
+    ).as_kwargs()
 
 
 async def cmd_kek_info(message: Message):
-    keks = await kek_storage.async_all()
-    users = await kek_storage.async_all_users()
-
-    attachment_types = Counter(
-        kek["fields"].get("AttachmentType", "text") for kek in keks
-    )
-    authors = Counter()
-    suggestors = Counter()
-    user_ids = {}
-
-    for user in users:
-        name = user["fields"].get("Name", "Unknown")
-        user_ids[name] = user["fields"].get("TelegramID", "")
-        authors[name] = len(user["fields"].get("Author", []))
-        suggestors[name] = len(user["fields"].get("Suggestor", []))
-
-    def format_user_list(user_counter):
-        return [
-            as_line(
-                "• ", TextLink(name, url=f"tg://user?id={user_ids[name]}"), f": {count}"
-            )
-            for name, count in user_counter.most_common(6)
-        ]
+    stats = await kek_storage.async_stats()
 
     return await message.reply(
-        **Text(
-            Bold("Всего кеков в базе:"),
-            f" {len(keks)}",
-            "\n\n",
-            Bold("По типу:"),
-            "\n",
-            *[
-                as_line("• ", att_type, f": {count}")
-                for att_type, count in attachment_types.most_common()
-            ],
-            "\n",
-            Bold("Топ 5 авторов:"),
-            "\n",
-            *format_user_list(authors),
-            "\n",
-            Bold("Топ 5 предложивших:"),
-            "\n",
-            *format_user_list(suggestors),
-        ).as_kwargs(),
+        **render_stats(stats, stats.version),
         disable_notification=True,
     )
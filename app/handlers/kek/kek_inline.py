@@ -3,7 +3,6 @@
 Allows users to search and send keks from any chat by typing @algebrach_bot.
 """
 
-import random
 import uuid
 
 from typing import TYPE_CHECKING
@@ -15,45 +14,53 @@ from aiogram.types import (
     InlineQueryResultArticle,
     InputTextMessageContent,
 )
+from airtable.corpus import TEXT, normalize_query
 from airtable.kek_storage import kek_storage
+from airtable.sampler import create_sampler
+from common.cache import TTLCache
+from common.debounce import LatestWins
+from common.metrics import metrics
 from common.utils import one_liner
+from settings import config
 
 if TYPE_CHECKING:
+    from collections.abc import Sequence
     from typing import Any
 
+    from airtable.corpus import Kek, KekCorpus
+
 router = Router(name="kek_inline")
 
 CACHE_TIME = 5 * 60
+# Results per page of inline search, Telegram requests the next one on scroll
+PAGE_SIZE = 10
+
 
+def get_text_keks(corpus: KekCorpus) -> Sequence[int]:
+    """Indices of text-only keks (no attachments), precomputed by the corpus."""
+    return corpus.partition(TEXT)
 
-def get_text_keks(keks: list[dict]) -> list[dict]:
-    """Filter to text-only keks (no attachments)."""
-    return [
-        k
-        for k in keks
-        if k["fields"].get("Text") and not k["fields"].get("AttachmentType")
-    ]
 
+# Only text keks fit into an inline message edit
+random_kek_sampler = create_sampler(population=get_text_keks)
 
-def search_keks(keks: list[dict], query: str, limit: int = 10) -> list[dict]:
-    """Case-insensitive substring search with early exit on limit."""
-    query_lower = query.lower()
-    results = []
-    for k in keks:
-        if query_lower in k["fields"]["Text"].lower():
-            results.append(k)
-            if len(results) >= limit:
-                break
-    return results
+# Telegram sends a query per keystroke, earlier ones of a user are outdated
+inline_searches = LatestWins(delay=config.kek_inline_debounce)
+metrics.register("inline_searches", inline_searches.stats)
 
+# Pages of results by normalized query, offset and corpus version, misses included.
+# Popular prefixes are typed by many users, so its hit rate is logged
+search_results = TTLCache(ttl=CACHE_TIME, max_size=1024)
+metrics.register("inline_pages", search_results.stats)
 
-def kek_to_result(kek: dict) -> InlineQueryResultArticle:
-    """Convert kek record to InlineQueryResultArticle."""
-    text = kek["fields"]["Text"]
+
+def kek_to_result(kek: Kek) -> InlineQueryResultArticle:
+    """Convert kek to InlineQueryResultArticle."""
+    text = kek.text
     preview = one_liner(text, cut_len=100)
 
     return InlineQueryResultArticle(
-        id=kek["id"],
+        id=kek.id,
         title=preview[:50] or "Кек",
         description=preview[50:100] if len(preview) > 50 else None,
         input_message_content=InputTextMessageContent(message_text=text),
@@ -75,26 +82,48 @@ async def inline_kek_random(query: InlineQuery) -> Any:
 
 
 @router.inline_query(F.query != "")
+@inline_searches(key=lambda query: query.from_user.id)
 async def inline_kek_search(query: InlineQuery) -> Any:
-    """Search keks by text and return matching results."""
-    keks = await kek_storage.async_all()
-    text_keks = get_text_keks(keks)
-    matches = search_keks(text_keks, query.query, limit=10)
-
-    if not matches:
-        result = InlineQueryResultArticle(
-            id="not_found",
-            title="😢 Кеков не найдено",
-            description=f"По запросу «{query.query[:30]}»",
-            input_message_content=InputTextMessageContent(
-                message_text=f"🔍 Кеков по запросу «{query.query}» не найдено",
-            ),
-        )
-        await query.answer([result], cache_time=CACHE_TIME, is_personal=False)
-        return
+    """Search keks by text and return a page of the most relevant ones."""
+    corpus = await kek_storage.async_corpus()
+    text = normalize_query(query.query)
+    offset = int(query.offset) if query.offset.isdigit() else 0
+
+    # A new corpus has a new version, so answers for the old one are never hit
+    results, next_offset = await search_results.get_or_load(
+        (text, offset, corpus.version), search_page, corpus, text, offset
+    )
+    if not results and not offset:
+        # Quotes the query as typed, so it's not a part of the cached page
+        results = [not_found_result(query.query)]
+    await query.answer(
+        results, cache_time=CACHE_TIME, is_personal=False, next_offset=next_offset
+    )
+
+
+def not_found_result(text: str) -> InlineQueryResultArticle:
+    """Tell that nothing matches a query, quoted as the user typed it."""
+    return InlineQueryResultArticle(
+        id="not_found",
+        title="😢 Кеков не найдено",
+        description=f"По запросу «{text[:30]}»",
+        input_message_content=InputTextMessageContent(
+            message_text=f"🔍 Кеков по запросу «{text}» не найдено",
+        ),
+    )
+
+
+async def search_page(
+    corpus: KekCorpus, text: str, offset: int
+) -> tuple[list[InlineQueryResultArticle], str]:
+    """Page of results for a normalized query, empty for a miss, and next offset."""
+    # Ranked once per query, next pages are slices of the same list. Emoji or
+    # punctuation only normalize to nothing, which is in every text
+    ranked = corpus.text_index().rank(text) if text else ()
 
-    results = [kek_to_result(k) for k in matches]
-    await query.answer(results, cache_time=CACHE_TIME, is_personal=False)
+    page = [kek_to_result(corpus[i]) for i in ranked[offset : offset + PAGE_SIZE]]
+    next_offset = offset + PAGE_SIZE
+    return page, str(next_offset) if next_offset < len(ranked) else ""
 
 
 @router.chosen_inline_result()
@@ -103,18 +132,19 @@ async def chosen_random_kek(chosen: ChosenInlineResult, bot: Bot) -> None:
     if not chosen.inline_message_id:
         return
 
-    keks = await kek_storage.async_all()
-    text_keks = get_text_keks(keks)
+    corpus = await kek_storage.async_corpus()
 
-    if not text_keks:
+    try:
+        index = random_kek_sampler.sample(chosen.from_user.id, corpus)
+    except IndexError:
         await bot.edit_message_text(
             inline_message_id=chosen.inline_message_id,
             text="😢 Кеков пока нет",
         )
         return
 
-    kek = random.choice(text_keks)
+    kek = corpus[index]
     await bot.edit_message_text(
         inline_message_id=chosen.inline_message_id,
-        text=kek["fields"]["Text"],
+        text=kek.text,
     )
@@ -1,4 +1,4 @@
-from pydantic import Field, HttpUrl
+from pydantic import Field, HttpUrl, model_validator
 from pydantic_settings import BaseSettings, SettingsConfigDict
 
 # Docs: https://docs.pydantic.dev/2.8/concepts/pydantic_settings/
@@ -26,6 +26,55 @@ class Settings(BaseSettings):
     # Access to Airtable storage: https://airtable.com/create/tokens
     airtable_access_token: str
     airtable_base_id: str = "appG5koP3D8kWbLdl"
+    # Airtable allows 5 requests per second per base
+    airtable_requests_per_second: float = 5
+
+    # Where Airtable tables are mirrored: a local SQLite file surviving restarts,
+    # Redis shared by several replicas, or process memory for tests and benchmarks
+    airtable_mirror_backend: str = Field("sqlite", pattern=r"sqlite|redis|memory")
+    airtable_mirror_path: str = "data/airtable_mirror.sqlite3"
+    airtable_mirror_redis_url: str = "redis://localhost:6379/0"
+
+    # Journal of kek suggestions and pushes not yet sent to Airtable
+    airtable_outbox_path: str = "data/airtable_outbox.jsonl"
+
+    # Optional Airtable webhook pushing changes of tables: its id, `macSecretBase64`
+    # got on creation and a port of the notification endpoint `/airtable/webhook`
+    airtable_webhook_id: str | None = None
+    airtable_webhook_secret: str | None = None
+    airtable_webhook_port: int = 8080
+
+    # Cached tables are refreshed in background once older than `ttl` seconds,
+    # and never served older than `max_staleness`, even if Airtable is down
+    kek_cache_ttl: int = 5 * 60
+    kek_cache_max_staleness: int = 24 * 60 * 60
+    # Refresh interval when the webhook pushes changes, only to catch missed ones
+    kek_webhook_cache_ttl: int = 60 * 60
+
+    # Seconds to collect updated attachment file ids before writing them in batch
+    kek_file_id_flush_interval: int = 60
+
+    # How random keks are picked: a shuffle without repeats per chat, or favouring
+    # keks by their numeric `Weight` field in the List
+    kek_sampler: str = Field("shuffle", pattern=r"shuffle|weighted")
+
+    # `List` and `Suggestions` have an `AttachmentUniqueID` text field, so suggested
+    # attachments already there are caught as duplicates, not only texts
+    kek_attachment_unique_ids: bool = False
+
+    # Inline search matches words by stems, cutting common Russian endings off
+    kek_search_stemming: bool = False
+
+    # Seconds an inline search waits for the user to type on, only the latest
+    # query of a user is answered
+    kek_inline_debounce: float = 0.03
+
+    # Seconds /kek_add waits for Airtable before reporting a kek as queued
+    kek_add_confirm_timeout: float = 30
+
+    # Seconds between log lines with hit rates of caches and counters of queues,
+    # 0 to log them only on shutdown
+    metrics_log_interval: int = 15 * 60
 
     # Chat to forward runtime exceptions
     events_chat_id: int | None = None
@@ -52,5 +101,14 @@ class Settings(BaseSettings):
 
     surprise_gif: str = "https://t.me/mechmath/743455"
 
+    @model_validator(mode="after")
+    def check_airtable_webhook(self):
+        # Notifications can't be verified without the secret, nor matched without the id
+        if (self.airtable_webhook_id is None) != (self.airtable_webhook_secret is None):
+            raise ValueError(
+                "AIRTABLE_WEBHOOK_ID and AIRTABLE_WEBHOOK_SECRET must be set together"
+            )
+        return self
+
 
 config = Settings()
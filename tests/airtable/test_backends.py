@@ -0,0 +1,77 @@
+import os
+
+from datetime import UTC, datetime
+
+import pytest
+
+from app.airtable.backends import (
+    MemoryBackend,
+    RedisBackend,
+    SQLiteBackend,
+    SyncState,
+)
+
+NOW = datetime(2026, 1, 1, tzinfo=UTC)
+STATE = SyncState(synced_at=NOW, full_synced_at=NOW, updated_at=NOW)
+
+
+def make_record(record_id: str, created_time: str = "") -> dict:
+    return {"id": record_id, "createdTime": created_time, "fields": {}}
+
+
+@pytest.fixture(params=["memory", "sqlite", "redis"])
+async def backend(request, tmp_path):
+    match request.param:
+        case "memory":
+            backend = MemoryBackend()
+        case "sqlite":
+            backend = SQLiteBackend(str(tmp_path / "mirror.sqlite3"))
+        case "redis":
+            if not (url := os.environ.get("TEST_REDIS_URL")):
+                pytest.skip("TEST_REDIS_URL is not set")
+            backend = RedisBackend(url, prefix=f"test:{tmp_path.name}")
+
+    yield backend
+    await backend.close()
+
+
+async def test_saves_records_in_order(backend):
+    records = [make_record("rec2", "2026-01-01"), make_record("rec1", "2026-01-02")]
+
+    await backend.save("List", records, STATE)
+
+    assert await backend.load("List") == records
+    assert await backend.state("List") == STATE
+
+
+async def test_upserts_and_deletes_records(backend):
+    await backend.save("List", [make_record("rec1"), make_record("rec2")], STATE)
+
+    updated = {**make_record("rec2"), "fields": {"Text": "new"}}
+    await backend.save("List", [updated], STATE, deleted_ids=["rec1"])
+
+    assert await backend.load("List") == [updated]
+
+
+async def test_replace_drops_mirrors_of_same_table(backend):
+    await backend.save("List[Text]", [make_record("rec1")], STATE)
+    await backend.save("Users", [make_record("usr1")], STATE)
+
+    await backend.save("List[AttachmentType]", [make_record("rec2")], STATE, True)
+
+    assert await backend.load("List[Text]") == []
+    assert await backend.load("List[AttachmentType]") == [make_record("rec2")]
+    assert await backend.load("Users") == [make_record("usr1")]
+
+
+async def test_unknown_mirror_is_empty(backend):
+    assert await backend.load("List") == []
+    assert await backend.state("List") is None
+
+
+async def test_keeps_webhook_cursors(backend):
+    assert await backend.cursor("ach1") is None
+
+    await backend.set_cursor("ach1", 42)
+
+    assert await backend.cursor("ach1") == 42
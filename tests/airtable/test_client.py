@@ -0,0 +1,140 @@
+import pytest
+
+from aiohttp import web
+from aiohttp.test_utils import TestServer
+
+from app.airtable.client import AirtableClient, AirtableError
+
+
+class FakeAirtable:
+    """
+    Serves a single in-memory table with Airtable's REST semantics
+    """
+
+    def __init__(self, records: list[dict]):
+        self.records = records
+        self.requests: list[tuple[str, str, dict]] = []
+        self.failures: list[int] = []
+
+        self.app = web.Application()
+        self.app.router.add_post("/v0/base/{table}/listRecords", self.list_records)
+        self.app.router.add_post("/v0/base/{table}", self.write)
+        self.app.router.add_patch("/v0/base/{table}", self.write)
+
+    async def list_records(self, request: web.Request) -> web.Response:
+        body = await request.json()
+        self.requests.append((request.method, request.path, body))
+        if self.failures:
+            return web.json_response({}, status=self.failures.pop(0))
+
+        start = int(body.get("offset", 0))
+        end = start + body["pageSize"]
+        page = {"records": self.records[start:end]}
+        if end < len(self.records):
+            page["offset"] = str(end)
+        return web.json_response(page)
+
+    async def write(self, request: web.Request) -> web.Response:
+        body = await request.json()
+        self.requests.append((request.method, request.path, body))
+        records = [{"id": f"rec{i}", **r} for i, r in enumerate(body["records"])]
+        if "performUpsert" in body:
+            return web.json_response(
+                {"records": records, "createdRecords": [], "updatedRecords": []}
+            )
+        return web.json_response({"records": records})
+
+
+@pytest.fixture
+async def airtable():
+    fake = FakeAirtable([{"id": f"rec{i}", "fields": {"N": i}} for i in range(250)])
+    async with TestServer(fake.app) as server:
+        fake.url = str(server.make_url("/v0"))
+        yield fake
+
+
+@pytest.fixture
+async def client(airtable):
+    client = AirtableClient("token")
+    client.api_url = airtable.url
+    client.retry_backoff = 0
+    yield client
+    await client.close()
+
+
+async def test_all_follows_offsets(airtable, client):
+    records = await client.table("base", "List").all()
+
+    assert [r["fields"]["N"] for r in records] == list(range(250))
+    assert len(airtable.requests) == 3
+
+
+async def test_all_passes_fields_and_formula(airtable, client):
+    await client.table("base", "List").all(fields=["N"], formula="TRUE()")
+
+    _, _, body = airtable.requests[0]
+    assert body["fields"] == ["N"]
+    assert body["filterByFormula"] == "TRUE()"
+
+
+async def test_batch_update_sends_chunks_of_ten(airtable, client):
+    records = [{"id": f"rec{i}", "fields": {"N": i}} for i in range(25)]
+
+    result = await client.table("base", "List").batch_update(records)
+
+    assert len(result) == 25
+    assert sorted(len(body["records"]) for _, _, body in airtable.requests) == [
+        5,
+        10,
+        10,
+    ]
+
+
+async def test_batch_upsert_merges_results(airtable, client):
+    result = await client.table("base", "Users").batch_upsert(
+        [{"fields": {"TelegramID": 1}}], key_fields=["TelegramID"]
+    )
+
+    assert result["records"][0]["fields"] == {"TelegramID": 1}
+    _, _, body = airtable.requests[0]
+    assert body["performUpsert"] == {"fieldsToMergeOn": ["TelegramID"]}
+
+
+async def test_retries_rate_limited_requests(airtable, client):
+    airtable.failures = [429, 503]
+
+    records = await client.table("base", "List").all()
+
+    assert len(records) == 250
+
+
+async def test_raises_after_retries(airtable, client):
+    airtable.failures = [429, 429, 429]
+
+    with pytest.raises(AirtableError) as e:
+        await client.table("base", "List").all()
+
+    assert e.value.status == 429
+
+
+async def test_does_not_retry_client_errors(airtable, client):
+    airtable.failures = [422]
+
+    with pytest.raises(AirtableError):
+        await client.table("base", "List").all()
+
+    assert len(airtable.requests) == 1
+
+
+async def test_reuses_session(client):
+    assert client.session is client.session
+
+
+async def test_rate_limits_requests_per_base(airtable, client):
+    client.requests_per_second = 1000
+
+    await client.table("base", "List").all()
+    await client.table("base", "Users").all()
+
+    assert list(client.limiters) == ["base"]
+    assert client.limiters["base"].stats()["acquired"] == 6
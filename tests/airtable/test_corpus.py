@@ -0,0 +1,87 @@
+from app.airtable.corpus import TEXT, KekCorpus
+
+RECORDS = [
+    {"id": "rec1", "fields": {"Text": "Hello World"}},
+    {
+        "id": "rec2",
+        "fields": {
+            "Text": "Photo",
+            "AttachmentType": "photo",
+            "AttachmentFileID": "file1",
+        },
+    },
+    {"id": "rec3", "fields": {"AttachmentType": "sticker"}},
+]
+
+
+def test_builds_columns():
+    corpus = KekCorpus(RECORDS)
+
+    assert len(corpus) == 3
+    assert corpus.ids == ["rec1", "rec2", "rec3"]
+    assert corpus.texts == ["Hello World", "Photo", None]
+    assert corpus.attachment_types == [None, "photo", "sticker"]
+    assert corpus.attachment_file_ids == [None, "file1", None]
+    assert list(corpus.weights) == [1.0, 1.0, 1.0]
+
+
+def test_broken_weights_count_as_one():
+    weights = [2, 0.5, {"error": "#ERROR!"}, {"specialValue": "NaN"}, "3", True]
+    corpus = KekCorpus(
+        [{"id": f"rec{i}", "fields": {"Weight": w}} for i, w in enumerate(weights)]
+    )
+
+    assert list(corpus.weights) == [2.0, 0.5, 1.0, 1.0, 1.0, 1.0]
+
+
+def test_interns_attachment_types():
+    corpus = KekCorpus(
+        [
+            {"id": f"rec{i}", "fields": {"AttachmentType": "".join(["pho", "to"])}}
+            for i in range(2)
+        ]
+    )
+
+    assert corpus.attachment_types[0] is corpus.attachment_types[1]
+
+
+def test_item_access():
+    corpus = KekCorpus(RECORDS)
+
+    kek = corpus[1]
+
+    assert kek.index == 1
+    assert kek.id == "rec2"
+    assert kek.text == "Photo"
+    assert kek.attachment_type == "photo"
+    assert kek.attachment_file_id == "file1"
+
+
+def test_partitions_by_attachment_type():
+    corpus = KekCorpus([*RECORDS, {"id": "rec4", "fields": {"Text": ""}}])
+
+    assert list(corpus.partition(TEXT)) == [0]
+    assert list(corpus.partition("photo")) == [1]
+    assert list(corpus.partition("sticker")) == [2]
+    assert len(corpus.partition("video")) == 0
+    assert corpus.partition("photo") is corpus.partition("photo")
+
+
+def test_snapshots_have_own_versions():
+    assert KekCorpus(RECORDS).version != KekCorpus(RECORDS).version
+
+
+def test_get_by_record_id():
+    corpus = KekCorpus(RECORDS)
+
+    assert corpus.get("rec3").index == 2
+    assert corpus.get("missing") is None
+
+
+def test_set_file_id():
+    corpus = KekCorpus(RECORDS)
+
+    corpus.set_file_id("rec2", "file2")
+    corpus.set_file_id("missing", "file3")
+
+    assert corpus.attachment_file_ids == [None, "file2", None]
@@ -0,0 +1,66 @@
+from app.airtable.dedup import DedupIndex, Duplicate
+
+
+def make_kek(record_id: str, text: str | None = None, unique_id: str | None = None):
+    fields = {"Text": text}
+    if unique_id:
+        fields |= {"AttachmentType": "photo", "AttachmentUniqueID": unique_id}
+    return {"id": record_id, "fields": fields}
+
+
+def test_finds_text_regardless_of_case_and_spacing():
+    index = DedupIndex()
+    index.apply_keks([make_kek("rec1", "Hello  World")])
+
+    assert index.find("hello world\n", None) == Duplicate("List", "rec1")
+    assert index.find("hello", None) is None
+
+
+def test_finds_attachments_by_unique_id_only():
+    index = DedupIndex()
+    index.apply_keks([make_kek("rec1", "Caption", "photo1")])
+
+    assert index.find("Another caption", "photo1") == Duplicate("List", "rec1")
+    assert index.find("Caption", "photo2") is None
+    assert index.find("Caption", None) is None
+
+
+def test_ignores_attachments_without_unique_id():
+    index = DedupIndex()
+    index.apply_keks([{"id": "rec1", "fields": {"AttachmentType": "photo"}}])
+
+    assert len(index) == 0
+
+
+def test_follows_changed_and_deleted_keks():
+    index = DedupIndex()
+    index.apply_keks([make_kek("rec1", "old"), make_kek("rec2", "kept")])
+
+    index.apply_keks([make_kek("rec1", "new")], deleted_ids=["rec2"])
+
+    assert index.find("old", None) is None
+    assert index.find("kept", None) is None
+    assert index.find("new", None) == Duplicate("List", "rec1")
+
+
+def test_prefers_list_over_suggestions():
+    index = DedupIndex()
+    index.apply_suggestions([make_kek("sug1", "kek")])
+    index.add("Suggestions", None, "kek", None, None)
+
+    assert index.find("kek", None) == Duplicate("Suggestions", "sug1")
+
+    index.apply_keks([make_kek("rec1", "kek")])
+
+    assert index.find("kek", None) == Duplicate("List", "rec1")
+
+
+def test_full_sync_replaces_pending_keks():
+    index = DedupIndex()
+    index.add("Suggestions", None, "pending", None, None)
+    assert index.find("pending", None) == Duplicate("Suggestions", None)
+
+    index.apply_suggestions([make_kek("sug1", "synced")], replace=True)
+
+    assert index.find("pending", None) is None
+    assert index.find("synced", None) == Duplicate("Suggestions", "sug1")
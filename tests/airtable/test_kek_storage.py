@@ -1,67 +1,388 @@
-from unittest.mock import Mock
+import asyncio
+
+from unittest.mock import AsyncMock, Mock, patch
 
 import pytest
 
 from aiogram.types import User
 
+from app.airtable.backends import MemoryBackend
 from app.airtable.kek_storage import KekStorage
+from app.common.rate_limiter import Priority
+
+
+def make_table(name: str, records: list[dict] | None = None) -> Mock:
+    table = Mock()
+    table.name = name
+    table.all = AsyncMock(return_value=records or [])
+    table.create = AsyncMock()
+    table.batch_create = AsyncMock()
+    table.batch_update = AsyncMock()
+    table.batch_upsert = AsyncMock()
+    return table
+
+
+def make_upsert_result(*users: User) -> dict:
+    records = [
+        {"id": f"usr{user.id}", "fields": {"TelegramID": user.id}} for user in users
+    ]
+    return {"createdRecords": [], "updatedRecords": [], "records": records}
 
 
 @pytest.fixture
-def kek_storage():
-    return KekStorage()
+async def kek_storage(tmp_path):
+    kek_storage = KekStorage(MemoryBackend())
+    kek_storage.list = make_table("List")
+    kek_storage.list_mirror.table = kek_storage.list
+    kek_storage.users = make_table("Users")
+    kek_storage.users_mirror.table = kek_storage.users
+    kek_storage.suggestions = make_table("Suggestions")
+    kek_storage.suggestions_mirror.table = kek_storage.suggestions
+    kek_storage.outbox.path = tmp_path / "outbox.jsonl"
+    yield kek_storage
+    await kek_storage.outbox.close()
 
 
 @pytest.mark.asyncio
-async def test_async_all(kek_storage):
-    mock_all = Mock(return_value=[{"id": 1, "fields": {"Text": "Test kek"}}])
-    kek_storage.all = mock_all
+async def test_async_corpus(kek_storage):
+    kek_storage.list.all.return_value = [{"id": "rec1", "fields": {"Text": "Test kek"}}]
 
-    result = await kek_storage.async_all()
+    result = await kek_storage.async_corpus()
 
-    assert result == [{"id": 1, "fields": {"Text": "Test kek"}}]
-    mock_all.assert_called_once()
+    assert result.ids == ["rec1"]
+    assert result.texts == ["Test kek"]
+    assert result.search_index is not None
+    kek_storage.list.all.assert_awaited_once()
+    fields = kek_storage.list.all.call_args.kwargs["fields"]
+    assert "Text" in fields
+    assert "Attachment" not in fields
 
 
 @pytest.mark.asyncio
-async def test_async_add(kek_storage):
-    mock_add = Mock(return_value={"id": 1, "fields": {"Text": "New kek"}})
-    kek_storage.add = mock_add
+async def test_async_corpus_is_rebuilt_on_changes_only(kek_storage):
+    kek_storage.list.all.return_value = [{"id": "rec1", "fields": {"Text": "Test kek"}}]
+    corpus = await kek_storage.async_corpus()
+
+    await KekStorage.async_corpus.revalidate(kek_storage)
+    assert kek_storage.corpus is corpus
+
+    kek_storage.list.all.return_value = [{"id": "rec1", "fields": {"Text": "New"}}]
+    await KekStorage.async_corpus.revalidate(kek_storage)
+    assert kek_storage.corpus.texts == ["New"]
+
+
+def test_weighted_sampler_reads_weights():
+    assert "Weight" not in KekStorage(MemoryBackend()).list_mirror.fields
+
+    with patch("airtable.kek_storage.config.kek_sampler", "weighted"):
+        assert "Weight" in KekStorage(MemoryBackend()).list_mirror.fields
+
+
+def test_attachment_unique_ids_only_once_enabled():
+    kek_storage = KekStorage(MemoryBackend())
+    assert "AttachmentUniqueID" not in kek_storage.suggestions_mirror.fields
+    assert "AttachmentUniqueID" not in kek_storage._create_row(*[None] * 3, "u1")
+
+    with patch("airtable.kek_storage.config.kek_attachment_unique_ids", True):
+        kek_storage = KekStorage(MemoryBackend())
+        assert "AttachmentUniqueID" in kek_storage.list_mirror.fields
+        assert "AttachmentUniqueID" in kek_storage.suggestions_mirror.fields
+        row = kek_storage._create_row(*[None] * 3, "u1")
+        assert row["AttachmentUniqueID"] == "u1"
 
+
+@pytest.mark.asyncio
+async def test_async_all_users_requests_projected_fields(kek_storage):
+    await kek_storage.async_all_users()
+
+    fields = kek_storage.users.all.call_args.kwargs["fields"]
+    assert set(fields) == {
+        "Name",
+        "TelegramID",
+        "Username",
+        "LanguageCode",
+        "Author",
+        "Suggestor",
+    }
+
+
+@pytest.mark.asyncio
+async def test_async_attachment_url(kek_storage):
+    kek_storage.list.get = AsyncMock(
+        return_value={"id": "rec1", "fields": {"Attachment": [{"url": "https://a"}]}}
+    )
+
+    assert await kek_storage.async_attachment_url("rec1") == "https://a"
+    kek_storage.list.get.assert_awaited_once_with("rec1")
+
+
+@pytest.mark.asyncio
+async def test_async_add(kek_storage):
     author = User(id=1, is_bot=False, first_name="Test")
     suggestor = User(id=2, is_bot=False, first_name="Suggestor")
+    kek_storage.users.batch_upsert.return_value = make_upsert_result(author, suggestor)
 
-    result = await kek_storage.async_add(
+    await kek_storage.async_add(
         author=author,
         suggestor=suggestor,
         text="New kek",
-        attachment_url=None,
         attachment_type=None,
         attachment_filename=None,
         attachment_file_id=None,
     )
 
-    assert result == {"id": 1, "fields": {"Text": "New kek"}}
-    mock_add.assert_called_once_with(
-        author, suggestor, "New kek", None, None, None, None
-    )
+    kek_storage.suggestions.batch_create.assert_not_awaited()
+    assert kek_storage.outbox.stats()["depth"] == 1
+
+    assert await kek_storage.outbox.drain()
+
+    (row,) = kek_storage.suggestions.batch_create.call_args.args[0]
+    assert row["Text"] == "New kek"
+    assert row["Author"] == ["usr1"]
+    assert row["Suggestor"] == ["usr2"]
 
 
 @pytest.mark.asyncio
 async def test_async_push(kek_storage):
-    mock_push = Mock(return_value={"id": 1, "fields": {"Text": "Pushed kek"}})
-    kek_storage.push = mock_push
-
     author = User(id=1, is_bot=False, first_name="Test")
+    kek_storage.users.batch_upsert.return_value = make_upsert_result(author)
 
-    result = await kek_storage.async_push(
+    await kek_storage.async_push(
         author=author,
         text="Pushed kek",
-        attachment_url=None,
         attachment_type=None,
         attachment_filename=None,
         attachment_file_id=None,
     )
+    await kek_storage.outbox.drain()
+
+    (row,) = kek_storage.list.batch_create.call_args.args[0]
+    assert row["Author"] == ["usr1"]
+    assert "Suggestor" not in row
+
+
+@pytest.mark.asyncio
+async def test_attachment_url_is_got_right_before_sending(kek_storage):
+    author = User(id=1, is_bot=False, first_name="Test")
+    kek_storage.users.batch_upsert.return_value = make_upsert_result(author)
+    kek_storage.bot = Mock(id=42, token="42:ABC")
+    kek_storage.bot.get_file = AsyncMock(return_value=Mock(file_path="photo.jpg"))
+    kek_storage.bot.session.api.file_url = lambda token, path: f"https://t/{path}"
+
+    await kek_storage.async_push(author, "Photo kek", "photo", None, "file1", "uniq1")
+
+    assert "https://" not in kek_storage.outbox.path.read_text()
+    kek_storage.bot.get_file.assert_not_awaited()
+
+    await kek_storage.outbox.drain()
+
+    (row,) = kek_storage.list.batch_create.call_args.args[0]
+    assert row["AttachmentFileID"] == "file1"
+    assert row["Attachment"] == [{"url": "https://t/photo.jpg", "filename": None}]
+
+
+@pytest.mark.asyncio
+async def test_finds_duplicates_of_list_suggestions_and_new_keks(kek_storage):
+    kek_storage.list.all.return_value = [
+        {
+            "id": "rec1",
+            "fields": {"AttachmentType": "photo", "AttachmentUniqueID": "photo1"},
+        }
+    ]
+    kek_storage.suggestions.all.return_value = [
+        {"id": "sug1", "fields": {"Text": "Suggested kek"}}
+    ]
+    author = User(id=1, is_bot=False, first_name="Test")
+
+    # Cold tables aren't waited for, only loaded in background
+    assert kek_storage.find_duplicate(None, "photo1") is None
+    await asyncio.sleep(0.01)
+
+    assert kek_storage.find_duplicate(None, "photo1").record_id == "rec1"
+    assert kek_storage.find_duplicate("suggested  KEK", None).table == "Suggestions"
+    assert kek_storage.find_duplicate("New kek", None) is None
+
+    await kek_storage.async_add(author, author, "New kek", *[None] * 4)
+
+    assert kek_storage.find_duplicate("New kek", None) is not None
+    kek_storage.suggestions.all.assert_awaited_once()
+    fields = kek_storage.suggestions.all.call_args.kwargs["fields"]
+    assert set(fields) == {"Text", "AttachmentType"}
+
+
+@pytest.mark.asyncio
+async def test_queued_suggestions_are_created_in_batch(kek_storage):
+    users = [User(id=i, is_bot=False, first_name=f"User {i}") for i in (1, 2, 3)]
+    kek_storage.users.batch_upsert.return_value = make_upsert_result(*users)
+
+    for author in users:
+        await kek_storage.async_add(author, users[0], author.first_name, *[None] * 4)
+    await kek_storage.outbox.drain()
+
+    kek_storage.users.batch_upsert.assert_awaited_once()
+    rows = kek_storage.suggestions.batch_create.call_args.args[0]
+    assert [(row["Text"], row["Author"]) for row in rows] == [
+        ("User 1", ["usr1"]),
+        ("User 2", ["usr2"]),
+        ("User 3", ["usr3"]),
+    ]
+
+
+@pytest.mark.asyncio
+async def test_upsert_users_in_one_request(kek_storage):
+    author = User(id=1, is_bot=False, first_name="Author")
+    suggestor = User(id=2, is_bot=False, first_name="Suggestor")
+    kek_storage.users.batch_upsert.return_value = make_upsert_result(author, suggestor)
+
+    result = await kek_storage.upsert_users(author, suggestor)
+
+    assert result == ["usr1", "usr2"]
+    kek_storage.users.batch_upsert.assert_awaited_once()
+    rows = kek_storage.users.batch_upsert.call_args.args[0]
+    assert [row["fields"]["TelegramID"] for row in rows] == [1, 2]
+
+
+@pytest.mark.asyncio
+async def test_upsert_users_dedupes_same_user(kek_storage):
+    user = User(id=1, is_bot=False, first_name="Self")
+    kek_storage.users.batch_upsert.return_value = make_upsert_result(user)
+
+    result = await kek_storage.upsert_users(user, user)
+
+    assert result == ["usr1", "usr1"]
+    assert len(kek_storage.users.batch_upsert.call_args.args[0]) == 1
+
+
+@pytest.mark.asyncio
+async def test_upsert_users_skips_known_users(kek_storage):
+    user = User(id=1, is_bot=False, first_name="Known")
+    kek_storage.users.batch_upsert.return_value = make_upsert_result(user)
+
+    await kek_storage.upsert_users(user)
+    result = await kek_storage.upsert_users(user)
+
+    assert result == ["usr1"]
+    kek_storage.users.batch_upsert.assert_awaited_once()
+
+
+@pytest.mark.asyncio
+async def test_upsert_users_again_after_profile_change(kek_storage):
+    user = User(id=1, is_bot=False, first_name="Old")
+    renamed = User(id=1, is_bot=False, first_name="New")
+    kek_storage.users.batch_upsert.return_value = make_upsert_result(user)
+
+    await kek_storage.upsert_users(user)
+    await kek_storage.upsert_users(renamed)
+
+    assert kek_storage.users.batch_upsert.await_count == 2
+
+
+@pytest.mark.asyncio
+async def test_upsert_users_renamed_within_one_request(kek_storage):
+    user = User(id=1, is_bot=False, first_name="Old")
+    renamed = User(id=1, is_bot=False, first_name="New")
+    kek_storage.users.batch_upsert.return_value = make_upsert_result(renamed)
+
+    result = await kek_storage.upsert_users(user, renamed)
+
+    assert result == ["usr1", "usr1"]
+    rows = kek_storage.users.batch_upsert.call_args.args[0]
+    assert [row["fields"]["Name"] for row in rows] == ["New"]
+
+
+@pytest.mark.asyncio
+async def test_all_users_seeds_record_ids(kek_storage):
+    user = User(id=1, is_bot=False, first_name="Seeded", language_code="ru")
+    kek_storage.users.all.return_value = [
+        {
+            "id": "usr1",
+            "fields": {"TelegramID": 1, "Name": "Seeded", "LanguageCode": "ru"},
+        }
+    ]
+
+    await kek_storage.async_all_users()
+
+    assert await kek_storage.upsert_users(user) == ["usr1"]
+    kek_storage.users.batch_upsert.assert_not_awaited()
+
+
+@pytest.mark.asyncio
+async def test_queue_file_id_update_patches_cache_and_batches(kek_storage):
+    kek_storage.list.all.return_value = [
+        {"id": "rec1", "fields": {"AttachmentFileID": "old"}}
+    ]
+    corpus = await kek_storage.async_corpus()
+
+    kek_storage.queue_file_id_update("rec1", "new")
+
+    assert corpus.get("rec1").attachment_file_id == "new"
+    assert (
+        kek_storage.list_mirror.records["rec1"]["fields"]["AttachmentFileID"] == "new"
+    )
+    kek_storage.list.batch_update.assert_not_awaited()
+
+    await kek_storage.close()
+
+    kek_storage.list.batch_update.assert_awaited_once_with(
+        [{"id": "rec1", "fields": {"AttachmentFileID": "new"}}], priority=Priority.LOW
+    )
+
+
+@pytest.mark.asyncio
+async def test_warm_up_serves_persisted_snapshot(tmp_path):
+    backend = MemoryBackend()
+    previous = KekStorage(backend)
+    previous.list_mirror.table = make_table(
+        "List", [{"id": "rec1", "fields": {"Text": "Persisted kek"}}]
+    )
+    previous.users_mirror.table = make_table(
+        "Users", [{"id": "usr1", "fields": {"TelegramID": 1, "Name": "Persisted"}}]
+    )
+    await previous.async_corpus()
+    await previous.async_all_users()
+
+    kek_storage = KekStorage(backend)
+    kek_storage.list_mirror.table = make_table("List")
+    kek_storage.users_mirror.table = make_table("Users")
+    kek_storage.suggestions_mirror.table = make_table("Suggestions")
+    kek_storage.outbox.path = tmp_path / "outbox.jsonl"
+    await kek_storage.warm_up()
+
+    corpus = await kek_storage.async_corpus()
+    users = await kek_storage.async_all_users()
+
+    assert corpus.texts == ["Persisted kek"]
+    assert users[0]["id"] == "usr1"
+    assert kek_storage.user_record_ids[(1, "Persisted", None, None)] == "usr1"
+    await asyncio.sleep(0)
+    kek_storage.list_mirror.table.all.assert_awaited_once()
+    await kek_storage.outbox.close()
+
+
+@pytest.mark.asyncio
+async def test_apply_changes_updates_cached_corpus(kek_storage):
+    kek_storage.list.all.return_value = [{"id": "rec1", "fields": {"Text": "Old"}}]
+    await kek_storage.async_corpus()
+
+    kek_storage.list.all.return_value = [{"id": "rec2", "fields": {"Text": "New"}}]
+    await kek_storage.apply_changes({"rec2"}, deleted_ids={"rec1"})
+
+    corpus = await kek_storage.async_corpus()
+    assert corpus.texts == ["New"]
+    assert kek_storage.list.all.await_count == 2
+
+
+@pytest.mark.asyncio
+async def test_stats_follow_synced_deltas(kek_storage):
+    kek_storage.list.all.return_value = [
+        {"id": "rec1", "fields": {"AttachmentType": "photo"}},
+        {"id": "rec2", "fields": {}},
+    ]
+    stats = await kek_storage.async_stats()
+    assert stats.attachment_types == {"photo": 1, "text": 1}
+
+    kek_storage.list.all.return_value = [{"id": "rec2", "fields": {}}]
+    await kek_storage.apply_changes({"rec2"}, deleted_ids={"rec1"})
 
-    assert result == {"id": 1, "fields": {"Text": "Pushed kek"}}
-    mock_push.assert_called_once_with(author, "Pushed kek", None, None, None, None)
+    assert stats.total == 1
+    assert stats.attachment_types == {"text": 1}
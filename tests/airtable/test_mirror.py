@@ -0,0 +1,244 @@
+import asyncio
+
+from datetime import UTC, datetime, timedelta
+from unittest.mock import AsyncMock, Mock
+
+import pytest
+
+from app.airtable.backends import MemoryBackend, SQLiteBackend
+from app.airtable.mirror import TableMirror
+
+
+def make_record(record_id: str, text: str) -> dict:
+    return {"id": record_id, "createdTime": "", "fields": {"Text": text}}
+
+
+@pytest.fixture(params=["memory", "sqlite"])
+async def db(request, tmp_path):
+    if request.param == "memory":
+        yield MemoryBackend()
+    else:
+        backend = SQLiteBackend(str(tmp_path / "mirror.sqlite3"))
+        yield backend
+        await backend.close()
+
+
+async def restore(table, db, **kwargs) -> TableMirror:
+    mirror = TableMirror(table, db, **kwargs)
+    await mirror.load()
+    return mirror
+
+
+@pytest.fixture
+def table():
+    table = Mock()
+    table.name = "List"
+    table.all = AsyncMock(
+        return_value=[make_record("rec1", "a"), make_record("rec2", "b")]
+    )
+    return table
+
+
+async def test_first_sync_fetches_whole_table(table, db):
+    mirror = TableMirror(table, db)
+
+    result = await mirror.sync()
+
+    assert [r["id"] for r in result] == ["rec1", "rec2"]
+    table.all.assert_awaited_once_with(fields=None)
+
+
+async def test_next_sync_fetches_only_modified_records(table, db):
+    mirror = TableMirror(table, db)
+    await mirror.sync()
+
+    table.all = AsyncMock(
+        return_value=[make_record("rec2", "B"), make_record("rec3", "c")]
+    )
+    result = await mirror.sync()
+
+    formula = str(table.all.call_args.kwargs["formula"])
+    assert formula.startswith("IS_AFTER(LAST_MODIFIED_TIME(), DATETIME_PARSE(")
+    assert [(r["id"], r["fields"]["Text"]) for r in result] == [
+        ("rec1", "a"),
+        ("rec2", "B"),
+        ("rec3", "c"),
+    ]
+
+
+async def test_revision_changes_with_records_only(table):
+    mirror = TableMirror(table, MemoryBackend())
+    await mirror.sync()
+    revision = mirror.revision
+
+    # The overlap of deltas brings the same records again
+    table.all = AsyncMock(return_value=[make_record("rec2", "b")])
+    await mirror.sync()
+    assert mirror.revision == revision
+
+    table.all = AsyncMock(return_value=[make_record("rec2", "B")])
+    await mirror.sync()
+    assert mirror.revision == revision + 1
+
+
+async def test_restart_continues_from_persisted_state(table, db):
+    await TableMirror(table, db).sync()
+
+    table.all = AsyncMock(return_value=[])
+    mirror = await restore(table, db)
+
+    assert [r["id"] for r in mirror.all()] == ["rec1", "rec2"]
+
+    await mirror.sync()
+
+    assert "formula" in table.all.call_args.kwargs
+
+
+async def test_delta_keeps_order_after_restart(table, db):
+    mirror = TableMirror(table, db)
+    await mirror.sync()
+    table.all = AsyncMock(return_value=[make_record("rec1", "A")])
+    await mirror.sync()
+
+    restored = await restore(table, db)
+
+    assert [(r["id"], r["fields"]["Text"]) for r in restored.all()] == [
+        ("rec1", "A"),
+        ("rec2", "b"),
+    ]
+
+
+async def test_full_sync_drops_deleted_records(table, db):
+    mirror = TableMirror(table, db, full_sync_interval=timedelta(0))
+    await mirror.sync()
+
+    table.all = AsyncMock(return_value=[make_record("rec2", "b")])
+    result = await mirror.sync()
+
+    table.all.assert_awaited_once_with(fields=None)
+    assert [r["id"] for r in result] == ["rec2"]
+    assert [r["id"] for r in (await restore(table, db)).all()] == ["rec2"]
+
+
+async def test_mirrors_are_isolated_by_table(table, db):
+    await TableMirror(table, db).sync()
+
+    users = Mock()
+    users.name = "Users"
+
+    assert (await restore(users, db)).all() == []
+
+
+async def test_requests_only_mirrored_fields(table, db):
+    mirror = TableMirror(table, db, fields=["Text"])
+
+    await mirror.sync()
+    await mirror.sync()
+
+    assert all(call.kwargs["fields"] == ["Text"] for call in table.all.await_args_list)
+
+
+async def test_other_fields_start_with_full_sync(table, db):
+    await TableMirror(table, db, fields=["Text"]).sync()
+
+    mirror = await restore(table, db, fields=["Text", "AttachmentType"])
+
+    assert mirror.all() == []
+    assert mirror.needs_full_sync(datetime.now(UTC))
+
+    await mirror.sync()
+
+    assert await db.load("List[Text]") == []
+
+
+async def test_update_refetches_changed_and_drops_deleted_records(table, db):
+    mirror = TableMirror(table, db)
+    await mirror.sync()
+
+    table.all = AsyncMock(return_value=[make_record("rec3", "c")])
+    changed = await mirror.update({"rec3", "usr1"}, deleted_ids={"rec1"})
+
+    assert changed
+    formula = str(table.all.call_args.kwargs["formula"])
+    assert formula == "OR(RECORD_ID()='rec3', RECORD_ID()='usr1')"
+    assert [r["id"] for r in mirror.all()] == ["rec2", "rec3"]
+    assert [r["id"] for r in (await restore(table, db)).all()] == ["rec2", "rec3"]
+
+
+async def test_update_ignores_records_of_other_tables(table, db):
+    mirror = TableMirror(table, db)
+    await mirror.sync()
+
+    table.all = AsyncMock(return_value=[])
+
+    assert not await mirror.update({"usr1"}, deleted_ids={"usr2"})
+
+
+async def test_update_waits_for_first_sync(table, db):
+    mirror = TableMirror(table, db)
+
+    assert not await mirror.update({"rec1"})
+    table.all.assert_not_awaited()
+
+
+async def test_reuses_sync_of_another_process(table, db):
+    first, second = TableMirror(table, db), TableMirror(table, db)
+    await second.sync()
+    await first.sync()
+
+    table.all = AsyncMock(return_value=[make_record("rec1", "A")])
+    result = await second.sync()
+
+    table.all.assert_not_awaited()
+    assert [r["id"] for r in result] == ["rec1", "rec2"]
+
+
+async def test_concurrent_syncs_of_processes_are_serialized(table):
+    class LockingBackend(MemoryBackend):
+        def __init__(self):
+            super().__init__()
+            self.mutex = asyncio.Lock()
+
+        def lock(self, name):
+            return self.mutex
+
+    db = LockingBackend()
+    first, second = TableMirror(table, db), TableMirror(table, db)
+    await first.sync()
+    await second.sync()
+
+    async def slow_all(**kwargs):
+        await asyncio.sleep(0.01)
+        return [make_record("rec1", "A")]
+
+    table.all = AsyncMock(side_effect=slow_all)
+    await asyncio.gather(first.sync(), second.sync())
+
+    table.all.assert_awaited_once()
+    assert second.all()[0]["fields"]["Text"] == "A"
+
+
+async def test_picks_up_updates_of_another_process(table, db):
+    first, second = TableMirror(table, db), TableMirror(table, db)
+    await first.sync()
+    await second.sync()
+
+    table.all = AsyncMock(return_value=[make_record("rec1", "A")])
+    await first.update({"rec1"})
+    table.all = AsyncMock(return_value=[])
+    result = await second.sync()
+
+    assert result[0]["fields"]["Text"] == "A"
+    assert "formula" in table.all.call_args.kwargs
+
+
+async def test_full_sync_when_backend_lost_state(table, db):
+    mirror = TableMirror(table, db)
+    await mirror.sync()
+
+    other_backend = MemoryBackend()
+    mirror.backend = other_backend
+    await mirror.sync()
+
+    table.all.assert_awaited_with(fields=None)
+    assert len(await other_backend.load("List")) == 2
@@ -0,0 +1,126 @@
+import asyncio
+
+from unittest.mock import AsyncMock
+
+import pytest
+
+from airtable.client import AirtableError
+
+from app.airtable.outbox import Outbox
+
+
+@pytest.fixture
+async def outbox(tmp_path):
+    outbox = Outbox(str(tmp_path / "outbox.jsonl"), AsyncMock())
+    outbox.retry_interval = 0.01
+    yield outbox
+    await outbox.close()
+
+
+def texts(outbox: Outbox, call: int = -1) -> list[str]:
+    batch = outbox.send.await_args_list[call].args[0]
+    return [entry["text"] for entry in batch]
+
+
+async def test_journals_before_sending(outbox):
+    outbox.put("List", {"text": "a"})
+
+    assert '"text": "a"' in outbox.path.read_text()
+    outbox.send.assert_not_awaited()
+
+
+async def test_drains_in_batches_of_same_kind(outbox):
+    outbox.batch_size = 2
+    for kind, text in [("List", "a"), ("Suggestions", "b"), ("List", "c")]:
+        outbox.put(kind, {"text": text})
+    outbox.put("List", {"text": "d"})
+
+    assert await outbox.drain()
+
+    assert [texts(outbox, i) for i in range(3)] == [["a", "c"], ["b"], ["d"]]
+    assert outbox.path.read_text() == ""
+    assert outbox.stats()["sent"] == 4
+
+
+async def test_replays_unsent_entries_after_restart(outbox, tmp_path):
+    outbox.batch_size = 1
+    outbox.put("List", {"text": "sent"})
+    outbox.put("List", {"text": "lost"})
+    outbox.send.side_effect = [None, TimeoutError()]
+    await outbox.drain()
+    await outbox.close()
+    with outbox.path.open("a") as journal:
+        journal.write('{"id": "torn')
+
+    restarted = Outbox(str(outbox.path), AsyncMock())
+    restarted.replay()
+
+    assert [e["text"] for e in restarted.pending.values()] == ["lost"]
+
+
+async def test_keeps_entries_while_airtable_fails(outbox):
+    outbox.send.side_effect = TimeoutError()
+    outbox.put("List", {"text": "a"})
+
+    assert not await outbox.drain()
+
+    stats = outbox.stats()
+    assert stats["depth"] == 1
+    assert stats["age"] >= 0
+    assert stats["failures"] == 1
+
+
+async def test_drops_only_rejected_entry(outbox):
+    async def send(batch):
+        if any(entry["text"] == "bad" for entry in batch):
+            raise AirtableError(422, "INVALID_VALUE_FOR_COLUMN")
+
+    outbox.send.side_effect = send
+    for text in ("a", "bad", "c"):
+        outbox.put("List", {"text": text})
+
+    assert await outbox.drain()
+
+    assert [texts(outbox, i) for i in (1, 3)] == [["a"], ["c"]]
+    assert outbox.stats()["dropped"] == 1
+
+
+async def test_worker_retries_in_background(outbox):
+    outbox.send.side_effect = [TimeoutError(), None]
+    outbox.start()
+
+    outbox.put("List", {"text": "a"})
+    await asyncio.sleep(0.05)
+
+    assert outbox.send.await_count == 2
+    assert outbox.stats()["depth"] == 0
+
+
+async def test_confirms_sent_and_rejected_entries(outbox):
+    async def send(batch):
+        if batch[0]["text"] == "bad":
+            raise AirtableError(422, "INVALID_VALUE_FOR_COLUMN")
+
+    outbox.send.side_effect = send
+    sent = outbox.put("List", {"text": "a"})
+    rejected = outbox.put("Suggestions", {"text": "bad"})
+
+    await outbox.drain()
+
+    assert await sent is True
+    assert await rejected is False
+
+
+async def test_drops_entry_failing_unexpectedly(outbox):
+    async def send(batch):
+        if any(entry["text"] == "bad" for entry in batch):
+            raise KeyError("bad")
+
+    outbox.send.side_effect = send
+    for text in ("a", "bad", "c"):
+        outbox.put("List", {"text": text})
+
+    assert await outbox.drain()
+
+    assert outbox.stats()["dropped"] == 1
+    assert outbox.stats()["sent"] == 2
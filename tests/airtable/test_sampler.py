@@ -0,0 +1,159 @@
+import random
+
+import pytest
+
+from app.airtable.corpus import KekCorpus
+from app.airtable.sampler import (
+    AliasTable,
+    ShuffleBag,
+    ShuffleSampler,
+    WeightedSampler,
+)
+
+
+def make_corpus(*record_ids: str, **weights: float) -> KekCorpus:
+    return KekCorpus(
+        [
+            {"id": record_id, "fields": {"Weight": weights.get(record_id)}}
+            for record_id in record_ids
+        ]
+    )
+
+
+def test_bag_draws_permutation():
+    bag = ShuffleBag(100)
+    rng = random.Random(42)
+
+    drawn = [bag.draw(rng) for _ in range(100)]
+
+    assert sorted(drawn) == list(range(100))
+    assert bag.drawn_indices() == drawn
+    with pytest.raises(IndexError):
+        bag.draw(rng)
+
+
+def test_bag_without_drawn_indices():
+    bag = ShuffleBag.without(10, [7, 0, 3])
+    rng = random.Random(42)
+
+    rest = [bag.draw(rng) for _ in range(len(bag))]
+
+    assert sorted(rest) == [1, 2, 4, 5, 6, 8, 9]
+    assert bag.drawn_indices()[:3] == [7, 0, 3]
+
+
+def test_no_repeats_until_all_keks_are_sent():
+    corpus = make_corpus(*(f"rec{i}" for i in range(10)))
+    sampler = ShuffleSampler(rng=random.Random(42))
+
+    first = [sampler.sample("chat", corpus) for _ in range(10)]
+    second = [sampler.sample("chat", corpus) for _ in range(10)]
+
+    assert sorted(first) == sorted(second) == list(range(10))
+
+
+def test_chats_have_own_bags():
+    corpus = make_corpus("rec1", "rec2")
+    sampler = ShuffleSampler(rng=random.Random(42))
+
+    sampler.sample("chat1", corpus)
+    sampler.sample("chat1", corpus)
+    sampler.sample("chat2", corpus)
+
+    assert len(sampler.bags["chat1"]) == 0
+    assert len(sampler.bags["chat2"]) == 1
+
+
+def test_refreshed_corpus_keeps_sent_keks():
+    sampler = ShuffleSampler(rng=random.Random(42))
+    corpus = make_corpus("rec1", "rec2", "rec3", "rec4")
+    sent = {corpus.ids[sampler.sample("chat", corpus)] for _ in range(2)}
+
+    refreshed = make_corpus("rec5", *reversed(corpus.ids))
+    rest = {refreshed.ids[sampler.sample("chat", refreshed)] for _ in range(3)}
+
+    assert sent.isdisjoint(rest)
+    assert sent | rest == {"rec1", "rec2", "rec3", "rec4", "rec5"}
+
+
+def test_refreshed_corpus_drops_deleted_keks():
+    sampler = ShuffleSampler(rng=random.Random(42))
+    corpus = make_corpus("rec1", "rec2", "rec3")
+    sent = corpus.ids[sampler.sample("chat", corpus)]
+
+    refreshed = make_corpus(*(rid for rid in corpus.ids if rid != sent))
+    rest = [refreshed.ids[sampler.sample("chat", refreshed)] for _ in range(2)]
+
+    assert sorted(rest) == sorted(refreshed.ids)
+
+
+def test_forgets_least_recently_used_chats():
+    corpus = make_corpus("rec1", "rec2")
+    sampler = ShuffleSampler(max_chats=2)
+
+    for chat in ("chat1", "chat2", "chat1", "chat3"):
+        sampler.sample(chat, corpus)
+
+    assert list(sampler.bags) == ["chat1", "chat3"]
+
+
+def test_empty_corpus():
+    with pytest.raises(IndexError):
+        ShuffleSampler().sample("chat", make_corpus())
+
+
+def test_samples_from_population():
+    corpus = make_corpus("rec1", "rec2", "rec3")
+    sampler = ShuffleSampler(population=lambda corpus: [0, 2])
+
+    picked = {sampler.sample("chat", corpus) for _ in range(2)}
+
+    assert picked == {0, 2}
+
+
+def test_refreshed_population_keeps_sent_keks():
+    sampler = ShuffleSampler(
+        population=lambda corpus: [
+            i for i, rid in enumerate(corpus.ids) if rid[-1] != "x"
+        ],
+        rng=random.Random(42),
+    )
+    corpus = make_corpus("rec1", "recx", "rec2")
+    sent = corpus.ids[sampler.sample("chat", corpus)]
+
+    refreshed = make_corpus("recx", "rec2", "rec1")
+    rest = refreshed.ids[sampler.sample("chat", refreshed)]
+
+    assert {sent, rest} == {"rec1", "rec2"}
+
+
+def test_alias_table_follows_weights():
+    table = AliasTable([1, 0, 3, -1])
+    rng = random.Random(42)
+
+    counts = [0] * 4
+    for _ in range(40_000):
+        counts[table.draw(rng)] += 1
+
+    assert counts[1] == counts[3] == 0
+    assert counts[2] / counts[0] == pytest.approx(3, rel=0.05)
+
+
+def test_alias_table_without_positive_weights_is_uniform():
+    table = AliasTable([0, 0])
+    rng = random.Random(42)
+
+    assert {table.draw(rng) for _ in range(100)} == {0, 1}
+
+
+def test_weighted_sampler_rebuilds_on_new_corpus():
+    sampler = WeightedSampler(rng=random.Random(42))
+    corpus = make_corpus("rec1", "rec2", rec1=0)
+
+    assert {sampler.sample("chat", corpus) for _ in range(20)} == {1}
+    table = sampler.table
+    sampler.sample("chat", corpus)
+    assert sampler.table is table
+
+    refreshed = make_corpus("rec1", "rec2", rec2=0)
+    assert {sampler.sample("chat", refreshed) for _ in range(20)} == {0}
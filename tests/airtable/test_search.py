@@ -0,0 +1,146 @@
+import random
+
+from unittest.mock import patch
+
+import pytest
+
+from app.airtable.corpus import KekCorpus, normalize_query
+from app.airtable.search import TrigramIndex
+
+
+def search(records: list[dict], query: str) -> list[str]:
+    corpus = KekCorpus(records)
+    indices = corpus.text_index().rank(normalize_query(query))
+    return [corpus[i].id for i in indices]
+
+
+def test_finds_matching_keks():
+    keks = [
+        {"id": "1", "fields": {"Text": "Hello world"}},
+        {"id": "2", "fields": {"Text": "Goodbye world"}},
+        {"id": "3", "fields": {"Text": "Something else"}},
+    ]
+
+    assert search(keks, "world") == ["1", "2"]
+
+
+def test_case_insensitive():
+    keks = [
+        {"id": "1", "fields": {"Text": "HELLO World"}},
+        {"id": "2", "fields": {"Text": "hello world"}},
+    ]
+
+    assert search(keks, "HELLO") == ["1", "2"]
+
+
+def test_no_matches():
+    keks = [{"id": "1", "fields": {"Text": "Hello world"}}]
+
+    assert search(keks, "xyz") == []
+    assert search(keks, "hello word") == []
+
+
+def test_empty_keks():
+    assert search([], "query") == []
+
+
+def test_keeps_best_ranked_keks_only():
+    keks = [{"id": str(i), "fields": {"Text": f"kek {i}"}} for i in range(20)]
+
+    # The corpus imports the index like the app does
+    with patch("airtable.search.TrigramIndex.max_ranked", 5):
+        assert search(keks, "kek") == ["0", "1", "2", "3", "4"]
+
+
+def test_short_queries_are_scanned():
+    keks = [
+        {"id": "1", "fields": {"Text": "Матан"}},
+        {"id": "2", "fields": {"Text": "Алгебра"}},
+    ]
+
+    assert search(keks, "а") == ["2", "1"]
+    assert search(keks, "ма") == ["1"]
+
+
+def test_searches_only_text_keks():
+    keks = [
+        {"id": "1", "fields": {"Text": "Photo kek", "AttachmentType": "photo"}},
+        {"id": "2", "fields": {"Text": "Text kek"}},
+    ]
+
+    assert search(keks, "kek") == ["2"]
+
+
+def test_same_results_as_substring_scan():
+    rng = random.Random(42)
+    alphabet = "абв ab"
+    texts = ["".join(rng.choices(alphabet, k=rng.randint(0, 12))) for _ in range(300)]
+    index = TrigramIndex(texts, range(len(texts)))
+
+    for _ in range(300):
+        query = "".join(rng.choices(alphabet, k=rng.randint(1, 5)))
+        expected = [i for i, text in enumerate(texts) if query in text]
+        assert sorted(index.rank(query)) == expected
+
+
+@pytest.mark.parametrize(
+    ("text", "query"),
+    [
+        ("Ёжик в тумане", "ежик"),
+        ("Ежик в тумане", "ЁЖИК"),
+        ("<b>Матан</b> — это   боль", "матан это боль"),
+        ("Ну, что ж...", "ну что ж"),
+    ],
+)
+def test_matches_normalized_texts(text, query):
+    assert search([{"id": "1", "fields": {"Text": text}}], query) == ["1"]
+
+
+def test_keeps_comparisons_of_plain_queries():
+    keks = [{"id": "1", "fields": {"Text": "x &lt; y и y &gt; z"}}]
+
+    assert search(keks, "x < y и y > z") == ["1"]
+
+
+def test_stems_queries_once():
+    corpus = KekCorpus([{"id": "1", "fields": {"Text": "Теория знания"}}])
+
+    with patch("app.airtable.corpus.config.kek_search_stemming", True):
+        normalize_query.cache_clear()
+        corpus.text_index().rank(normalize_query("знания"))
+    normalize_query.cache_clear()
+
+    assert list(corpus.search_index.ranked) == ["знани"]
+
+
+def test_matches_stems_when_enabled():
+    keks = [{"id": "1", "fields": {"Text": "Задачи по математике"}}]
+
+    assert search(keks, "задача по математика") == []
+    with patch("app.airtable.corpus.config.kek_search_stemming", True):
+        normalize_query.cache_clear()
+        assert search(keks, "задача по математика") == ["1"]
+    normalize_query.cache_clear()
+
+
+def test_ranks_whole_words_short_texts_and_repeats_first():
+    texts = [
+        "полиматан",
+        "матан и алгебра и геометрия и анализ",
+        "матан матан",
+        "матан",
+    ]
+    index = TrigramIndex(texts, range(len(texts)))
+
+    assert list(index.rank("матан")) == [2, 3, 1, 0]
+
+
+def test_caches_ranked_queries():
+    index = TrigramIndex(["кек", "кек кек"], range(2))
+
+    ranked = index.rank("кек")
+
+    assert index.rank("кек") is ranked
+    with patch.object(TrigramIndex, "max_queries", 1):
+        index.rank("ке")
+    assert list(index.ranked) == ["ке"]
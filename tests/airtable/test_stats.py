@@ -0,0 +1,87 @@
+from app.airtable.stats import KekStats, UserScore
+
+
+def make_kek(record_id: str, attachment_type: str | None = None) -> dict:
+    return {"id": record_id, "fields": {"AttachmentType": attachment_type}}
+
+
+def make_user(record_id: str, name: str, authored: int, suggested: int = 0) -> dict:
+    return {
+        "id": record_id,
+        "fields": {
+            "Name": name,
+            "TelegramID": int(record_id[3:]),
+            "Author": [f"rec{i}" for i in range(authored)],
+            "Suggestor": [f"rec{i}" for i in range(suggested)],
+        },
+    }
+
+
+def test_counts_attachment_types_incrementally():
+    stats = KekStats()
+    stats.apply_keks([make_kek("rec1"), make_kek("rec2", "photo")], replace=True)
+
+    stats.apply_keks([make_kek("rec1", "photo"), make_kek("rec3", "video")])
+    stats.apply_keks([], deleted_ids=["rec3"])
+
+    assert stats.total == 2
+    assert stats.attachment_types == {"photo": 2}
+
+
+def test_replace_starts_over():
+    stats = KekStats()
+    stats.apply_keks([make_kek("rec1"), make_kek("rec2")])
+
+    stats.apply_keks([make_kek("rec3", "photo")], replace=True)
+
+    assert stats.total == 1
+    assert stats.attachment_types == {"photo": 1}
+
+
+def test_leaderboards_follow_user_updates():
+    stats = KekStats()
+    stats.apply_users(
+        [make_user("usr1", "One", 3), make_user("usr2", "Two", 1, suggested=5)]
+    )
+
+    stats.apply_users([make_user("usr2", "Two", 4, suggested=5)])
+
+    assert stats.top_authors(1) == [UserScore("Two", 2, 4)]
+    assert stats.top_suggestors(5) == [UserScore("Two", 2, 5)]
+
+
+def test_deleted_user_leaves_leaderboards():
+    stats = KekStats()
+    stats.apply_users([make_user("usr1", "One", 3)])
+
+    stats.apply_users([], deleted_ids=["usr1"])
+
+    assert stats.top_authors(5) == []
+
+
+def test_version_changes_with_every_update():
+    stats = KekStats()
+    versions = {stats.version}
+
+    stats.apply_keks([make_kek("rec1")])
+    versions.add(stats.version)
+    stats.apply_users([make_user("usr1", "One", 1)])
+    versions.add(stats.version)
+
+    assert len(versions) == 3
+
+
+def test_version_stays_for_unchanged_records():
+    stats = KekStats()
+    stats.apply_keks([make_kek("rec1", "photo")], replace=True)
+    stats.apply_users([make_user("usr1", "One", 1)], replace=True)
+    version = stats.version
+
+    # Overlapping deltas bring back the same records, full syncs the same tables
+    stats.apply_keks([make_kek("rec1", "photo")])
+    stats.apply_keks([make_kek("rec1", "photo")], replace=True)
+    stats.apply_keks([], deleted_ids=["rec2"])
+    stats.apply_users([make_user("usr1", "One", 1)])
+    stats.apply_users([])
+
+    assert stats.version == version
@@ -0,0 +1,173 @@
+import asyncio
+import base64
+import hashlib
+import hmac
+import json
+
+import pytest
+
+from aiohttp import web
+from aiohttp.test_utils import TestClient, TestServer
+
+from app.airtable.backends import MemoryBackend
+from app.airtable.client import AirtableClient
+from app.airtable.webhook import AirtableWebhook
+
+SECRET = base64.b64encode(b"secret").decode()
+
+
+def sign(body: bytes) -> str:
+    return "hmac-sha256=" + hmac.new(b"secret", body, hashlib.sha256).hexdigest()
+
+
+class FakeAirtable:
+    """
+    Serves payloads of a single webhook, in pages of one payload
+    """
+
+    def __init__(self, payloads: list[dict]):
+        self.payloads = payloads
+        self.cursors: list[int] = []
+        self.refreshed = 0
+
+        self.app = web.Application()
+        prefix = "/v0/bases/base/webhooks/ach1"
+        self.app.router.add_get(f"{prefix}/payloads", self.list_payloads)
+        self.app.router.add_post(f"{prefix}/refresh", self.refresh)
+
+    async def list_payloads(self, request: web.Request) -> web.Response:
+        cursor = int(request.query["cursor"])
+        self.cursors.append(cursor)
+        return web.json_response(
+            {
+                "payloads": self.payloads[cursor - 1 : cursor],
+                "cursor": min(cursor + 1, len(self.payloads) + 1),
+                "mightHaveMore": cursor < len(self.payloads),
+            }
+        )
+
+    async def refresh(self, request: web.Request) -> web.Response:
+        self.refreshed += 1
+        return web.json_response({"expirationTime": None})
+
+
+def make_payload(created=(), changed=(), destroyed=()) -> dict:
+    return {
+        "changedTablesById": {
+            "tblList": {
+                "createdRecordsById": {rid: {} for rid in created},
+                "changedRecordsById": {rid: {} for rid in changed},
+                "destroyedRecordIds": list(destroyed),
+            }
+        }
+    }
+
+
+@pytest.fixture
+async def airtable():
+    fake = FakeAirtable(
+        [
+            make_payload(created=["rec1"]),
+            make_payload(changed=["rec2"], destroyed=["rec3"]),
+        ]
+    )
+    async with TestServer(fake.app) as server:
+        fake.url = str(server.make_url("/v0"))
+        yield fake
+
+
+@pytest.fixture
+async def webhook(airtable):
+    client = AirtableClient("token")
+    client.api_url = airtable.url
+    changes = []
+
+    async def on_change(record_ids: set[str], deleted_ids: set[str]):
+        changes.append((record_ids, deleted_ids))
+
+    webhook = AirtableWebhook(
+        client, "base", "ach1", SECRET, MemoryBackend(), on_change
+    )
+    webhook.changes_seen = changes
+    yield webhook
+    await webhook.stop()
+    await client.close()
+
+
+@pytest.fixture
+async def http(webhook):
+    async with TestClient(TestServer(webhook.app)) as http:
+        yield http
+
+
+async def ping(http: TestClient, body: bytes, mac: str | None = None):
+    return await http.post(
+        AirtableWebhook.path,
+        data=body,
+        headers={"X-Airtable-Content-MAC": mac or sign(body)},
+    )
+
+
+async def test_ping_applies_changes_from_all_payloads(airtable, webhook, http):
+    response = await ping(http, json.dumps({"webhook": {"id": "ach1"}}).encode())
+    await webhook.consumer
+
+    assert response.status == 204
+    assert webhook.changes_seen == [({"rec1"}, set()), ({"rec2"}, {"rec3"})]
+    assert await webhook.backend.cursor("ach1") == 3
+
+
+async def test_rejects_unsigned_ping(webhook, http):
+    response = await ping(http, b"{}", mac="hmac-sha256=0")
+
+    assert response.status == 401
+    assert webhook.consumer is None
+
+
+async def test_continues_from_persisted_cursor(airtable, webhook, http):
+    await webhook.backend.set_cursor("ach1", 2)
+
+    await ping(http, b"{}")
+    await webhook.consumer
+
+    assert airtable.cursors == [2]
+    assert webhook.changes_seen == [({"rec2"}, {"rec3"})]
+
+
+async def test_pings_during_read_are_coalesced(airtable, webhook, http):
+    await asyncio.gather(*(ping(http, b"{}") for _ in range(3)))
+    await webhook.consumer
+
+    assert len(webhook.changes_seen) == 2
+
+
+async def test_failed_changes_are_read_again(airtable, webhook, http):
+    async def fail(record_ids, deleted_ids):
+        raise TimeoutError()
+
+    on_change, webhook.on_change = webhook.on_change, fail
+    await ping(http, b"{}")
+    await webhook.consumer
+
+    webhook.on_change = on_change
+    await ping(http, b"{}")
+    await webhook.consumer
+
+    assert webhook.changes_seen == [({"rec1"}, set()), ({"rec2"}, {"rec3"})]
+
+
+def test_created_then_deleted_record_is_only_deleted():
+    changed, deleted = AirtableWebhook.changes(
+        [make_payload(created=["rec1"]), make_payload(destroyed=["rec1"])]
+    )
+
+    assert changed == set()
+    assert deleted == {"rec1"}
+
+
+async def test_refreshes_webhook(airtable, webhook):
+    webhook.port = 0
+    await webhook.start()
+    await asyncio.sleep(0.05)
+
+    assert airtable.refreshed == 1
@@ -0,0 +1,113 @@
+import asyncio
+
+from unittest.mock import AsyncMock
+
+import pytest
+
+from airtable.client import AirtableError
+
+from app.airtable.write_behind import WriteBehind
+
+
+@pytest.fixture
+def flush():
+    return AsyncMock()
+
+
+async def test_flushes_after_interval(flush):
+    queue = WriteBehind(flush, interval=0.01)
+
+    queue.put("rec1", {"AttachmentFileID": "a"})
+    flush.assert_not_awaited()
+
+    await asyncio.sleep(0.05)
+
+    flush.assert_awaited_once_with(
+        [{"id": "rec1", "fields": {"AttachmentFileID": "a"}}]
+    )
+
+
+async def test_dedupes_updates_per_record(flush):
+    queue = WriteBehind(flush, interval=60)
+
+    queue.put("rec1", {"AttachmentFileID": "a"})
+    queue.put("rec1", {"AttachmentFileID": "b"})
+    await queue.close()
+
+    flush.assert_awaited_once_with(
+        [{"id": "rec1", "fields": {"AttachmentFileID": "b"}}]
+    )
+
+
+async def test_flushes_full_batch_right_away(flush):
+    queue = WriteBehind(flush, interval=60)
+
+    for i in range(WriteBehind.batch_size):
+        queue.put(f"rec{i}", {"AttachmentFileID": str(i)})
+    await asyncio.sleep(0)
+
+    flush.assert_awaited_once()
+    assert len(flush.call_args.args[0]) == WriteBehind.batch_size
+    await queue.close()
+
+
+async def test_flushes_in_chunks_of_batch_size(flush):
+    queue = WriteBehind(flush, interval=60)
+    queue.pending = {f"rec{i}": {"AttachmentFileID": str(i)} for i in range(25)}
+
+    await queue.flush()
+
+    assert [len(call.args[0]) for call in flush.await_args_list] == [10, 10, 5]
+
+
+async def test_requeues_failed_batch_without_overwriting_newer(flush):
+    queue = WriteBehind(flush, interval=60)
+    queue.put("rec1", {"AttachmentFileID": "old"})
+    queue.put("rec2", {"AttachmentFileID": "x"})
+
+    async def fail(records):
+        queue.put("rec1", {"AttachmentFileID": "new"})
+        raise TimeoutError()
+
+    flush.side_effect = fail
+    await queue.flush()
+
+    assert queue.pending == {
+        "rec1": {"AttachmentFileID": "new"},
+        "rec2": {"AttachmentFileID": "x"},
+    }
+    assert queue.timer is not None
+    queue.timer.cancel()
+
+
+async def test_drops_only_rejected_record(flush):
+    queue = WriteBehind(flush, interval=60)
+    for rid in ("rec1", "deleted", "rec3"):
+        queue.put(rid, {"AttachmentFileID": rid})
+
+    async def reject(records):
+        if any(record["id"] == "deleted" for record in records):
+            raise AirtableError(404, "NOT_FOUND")
+
+    flush.side_effect = reject
+    await queue.flush()
+
+    flushed = [call.args[0] for call in flush.await_args_list]
+    assert [r["id"] for records in flushed[1:] for r in records] == [
+        "rec1",
+        "deleted",
+        "rec3",
+    ]
+    assert queue.pending == {}
+    assert queue.dropped == 1
+    queue.timer.cancel()
+
+
+async def test_close_flushes_pending(flush):
+    queue = WriteBehind(flush, interval=60)
+    queue.put("rec1", {"AttachmentFileID": "a"})
+
+    await queue.close()
+
+    flush.assert_awaited_once()
+    assert queue.pending == {}
@@ -0,0 +1,258 @@
+import asyncio
+
+from unittest.mock import patch
+
+import pytest
+
+from app.common.cache import SingleFlight, TTLCache, stale_while_revalidate
+
+
+class Source:
+    def __init__(self):
+        self.calls = 0
+        self.fail = False
+        self.delay = 0.0
+
+    @stale_while_revalidate(ttl=10, max_staleness=100)
+    async def read(self):
+        self.calls += 1
+        await asyncio.sleep(self.delay)
+        if self.fail:
+            raise TimeoutError()
+        return self.calls
+
+
+@pytest.fixture
+def clock():
+    with patch("app.common.cache.monotonic", return_value=1000.0) as clock:
+        yield clock
+
+
+async def test_caches_fresh_value(clock):
+    source = Source()
+
+    assert await source.read() == 1
+    clock.return_value += 5
+    assert await source.read() == 1
+    assert source.calls == 1
+
+
+async def test_serves_stale_value_while_refreshing(clock):
+    source = Source()
+    await source.read()
+    source.delay = 0.01
+
+    clock.return_value += 20
+    assert await source.read() == 1
+    assert await source.read() == 1
+
+    await asyncio.sleep(0.05)
+
+    assert source.calls == 2
+    assert await source.read() == 2
+
+
+async def test_keeps_stale_value_on_refresh_error(clock):
+    source = Source()
+    await source.read()
+    source.fail = True
+
+    clock.return_value += 20
+    assert await source.read() == 1
+    await asyncio.sleep(0)
+
+    assert await source.read() == 1
+
+
+async def test_waits_for_refresh_after_max_staleness(clock):
+    source = Source()
+    await source.read()
+
+    clock.return_value += 200
+
+    assert await source.read() == 2
+
+
+async def test_raises_after_max_staleness_on_error(clock):
+    source = Source()
+    await source.read()
+    source.fail = True
+
+    clock.return_value += 200
+
+    with pytest.raises(TimeoutError):
+        await source.read()
+
+
+async def test_instances_have_separate_caches(clock):
+    first, second = Source(), Source()
+    second.calls = 41
+
+    assert await first.read() == 1
+    assert await second.read() == 42
+
+
+async def test_serves_seeded_value(clock):
+    source = Source()
+    Source.read.seed(source, "snapshot", age=20)
+
+    assert await source.read() == "snapshot"
+    await asyncio.sleep(0.01)
+
+    assert source.calls == 1
+    assert await source.read() == 1
+
+
+async def test_does_not_serve_seeded_value_after_max_staleness(clock):
+    source = Source()
+    Source.read.seed(source, "snapshot", age=200)
+
+    assert await source.read() == 1
+
+
+async def test_revalidates_in_background(clock):
+    source = Source()
+    Source.read.seed(source, "snapshot")
+
+    await Source.read.revalidate(source)
+
+    assert await source.read() == 1
+
+
+async def test_prefetches_missing_and_expired_values_only(clock):
+    source = Source()
+
+    await Source.read.prefetch(source)
+    assert Source.read.prefetch(source) is None
+    clock.return_value += 20
+    await Source.read.prefetch(source)
+
+    assert source.calls == 2
+    assert await source.read() == 2
+
+
+def test_rejects_max_staleness_less_than_ttl():
+    with pytest.raises(ValueError):
+        stale_while_revalidate(ttl=10, max_staleness=5)
+
+
+async def test_concurrent_cold_reads_are_coalesced(clock):
+    source = Source()
+    source.delay = 0.01
+    coalesced = Source.read.flight.coalesced
+
+    results = await asyncio.gather(*(source.read() for _ in range(5)))
+
+    assert results == [1] * 5
+    assert source.calls == 1
+    assert Source.read.flight.coalesced - coalesced == 4
+
+
+class TestSingleFlight:
+    async def test_shares_in_flight_call(self):
+        flight = SingleFlight()
+        calls = []
+
+        async def fetch(x):
+            calls.append(x)
+            await asyncio.sleep(0.01)
+            return x * 2
+
+        results = await asyncio.gather(
+            *(flight.run("key", fetch, 21) for _ in range(3))
+        )
+
+        assert results == [42, 42, 42]
+        assert calls == [21]
+        assert flight.coalesced == 2
+        assert flight.in_flight == {}
+
+    async def test_different_keys_are_not_coalesced(self):
+        flight = SingleFlight()
+
+        async def fetch(x):
+            await asyncio.sleep(0)
+            return x
+
+        results = await asyncio.gather(flight.run(1, fetch, 1), flight.run(2, fetch, 2))
+
+        assert results == [1, 2]
+        assert flight.coalesced == 0
+
+    async def test_error_is_shared(self):
+        flight = SingleFlight()
+
+        async def fetch():
+            await asyncio.sleep(0)
+            raise TimeoutError()
+
+        results = await asyncio.gather(
+            flight.run("key", fetch), flight.run("key", fetch), return_exceptions=True
+        )
+
+        assert all(isinstance(r, TimeoutError) for r in results)
+
+    async def test_cancelled_caller_does_not_cancel_others(self):
+        flight = SingleFlight()
+
+        async def fetch():
+            await asyncio.sleep(0.01)
+            return "ok"
+
+        first = asyncio.create_task(flight.run("key", fetch))
+        second = asyncio.create_task(flight.run("key", fetch))
+        await asyncio.sleep(0)
+        first.cancel()
+
+        assert await second == "ok"
+
+
+class TestTTLCache:
+    @staticmethod
+    async def load(value):
+        await asyncio.sleep(0.01)
+        return value
+
+    async def test_serves_value_until_ttl(self, clock):
+        cache = TTLCache(ttl=10)
+
+        assert await cache.get_or_load("a", self.load, 1) == 1
+        assert await cache.get_or_load("a", self.load, 2) == 1
+        clock.return_value += 11
+        assert await cache.get_or_load("a", self.load, 3) == 3
+
+        stats = cache.stats()
+        assert (stats["hits"], stats["misses"]) == (1, 2)
+        assert stats["hit_rate"] == pytest.approx(1 / 3)
+
+    async def test_coalesces_concurrent_misses(self, clock):
+        cache = TTLCache(ttl=10)
+
+        values = await asyncio.gather(
+            *(cache.get_or_load("a", self.load, 1) for _ in range(3))
+        )
+
+        assert values == [1, 1, 1]
+        assert cache.flight.coalesced == 2
+
+    async def test_evicts_least_recently_used(self, clock):
+        cache = TTLCache(ttl=10, max_size=2)
+        cache.set("a", 1)
+        cache.set("b", 2)
+        cache.get("a")
+
+        cache.set("c", 3)
+
+        assert cache.get("b") is None
+        assert (cache.get("a"), cache.get("c")) == (1, 3)
+
+    async def test_does_not_cache_errors(self, clock):
+        cache = TTLCache(ttl=10)
+
+        async def fail():
+            raise TimeoutError()
+
+        with pytest.raises(TimeoutError):
+            await cache.get_or_load("a", fail)
+
+        assert len(cache) == 0
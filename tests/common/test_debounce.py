@@ -0,0 +1,77 @@
+import asyncio
+
+import pytest
+
+from app.common.debounce import LatestWins
+
+
+class Search:
+    def __init__(self, delay: float = 0.0):
+        self.searches = LatestWins(delay=delay)
+        self.started: list[str] = []
+        self.release = asyncio.Event()
+        self.release.set()
+
+        @self.searches(key=lambda user, query: user)
+        async def search(user: int, query: str) -> str:
+            self.started.append(query)
+            await self.release.wait()
+            return query
+
+        self.search = search
+
+
+async def test_answers_single_query():
+    search = Search()
+
+    assert await search.search(1, "kek") == "kek"
+    assert search.searches.stats() == {"running": 0, "answered": 1, "skipped": 0}
+
+
+async def test_skips_queries_typed_over_during_delay():
+    search = Search(delay=0.01)
+
+    results = await asyncio.gather(
+        search.search(1, "k"), search.search(1, "ke"), search.search(1, "kek")
+    )
+
+    assert results == [None, None, "kek"]
+    assert search.started == ["kek"]
+    assert search.searches.stats() == {"running": 0, "answered": 1, "skipped": 2}
+
+
+async def test_cancels_running_query():
+    search = Search()
+    search.release.clear()
+
+    first = asyncio.create_task(search.search(1, "ke"))
+    await asyncio.sleep(0.001)
+    assert search.started == ["ke"]
+
+    second = asyncio.create_task(search.search(1, "kek"))
+    await asyncio.sleep(0.001)
+    search.release.set()
+
+    assert await first is None
+    assert await second == "kek"
+
+
+async def test_users_do_not_supersede_each_other():
+    search = Search(delay=0.01)
+
+    results = await asyncio.gather(search.search(1, "a"), search.search(2, "b"))
+
+    assert results == ["a", "b"]
+
+
+async def test_cancelling_caller_is_not_swallowed():
+    search = Search()
+    search.release.clear()
+
+    task = asyncio.create_task(search.search(1, "kek"))
+    await asyncio.sleep(0.001)
+    task.cancel()
+
+    with pytest.raises(asyncio.CancelledError):
+        await task
+    assert search.searches.running == {}
@@ -0,0 +1,25 @@
+import asyncio
+
+from app.common.metrics import Metrics
+
+
+def test_formats_registered_stats():
+    metrics = Metrics(interval=0)
+    metrics.register("pages", lambda: {"hits": 3, "hit_rate": 0.75})
+    metrics.register("outbox", lambda: {"depth": 0})
+
+    assert metrics.format() == "pages: hits=3, hit_rate=0.750 | outbox: depth=0"
+
+
+async def test_logs_periodically():
+    metrics = Metrics(interval=0.01)
+    calls = []
+    metrics.register("pages", lambda: calls.append(1) or {"hits": len(calls)})
+
+    await metrics.start()
+    await asyncio.sleep(0.035)
+    await metrics.stop()
+
+    # Each log line and the last one on shutdown read the stats
+    assert len(calls) >= 3
+    assert metrics.worker is None
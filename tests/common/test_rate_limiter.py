@@ -0,0 +1,72 @@
+import asyncio
+
+from time import monotonic
+
+import pytest
+
+from app.common.rate_limiter import Priority, RateLimiter
+
+
+async def test_allows_burst_up_to_capacity():
+    limiter = RateLimiter(rate=5)
+    started_at = monotonic()
+
+    for _ in range(5):
+        await limiter.acquire()
+
+    assert monotonic() - started_at < 0.05
+    assert limiter.max_wait < 0.05
+
+
+async def test_throttles_over_rate():
+    limiter = RateLimiter(rate=50, capacity=1)
+    started_at = monotonic()
+
+    await asyncio.gather(*(limiter.acquire() for _ in range(6)))
+
+    assert monotonic() - started_at >= 0.09
+    assert limiter.stats()["acquired"] == 6
+    assert limiter.max_wait >= 0.09
+
+
+async def test_higher_priority_goes_first():
+    limiter = RateLimiter(rate=100, capacity=1)
+    await limiter.acquire()
+    order = []
+
+    async def acquire(name: str, priority: Priority):
+        await limiter.acquire(priority)
+        order.append(name)
+
+    await asyncio.gather(
+        acquire("write", Priority.LOW),
+        acquire("update", Priority.NORMAL),
+        acquire("read", Priority.HIGH),
+    )
+
+    assert order == ["read", "update", "write"]
+
+
+async def test_cancelled_waiter_does_not_take_token():
+    limiter = RateLimiter(rate=50, capacity=1)
+    await limiter.acquire()
+
+    cancelled = asyncio.create_task(limiter.acquire())
+    await asyncio.sleep(0)
+    cancelled.cancel()
+
+    await asyncio.wait_for(limiter.acquire(), timeout=0.1)
+
+    with pytest.raises(asyncio.CancelledError):
+        await cancelled
+
+
+async def test_reports_wait_per_priority():
+    limiter = RateLimiter(rate=100, capacity=1)
+
+    await limiter.acquire(Priority.HIGH)
+    await limiter.acquire(Priority.LOW)
+
+    stats = limiter.stats()
+    assert stats["acquired"] == 2
+    assert stats["avg_wait_high"] < stats["avg_wait_low"]
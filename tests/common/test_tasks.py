@@ -0,0 +1,43 @@
+import asyncio
+
+from app.common.tasks import BackgroundTasks
+
+
+async def test_runs_at_most_limit_tasks():
+    tasks = BackgroundTasks(limit=2)
+    running, peak = 0, 0
+
+    async def work():
+        nonlocal running, peak
+        running += 1
+        peak = max(peak, running)
+        await asyncio.sleep(0.01)
+        running -= 1
+
+    for _ in range(5):
+        tasks.spawn(work())
+    await tasks.drain()
+
+    assert peak == 2
+    assert tasks.tasks == set()
+
+
+async def test_drain_cancels_hanging_tasks():
+    tasks = BackgroundTasks(limit=2)
+    task = tasks.spawn(asyncio.sleep(10))
+
+    await tasks.drain(timeout=0.01)
+
+    assert task.cancelled()
+
+
+async def test_failed_task_is_forgotten():
+    tasks = BackgroundTasks(limit=2)
+
+    async def fail():
+        raise TimeoutError()
+
+    task = tasks.spawn(fail())
+    await asyncio.wait([task])
+
+    assert tasks.tasks == set()
@@ -0,0 +1,31 @@
+import pytest
+
+from app.common.text import normalize
+
+
+@pytest.mark.parametrize(
+    ("text", "expected"),
+    [
+        ("Ёжик в ТУМАНЕ", "ежик в тумане"),
+        ("Кек &amp; лол", "кек лол"),
+        ("Ну,  что\n\nж... — пора!", "ну что ж пора"),
+        ("  ", ""),
+        ("Straße", "strasse"),
+    ],
+)
+def test_normalize(text, expected):
+    assert normalize(text) == expected
+
+
+def test_cuts_tags_of_markup_only():
+    assert normalize("<b>Кек</b> &amp; <i>лол</i>", markup=True) == "кек лол"
+    assert normalize("x < y и y > z") == "x y и y z"
+
+
+def test_stems_russian_words():
+    assert normalize("Задачи по математике", stem=True) == "задач по математик"
+    assert normalize("Матан матана", stem=True) == "матан матан"
+
+
+def test_keeps_short_words_whole():
+    assert normalize("они шли", stem=True) == "они шли"
@@ -23,6 +23,7 @@ from app.common.tg import (
     decompose_update,
     extract_attachment_file_id,
     extract_attachment_info,
+    extract_attachment_unique_id,
     message_info,
     reply_with_attachment,
     user_info,
@@ -323,6 +324,20 @@ class TestExtractAttachmentFileId:
         assert file_id is None
 
 
+class TestExtractAttachmentUniqueId:
+    def test_returns_unique_id_of_largest_photo(self):
+        msg = make_message()
+        small, large = MagicMock(spec=PhotoSize), MagicMock(spec=PhotoSize)
+        small.file_unique_id = "small"
+        large.file_unique_id = "large"
+        msg.photo = [small, large]
+
+        assert extract_attachment_unique_id(msg) == "large"
+
+    def test_returns_none_when_no_attachment(self):
+        assert extract_attachment_unique_id(make_message()) is None
+
+
 # =============================================================================
 # create_sensitive_url_from_file_id tests
 # =============================================================================
@@ -345,6 +360,20 @@ class TestCreateSensitiveUrlFromFileId:
         assert "api.telegram.org" in result
         assert "file_1.jpg" in result
 
+    @pytest.mark.asyncio
+    async def test_reuses_file_path_of_same_file(self):
+        bot = make_bot()
+        file_mock = MagicMock()
+        file_mock.file_path = "photos/file_1.jpg"
+        bot.get_file = AsyncMock(return_value=file_mock)
+
+        await create_sensitive_url_from_file_id(bot, "file_id_1", "unique_1")
+        await create_sensitive_url_from_file_id(bot, "file_id_2", "unique_1")
+        await create_sensitive_url_from_file_id(bot, "file_id_3", "unique_2")
+
+        assert bot.get_file.await_count == 2
+        bot.session.api.file_url.assert_called_with("42:ABC", "photos/file_1.jpg")
+
 
 # =============================================================================
 # reply_with_attachment tests
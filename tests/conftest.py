@@ -11,6 +11,7 @@ from unittest.mock import AsyncMock, MagicMock, patch
 import pytest
 
 from aiogram.types import Chat, Message, PhotoSize, Update, User
+from airtable.corpus import KekCorpus
 
 # =============================================================================
 # User Fixtures
@@ -314,11 +315,11 @@ def mock_kek_storage():
         },
     ]
 
-    storage.async_all = AsyncMock(return_value=sample_keks)
+    storage.async_corpus = AsyncMock(return_value=KekCorpus(sample_keks))
     storage.async_all_users = AsyncMock(return_value=sample_users)
     storage.async_add = AsyncMock(return_value={"id": "new_rec", "fields": {}})
     storage.async_push = AsyncMock(return_value={"id": "pushed_rec", "fields": {}})
-    storage.async_update_file_id = AsyncMock()
+    storage.queue_file_id_update = MagicMock()
 
     return storage
 
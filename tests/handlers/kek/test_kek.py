@@ -4,6 +4,8 @@ from unittest.mock import AsyncMock, MagicMock, patch
 
 import pytest
 
+from airtable.corpus import KekCorpus
+
 from tests.conftest import make_message
 
 
@@ -11,20 +13,22 @@ class TestCmdKek:
     @pytest.fixture
     def mock_storage(self):
         storage = MagicMock()
-        storage.async_all = AsyncMock(
-            return_value=[
-                {
-                    "id": "rec123",
-                    "fields": {
-                        "Text": "Test kek text",
-                        "AttachmentType": None,
-                        "AttachmentFileID": None,
-                        "Attachment": None,
-                    },
-                }
-            ]
+        storage.async_corpus = AsyncMock(
+            return_value=KekCorpus(
+                [
+                    {
+                        "id": "rec123",
+                        "fields": {
+                            "Text": "Test kek text",
+                            "AttachmentType": None,
+                            "AttachmentFileID": None,
+                            "Attachment": None,
+                        },
+                    }
+                ]
+            )
         )
-        storage.async_update_file_id = AsyncMock()
+        storage.queue_file_id_update = MagicMock()
         return storage
 
     @pytest.mark.asyncio
@@ -36,23 +40,25 @@ class TestCmdKek:
 
             await cmd_kek(msg)
 
-        mock_storage.async_all.assert_awaited_once()
+        mock_storage.async_corpus.assert_awaited_once()
         msg.reply.assert_awaited_once()
 
     @pytest.mark.asyncio
     async def test_text_only_kek(self, mock_storage):
-        mock_storage.async_all = AsyncMock(
-            return_value=[
-                {
-                    "id": "rec1",
-                    "fields": {
-                        "Text": "Pure text kek",
-                        "AttachmentType": None,
-                        "AttachmentFileID": None,
-                        "Attachment": None,
-                    },
-                }
-            ]
+        mock_storage.async_corpus = AsyncMock(
+            return_value=KekCorpus(
+                [
+                    {
+                        "id": "rec1",
+                        "fields": {
+                            "Text": "Pure text kek",
+                            "AttachmentType": None,
+                            "AttachmentFileID": None,
+                            "Attachment": None,
+                        },
+                    }
+                ]
+            )
         )
         msg = make_message()
 
@@ -67,18 +73,20 @@ class TestCmdKek:
 
     @pytest.mark.asyncio
     async def test_kek_with_photo(self, mock_storage):
-        mock_storage.async_all = AsyncMock(
-            return_value=[
-                {
-                    "id": "rec2",
-                    "fields": {
-                        "Text": "Photo caption",
-                        "AttachmentType": "photo",
-                        "AttachmentFileID": "photo_id_123",
-                        "Attachment": [{"url": "https://example.com/photo.jpg"}],
-                    },
-                }
-            ]
+        mock_storage.async_corpus = AsyncMock(
+            return_value=KekCorpus(
+                [
+                    {
+                        "id": "rec2",
+                        "fields": {
+                            "Text": "Photo caption",
+                            "AttachmentType": "photo",
+                            "AttachmentFileID": "photo_id_123",
+                            "Attachment": [{"url": "https://example.com/photo.jpg"}],
+                        },
+                    }
+                ]
+            )
         )
         msg = make_message()
 
@@ -93,18 +101,20 @@ class TestCmdKek:
 
     @pytest.mark.asyncio
     async def test_updates_file_id_in_prod(self, mock_storage):
-        mock_storage.async_all = AsyncMock(
-            return_value=[
-                {
-                    "id": "rec3",
-                    "fields": {
-                        "Text": "Photo kek",
-                        "AttachmentType": "photo",
-                        "AttachmentFileID": "old_photo_id",
-                        "Attachment": [{"url": "https://example.com/photo.jpg"}],
-                    },
-                }
-            ]
+        mock_storage.async_corpus = AsyncMock(
+            return_value=KekCorpus(
+                [
+                    {
+                        "id": "rec3",
+                        "fields": {
+                            "Text": "Photo kek",
+                            "AttachmentType": "photo",
+                            "AttachmentFileID": "old_photo_id",
+                            "Attachment": [{"url": "https://example.com/photo.jpg"}],
+                        },
+                    }
+                ]
+            )
         )
 
         # Make reply return message with different file_id
@@ -130,24 +140,26 @@ class TestCmdKek:
 
             await cmd_kek(msg)
 
-        mock_storage.async_update_file_id.assert_awaited_once_with(
+        mock_storage.queue_file_id_update.assert_called_once_with(
             "rec3", "new_photo_id"
         )
 
     @pytest.mark.asyncio
     async def test_no_file_id_update_in_dev(self, mock_storage):
-        mock_storage.async_all = AsyncMock(
-            return_value=[
-                {
-                    "id": "rec3",
-                    "fields": {
-                        "Text": "Photo kek",
-                        "AttachmentType": "photo",
-                        "AttachmentFileID": "old_photo_id",
-                        "Attachment": [{"url": "https://example.com/photo.jpg"}],
-                    },
-                }
-            ]
+        mock_storage.async_corpus = AsyncMock(
+            return_value=KekCorpus(
+                [
+                    {
+                        "id": "rec3",
+                        "fields": {
+                            "Text": "Photo kek",
+                            "AttachmentType": "photo",
+                            "AttachmentFileID": "old_photo_id",
+                            "Attachment": [{"url": "https://example.com/photo.jpg"}],
+                        },
+                    }
+                ]
+            )
         )
         msg = make_message()
 
@@ -161,4 +173,84 @@ class TestCmdKek:
 
             await cmd_kek(msg)
 
-        mock_storage.async_update_file_id.assert_not_awaited()
+        mock_storage.queue_file_id_update.assert_not_called()
+
+    @pytest.mark.asyncio
+    async def test_falls_back_to_attachment_url(self, mock_storage):
+        from aiogram.exceptions import TelegramBadRequest
+
+        mock_storage.async_corpus = AsyncMock(
+            return_value=KekCorpus(
+                [
+                    {
+                        "id": "rec4",
+                        "fields": {
+                            "Text": "Photo kek",
+                            "AttachmentType": "photo",
+                            "AttachmentFileID": "broken_photo_id",
+                        },
+                    }
+                ]
+            )
+        )
+        mock_storage.async_attachment_url = AsyncMock(
+            return_value="https://example.com/photo.jpg"
+        )
+        msg = make_message()
+        msg.reply_photo = AsyncMock(
+            side_effect=[TelegramBadRequest(MagicMock(), "wrong file id"), msg]
+        )
+
+        with patch("handlers.kek.kek.kek_storage", mock_storage):
+            from handlers.kek.kek import cmd_kek
+
+            await cmd_kek(msg)
+
+        mock_storage.async_attachment_url.assert_awaited_once_with("rec4")
+        assert msg.reply_photo.await_args.args == ("https://example.com/photo.jpg",)
+
+    @pytest.mark.asyncio
+    async def test_text_kek_errors_skip_attachment_lookup(self, mock_storage):
+        from aiogram.exceptions import TelegramBadRequest
+
+        mock_storage.async_attachment_url = AsyncMock()
+        msg = make_message()
+        msg.reply = AsyncMock(side_effect=TelegramBadRequest(MagicMock(), "too long"))
+
+        with patch("handlers.kek.kek.kek_storage", mock_storage):
+            from handlers.kek.kek import cmd_kek
+
+            with pytest.raises(TelegramBadRequest, match="too long"):
+                await cmd_kek(msg)
+
+        mock_storage.async_attachment_url.assert_not_awaited()
+
+    @pytest.mark.asyncio
+    async def test_failed_lookup_raises_original_error(self, mock_storage):
+        from aiogram.exceptions import TelegramBadRequest
+
+        mock_storage.async_corpus = AsyncMock(
+            return_value=KekCorpus(
+                [
+                    {
+                        "id": "rec4",
+                        "fields": {
+                            "Text": "Photo kek",
+                            "AttachmentType": "photo",
+                            "AttachmentFileID": "broken_photo_id",
+                        },
+                    }
+                ]
+            )
+        )
+        mock_storage.async_attachment_url = AsyncMock(side_effect=KeyError("rec4"))
+        msg = make_message()
+        msg.reply_photo = AsyncMock(
+            side_effect=TelegramBadRequest(MagicMock(), "wrong file id")
+        )
+
+        with patch("handlers.kek.kek.kek_storage", mock_storage):
+            from handlers.kek.kek import cmd_kek
+
+            with pytest.raises(TelegramBadRequest, match="wrong file id"):
+                await cmd_kek(msg)
@@ -1,9 +1,15 @@
 """Tests for app/handlers/kek/kek_add.py"""
 
+import asyncio
+
 from unittest.mock import AsyncMock, MagicMock, patch
 
 import pytest
 
+from airtable.corpus import KekCorpus
+from airtable.dedup import Duplicate
+from common.tasks import BackgroundTasks
+
 from tests.conftest import make_chat, make_message, make_user
 
 
@@ -11,9 +17,22 @@ class TestCmdKekAdd:
     @pytest.fixture
     def mock_storage(self):
         storage = MagicMock()
-        storage.async_add = AsyncMock(return_value={"id": "new_kek", "fields": {}})
+        storage.async_add = AsyncMock(side_effect=self.accepted)
+        storage.find_duplicate = MagicMock(return_value=None)
         return storage
 
+    @staticmethod
+    async def accepted(**kwargs):
+        future = asyncio.get_running_loop().create_future()
+        future.set_result(True)
+        return future
+
+    @pytest.fixture
+    def background_tasks(self):
+        tasks = BackgroundTasks(limit=2)
+        with patch("handlers.kek.kek_add.background_tasks", tasks):
+            yield tasks
+
     @pytest.fixture
     def author(self):
         return make_user(id=111, first_name="Author")
@@ -22,20 +41,22 @@ class TestCmdKekAdd:
     def suggestor(self):
         return make_user(id=222, first_name="Suggestor")
 
+    async def run(self, mock_storage, msg, reply_to, background_tasks):
+        with patch("handlers.kek.kek_add.kek_storage", mock_storage):
+            from handlers.kek.kek_add import cmd_kek_add
+
+            await cmd_kek_add(msg, reply_to)
+            await background_tasks.drain()
+
     @pytest.mark.asyncio
-    async def test_adds_kek_to_storage(self, mock_storage, author, suggestor):
+    async def test_adds_kek_to_storage(
+        self, mock_storage, author, suggestor, background_tasks
+    ):
         reply_to = make_message(from_user=author, text="Quoted text")
         reply_to.html_text = "Quoted text"
         msg = make_message(from_user=suggestor, reply_to_message=reply_to)
 
-        with patch("handlers.kek.kek_add.kek_storage", mock_storage):
-            with patch(
-                "handlers.kek.kek_add.extract_attachment_info_with_url",
-                new=AsyncMock(return_value=(None, None, None, None)),
-            ):
-                from handlers.kek.kek_add import cmd_kek_add
-
-                await cmd_kek_add(msg, reply_to)
+        await self.run(mock_storage, msg, reply_to, background_tasks)
 
         mock_storage.async_add.assert_awaited_once()
         call_kwargs = mock_storage.async_add.call_args.kwargs
@@ -44,24 +65,106 @@ class TestCmdKekAdd:
         assert call_kwargs["text"] == "Quoted text"
 
     @pytest.mark.asyncio
-    async def test_replies_with_confirmation(self, mock_storage, author, suggestor):
+    async def test_replies_pending_then_confirms(
+        self, mock_storage, author, suggestor, background_tasks
+    ):
         reply_to = make_message(from_user=author, text="Kek text")
         reply_to.html_text = "Kek text"
         msg = make_message(from_user=suggestor, reply_to_message=reply_to)
 
+        await self.run(mock_storage, msg, reply_to, background_tasks)
+
+        msg.reply.assert_awaited_once()
+        assert "⏳" in msg.reply.call_args.args[0]
+        edited_text = msg.edit_text.call_args.args[0]
+        assert "✅" in edited_text
+        assert "предложку" in edited_text
+
+    @pytest.mark.asyncio
+    async def test_replies_before_storage_is_done(
+        self, mock_storage, author, suggestor, background_tasks
+    ):
+        reply_to = make_message(from_user=author)
+        msg = make_message(from_user=suggestor, reply_to_message=reply_to)
+        release = asyncio.Event()
+
+        async def slow_add(**kwargs):
+            await release.wait()
+            return await self.accepted(**kwargs)
+
+        mock_storage.async_add.side_effect = slow_add
         with patch("handlers.kek.kek_add.kek_storage", mock_storage):
-            with patch(
-                "handlers.kek.kek_add.extract_attachment_info_with_url",
-                new=AsyncMock(return_value=(None, None, None, None)),
-            ):
-                from handlers.kek.kek_add import cmd_kek_add
+            from handlers.kek.kek_add import cmd_kek_add
 
-                await cmd_kek_add(msg, reply_to)
+            await cmd_kek_add(msg, reply_to)
 
-        msg.reply.assert_awaited_once()
-        reply_text = msg.reply.call_args.args[0]
-        assert "✅" in reply_text
-        assert "предложку" in reply_text
+            msg.reply.assert_awaited_once()
+            msg.edit_text.assert_not_awaited()
+
+            release.set()
+            await background_tasks.drain()
+
+        assert "✅" in msg.edit_text.call_args.args[0]
+
+    @pytest.mark.asyncio
+    async def test_replies_with_kek_already_in_list(
+        self, mock_storage, author, suggestor, background_tasks
+    ):
+        reply_to = make_message(from_user=author, text="Old kek")
+        msg = make_message(from_user=suggestor, reply_to_message=reply_to)
+        mock_storage.find_duplicate.return_value = Duplicate("List", "rec1")
+        mock_storage.corpus = KekCorpus([{"id": "rec1", "fields": {"Text": "Old kek"}}])
+        reply = make_message()
+        msg.reply.return_value = reply
+
+        await self.run(mock_storage, msg, reply_to, background_tasks)
+
+        assert "♻️" in msg.reply.call_args.args[0]
+        reply.reply.assert_awaited_once()
+        assert reply.reply.call_args.args[0] == "Old kek"
+        mock_storage.async_add.assert_not_awaited()
+
+    @pytest.mark.asyncio
+    async def test_replies_with_pending_suggestion(
+        self, mock_storage, author, suggestor, background_tasks
+    ):
+        reply_to = make_message(from_user=author, text="Suggested kek")
+        msg = make_message(from_user=suggestor, reply_to_message=reply_to)
+        mock_storage.find_duplicate.return_value = Duplicate("Suggestions", None)
+
+        await self.run(mock_storage, msg, reply_to, background_tasks)
+
+        assert "предложке" in msg.reply.call_args.args[0]
+        mock_storage.async_add.assert_not_awaited()
+
+    @pytest.mark.asyncio
+    async def test_reports_failure(
+        self, mock_storage, author, suggestor, background_tasks
+    ):
+        reply_to = make_message(from_user=author)
+        msg = make_message(from_user=suggestor, reply_to_message=reply_to)
+
+        mock_storage.async_add.side_effect = OSError("Disk is full")
+
+        await self.run(mock_storage, msg, reply_to, background_tasks)
+
+        assert "❌" in msg.edit_text.call_args.args[0]
+
+    @pytest.mark.asyncio
+    async def test_reports_queued_kek_when_airtable_is_slow(
+        self, mock_storage, author, suggestor, background_tasks
+    ):
+        reply_to = make_message(from_user=author)
+        msg = make_message(from_user=suggestor, reply_to_message=reply_to)
+
+        async def never_sent(**kwargs):
+            return asyncio.get_running_loop().create_future()
+
+        mock_storage.async_add.side_effect = never_sent
+        with patch("handlers.kek.kek_add.config.kek_add_confirm_timeout", 0.01):
+            await self.run(mock_storage, msg, reply_to, background_tasks)
+
+        assert "📥" in msg.edit_text.call_args.args[0]
 
 
 class TestCmdKekPush:
@@ -79,13 +182,9 @@ class TestCmdKekPush:
         msg = make_message(from_user=author, reply_to_message=reply_to)
 
         with patch("handlers.kek.kek_add.kek_storage", mock_storage):
-            with patch(
-                "handlers.kek.kek_add.extract_attachment_info_with_url",
-                new=AsyncMock(return_value=(None, None, None, None)),
-            ):
-                from handlers.kek.kek_add import cmd_kek_push
+            from handlers.kek.kek_add import cmd_kek_push
 
-                await cmd_kek_push(msg, reply_to)
+            await cmd_kek_push(msg, reply_to)
 
         mock_storage.async_push.assert_awaited_once()
         call_kwargs = mock_storage.async_push.call_args.kwargs
@@ -4,15 +4,17 @@ from unittest.mock import AsyncMock, MagicMock, patch
 
 import pytest
 
+from airtable.stats import KekStats
+
 from tests.conftest import make_message
 
 
 class TestCmdKekInfo:
     @pytest.fixture
     def mock_storage(self):
-        storage = MagicMock()
-        storage.async_all = AsyncMock(
-            return_value=[
+        stats = KekStats()
+        stats.apply_keks(
+            [
                 {
                     "id": "rec1",
                     "fields": {
@@ -36,8 +38,8 @@ class TestCmdKekInfo:
                 },
             ]
         )
-        storage.async_all_users = AsyncMock(
-            return_value=[
+        stats.apply_users(
+            [
                 {
                     "id": "user1",
                     "fields": {
@@ -58,10 +60,12 @@ class TestCmdKekInfo:
                 },
             ]
         )
+        storage = MagicMock()
+        storage.async_stats = AsyncMock(return_value=stats)
         return storage
 
     @pytest.mark.asyncio
-    async def test_fetches_keks_and_users(self, mock_storage):
+    async def test_reads_stats(self, mock_storage):
         msg = make_message()
 
         with patch("handlers.kek.kek_info.kek_storage", mock_storage):
@@ -69,8 +73,7 @@ class TestCmdKekInfo:
 
             await cmd_kek_info(msg)
 
-        mock_storage.async_all.assert_awaited_once()
-        mock_storage.async_all_users.assert_awaited_once()
+        mock_storage.async_stats.assert_awaited_once()
 
     @pytest.mark.asyncio
     async def test_replies_with_statistics(self, mock_storage):
@@ -137,3 +140,21 @@ class TestCmdKekInfo:
 
         call_kwargs = msg.reply.call_args.kwargs
         assert call_kwargs.get("disable_notification") is True
+
+    @pytest.mark.asyncio
+    async def test_renders_once_per_version(self, mock_storage):
+        from handlers.kek.kek_info import cmd_kek_info, render_stats
+
+        stats = mock_storage.async_stats.return_value
+        with patch("handlers.kek.kek_info.kek_storage", mock_storage):
+            await cmd_kek_info(make_message())
+            await cmd_kek_info(make_message())
+            assert render_stats.cache_info().currsize == 1
+            hits = render_stats.cache_info().hits
+
+            stats.apply_keks([{"id": "rec4", "fields": {"AttachmentType": "video"}}])
+            msg = make_message()
+            await cmd_kek_info(msg)
+
+        assert render_stats.cache_info().hits == hits
+        assert "video" in msg.reply.call_args.kwargs["text"]
@@ -1,9 +1,12 @@
 """Tests for app/handlers/kek/kek_inline.py"""
 
+import asyncio
+
 from unittest.mock import AsyncMock, MagicMock, patch
 
 import pytest
 
+from airtable.corpus import Kek, KekCorpus
 
 # Import from module directly (not via __init__.py to avoid router attachment issues)
 from handlers.kek.kek_inline import (
@@ -12,7 +15,7 @@ from handlers.kek.kek_inline import (
     inline_kek_random,
     inline_kek_search,
     kek_to_result,
-    search_keks,
+    search_results,
 )
 
 # =============================================================================
@@ -22,79 +25,45 @@ from handlers.kek.kek_inline import (
 
 class TestGetTextKeks:
     def test_filters_text_only_keks(self):
-        keks = [
-            {"id": "1", "fields": {"Text": "Text kek", "AttachmentType": None}},
-            {"id": "2", "fields": {"Text": "Photo kek", "AttachmentType": "photo"}},
-            {"id": "3", "fields": {"Text": "Another text", "AttachmentType": None}},
-        ]
+        corpus = KekCorpus(
+            [
+                {"id": "1", "fields": {"Text": "Text kek", "AttachmentType": None}},
+                {"id": "2", "fields": {"Text": "Photo kek", "AttachmentType": "photo"}},
+                {"id": "3", "fields": {"Text": "Another text", "AttachmentType": None}},
+            ]
+        )
 
-        result = get_text_keks(keks)
+        result = get_text_keks(corpus)
 
         assert len(result) == 2
-        assert result[0]["id"] == "1"
-        assert result[1]["id"] == "3"
+        assert corpus[result[0]].id == "1"
+        assert corpus[result[1]].id == "3"
 
     def test_filters_out_empty_text(self):
-        keks = [
-            {"id": "1", "fields": {"Text": "", "AttachmentType": None}},
-            {"id": "2", "fields": {"Text": "Has text", "AttachmentType": None}},
-            {"id": "3", "fields": {"AttachmentType": None}},  # No Text field
-        ]
+        corpus = KekCorpus(
+            [
+                {"id": "1", "fields": {"Text": "", "AttachmentType": None}},
+                {"id": "2", "fields": {"Text": "Has text", "AttachmentType": None}},
+                {"id": "3", "fields": {"AttachmentType": None}},  # No Text field
+            ]
+        )
 
-        result = get_text_keks(keks)
+        result = get_text_keks(corpus)
 
         assert len(result) == 1
-        assert result[0]["id"] == "2"
+        assert corpus[result[0]].id == "2"
 
     def test_empty_list(self):
-        assert get_text_keks([]) == []
-
-
-class TestSearchKeks:
-    def test_finds_matching_keks(self):
-        keks = [
-            {"id": "1", "fields": {"Text": "Hello world"}},
-            {"id": "2", "fields": {"Text": "Goodbye world"}},
-            {"id": "3", "fields": {"Text": "Something else"}},
-        ]
-
-        result = search_keks(keks, "world")
-
-        assert len(result) == 2
-        assert result[0]["id"] == "1"
-        assert result[1]["id"] == "2"
-
-    def test_case_insensitive(self):
-        keks = [
-            {"id": "1", "fields": {"Text": "HELLO World"}},
-            {"id": "2", "fields": {"Text": "hello world"}},
-        ]
-
-        result = search_keks(keks, "HELLO")
+        assert len(get_text_keks(KekCorpus([]))) == 0
 
-        assert len(result) == 2
-
-    def test_no_matches(self):
-        keks = [{"id": "1", "fields": {"Text": "Hello world"}}]
-
-        result = search_keks(keks, "xyz")
-
-        assert result == []
 
-    def test_empty_keks(self):
-        assert search_keks([], "query") == []
-
-    def test_respects_limit(self):
-        keks = [{"id": str(i), "fields": {"Text": f"kek {i}"}} for i in range(20)]
-
-        result = search_keks(keks, "kek", limit=5)
-
-        assert len(result) == 5
+def make_kek(record_id: str, text: str) -> Kek:
+    return KekCorpus([{"id": record_id, "fields": {"Text": text}}])[0]
 
 
 class TestKekToResult:
     def test_creates_article_with_kek_text(self):
-        kek = {"id": "rec123", "fields": {"Text": "This is a kek"}}
+        kek = make_kek("rec123", "This is a kek")
 
         result = kek_to_result(kek)
 
@@ -104,7 +73,7 @@ class TestKekToResult:
 
     def test_truncates_long_title(self):
         long_text = "A" * 100
-        kek = {"id": "rec123", "fields": {"Text": long_text}}
+        kek = make_kek("rec123", long_text)
 
         result = kek_to_result(kek)
 
@@ -112,7 +81,7 @@ class TestKekToResult:
         assert result.description == "A" * 50  # Characters 50-100
 
     def test_no_description_for_short_text(self):
-        kek = {"id": "rec123", "fields": {"Text": "Short"}}
+        kek = make_kek("rec123", "Short")
 
         result = kek_to_result(kek)
 
@@ -124,10 +93,11 @@ class TestKekToResult:
 # =============================================================================
 
 
-def make_inline_query(query: str = "") -> MagicMock:
+def make_inline_query(query: str = "", offset: str = "") -> MagicMock:
     """Create a mock InlineQuery."""
     mock = MagicMock()
     mock.query = query
+    mock.offset = offset
     mock.answer = AsyncMock()
     return mock
 
@@ -171,15 +141,23 @@ class TestInlineKekSearch:
     @pytest.fixture
     def mock_storage(self):
         storage = MagicMock()
-        storage.async_all = AsyncMock(
-            return_value=[
-                {"id": "1", "fields": {"Text": "Hello world", "AttachmentType": None}},
-                {
-                    "id": "2",
-                    "fields": {"Text": "Goodbye world", "AttachmentType": None},
-                },
-                {"id": "3", "fields": {"Text": "Photo kek", "AttachmentType": "photo"}},
-            ]
+        storage.async_corpus = AsyncMock(
+            return_value=KekCorpus(
+                [
+                    {
+                        "id": "1",
+                        "fields": {"Text": "Hello world", "AttachmentType": None},
+                    },
+                    {
+                        "id": "2",
+                        "fields": {"Text": "Goodbye world", "AttachmentType": None},
+                    },
+                    {
+                        "id": "3",
+                        "fields": {"Text": "Photo kek", "AttachmentType": "photo"},
+                    },
+                ]
+            )
         )
         return storage
 
@@ -207,14 +185,40 @@ class TestInlineKekSearch:
         assert results[0].id == "not_found"
         assert "не найдено" in results[0].title
 
+    @pytest.mark.asyncio
+    @pytest.mark.parametrize("text", ["😂", "?", "!!!"])
+    async def test_returns_not_found_for_query_without_words(self, mock_storage, text):
+        query = make_inline_query(text)
+
+        with patch("handlers.kek.kek_inline.kek_storage", mock_storage):
+            await inline_kek_search(query)
+
+        results = query.answer.call_args.args[0]
+        assert [r.id for r in results] == ["not_found"]
+
+    @pytest.mark.asyncio
+    async def test_not_found_quotes_query_as_typed(self, mock_storage):
+        query = make_inline_query("Задачи?")
+
+        with patch("handlers.kek.kek_inline.kek_storage", mock_storage):
+            await inline_kek_search(query)
+
+        (result,) = query.answer.call_args.args[0]
+        assert result.description == "По запросу «Задачи?»"
+
     @pytest.mark.asyncio
     async def test_limits_to_10_results(self, mock_storage):
         # Create 15 matching keks
-        mock_storage.async_all = AsyncMock(
-            return_value=[
-                {"id": str(i), "fields": {"Text": f"Kek {i}", "AttachmentType": None}}
-                for i in range(15)
-            ]
+        mock_storage.async_corpus = AsyncMock(
+            return_value=KekCorpus(
+                [
+                    {
+                        "id": str(i),
+                        "fields": {"Text": f"Kek {i}", "AttachmentType": None},
+                    }
+                    for i in range(15)
+                ]
+            )
         )
         query = make_inline_query("Kek")
 
@@ -223,20 +227,102 @@ class TestInlineKekSearch:
 
         results = query.answer.call_args.args[0]
         assert len(results) == 10
+        assert query.answer.call_args.kwargs["next_offset"] == "10"
+
+    @pytest.mark.asyncio
+    async def test_pages_through_ranked_keks(self, mock_storage):
+        mock_storage.async_corpus = AsyncMock(
+            return_value=KekCorpus(
+                [{"id": str(i), "fields": {"Text": f"Kek {i}"}} for i in range(15)]
+            )
+        )
+        first = make_inline_query("Kek")
+        second = make_inline_query("Kek", offset="10")
+        past_end = make_inline_query("Kek", offset="20")
+
+        with patch("handlers.kek.kek_inline.kek_storage", mock_storage):
+            for query in (first, second, past_end):
+                await inline_kek_search(query)
+
+        ids = [
+            r.id for query in (first, second) for r in query.answer.call_args.args[0]
+        ]
+        assert sorted(ids, key=int) == [str(i) for i in range(15)]
+        assert second.answer.call_args.kwargs["next_offset"] == ""
+        assert past_end.answer.call_args.args[0] == []
+
+    @pytest.mark.asyncio
+    async def test_caches_answers_and_misses_per_corpus(self, mock_storage):
+        queries = [make_inline_query(q) for q in ("World", "world!", "xyz", "XYZ")]
+        hits = search_results.hits
+
+        with patch("handlers.kek.kek_inline.kek_storage", mock_storage):
+            for query in queries:
+                await inline_kek_search(query)
+
+            mock_storage.async_corpus.return_value = KekCorpus([])
+            refreshed = make_inline_query("world")
+            await inline_kek_search(refreshed)
+
+        answers = [query.answer.call_args.args[0] for query in queries]
+        assert answers[1] is answers[0]
+        assert [answer[0].id for answer in answers[2:]] == ["not_found"] * 2
+        assert search_results.hits == hits + 2
+        assert refreshed.answer.call_args.args[0][0].id == "not_found"
+
+    @pytest.mark.asyncio
+    async def test_answers_only_latest_query_of_user(self, mock_storage):
+        queries = [make_inline_query(q) for q in ("wo", "wor", "world")]
+        for query in queries:
+            query.from_user.id = 42
+
+        with patch("handlers.kek.kek_inline.kek_storage", mock_storage):
+            await asyncio.gather(*map(inline_kek_search, queries))
+
+        for query in queries[:-1]:
+            query.answer.assert_not_awaited()
+        queries[-1].answer.assert_awaited_once()
+
+    @pytest.mark.asyncio
+    async def test_ranks_best_match_first(self, mock_storage):
+        mock_storage.async_corpus = AsyncMock(
+            return_value=KekCorpus(
+                [
+                    {"id": "inside", "fields": {"Text": "Полиматан и всё такое"}},
+                    {
+                        "id": "long",
+                        "fields": {"Text": "Ну и " + "очень " * 20 + "матан"},
+                    },
+                    {"id": "best", "fields": {"Text": "Матан"}},
+                ]
+            )
+        )
+        query = make_inline_query("матан")
+
+        with patch("handlers.kek.kek_inline.kek_storage", mock_storage):
+            await inline_kek_search(query)
+
+        ids = [r.id for r in query.answer.call_args.args[0]]
+        assert ids == ["best", "long", "inside"]
 
 
 class TestChosenRandomKek:
     @pytest.fixture
     def mock_storage(self):
         storage = MagicMock()
-        storage.async_all = AsyncMock(
-            return_value=[
-                {"id": "rec1", "fields": {"Text": "First kek", "AttachmentType": None}},
-                {
-                    "id": "rec2",
-                    "fields": {"Text": "Second kek", "AttachmentType": None},
-                },
-            ]
+        storage.async_corpus = AsyncMock(
+            return_value=KekCorpus(
+                [
+                    {
+                        "id": "rec1",
+                        "fields": {"Text": "First kek", "AttachmentType": None},
+                    },
+                    {
+                        "id": "rec2",
+                        "fields": {"Text": "Second kek", "AttachmentType": None},
+                    },
+                ]
+            )
         )
         return storage
 
@@ -261,7 +347,7 @@ class TestChosenRandomKek:
     @pytest.mark.asyncio
     async def test_handles_empty_storage(self, mock_bot):
         empty_storage = MagicMock()
-        empty_storage.async_all = AsyncMock(return_value=[])
+        empty_storage.async_corpus = AsyncMock(return_value=KekCorpus([]))
         chosen = make_chosen_result(result_id="any_id")
 
         with patch("handlers.kek.kek_inline.kek_storage", empty_storage):
@@ -0,0 +1,23 @@
+"""Tests for app/settings.py"""
+
+import pytest
+
+from pydantic import ValidationError
+from settings import Settings
+
+
+@pytest.mark.parametrize(
+    "webhook",
+    [{"airtable_webhook_id": "ach123"}, {"airtable_webhook_secret": "c2VjcmV0"}],
+)
+def test_webhook_needs_id_and_secret(webhook):
+    with pytest.raises(ValidationError, match="set together"):
+        Settings(_env_file=None, **webhook)
+
+
+def test_webhook_with_id_and_secret():
+    config = Settings(
+        _env_file=None, airtable_webhook_id="ach123", airtable_webhook_secret="c2VjcmV0"
+    )
+
+    assert config.airtable_webhook_id == "ach123"